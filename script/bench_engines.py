@@ -0,0 +1,207 @@
+import os
+import io
+import sys
+import json
+import random
+import shutil
+import argparse
+import filecmp
+import tempfile
+import statistics
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import checkpoint
+from events import configure
+from warehouses import get_warehouses
+
+# Side-by-side benchmark of process_data.py's transformation engines (--engine pandas / polars) on the same input.
+# The input is either the checkpointed extracts of a pipeline run (--run) or synthetic extracts
+# built by loadtest_fixtures.py (--scale). Every B-flow scenario and picking/packing transform is
+# timed --repeat times per engine (median reported); then both engines write their outputs through
+# the pipeline's writers and the files are compared. Exits with status 1 when the outputs differ.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(SCRIPT_DIR, 'output')
+ENGINES = ['pandas', 'polars']
+
+def load_run_inputs(run_id):
+    # The extracts every stage of a run saved in output/runs/<run-id>/
+    import pandas as pd
+    from process_data import get_bflow_scenarios
+
+    manifest = checkpoint.load_manifest(OUTPUT_DIR, run_id)
+    params = manifest['params']
+    run_dir = checkpoint.get_run_dir(OUTPUT_DIR, run_id)
+
+    def read(lgnum, stage):
+        path = os.path.join(run_dir, checkpoint.checkpoint_name(lgnum, stage))
+        return pd.read_pickle(path) if os.path.exists(path) else None
+
+    df_route_mapping = pd.read_csv(os.path.join(SCRIPT_DIR, 'data', 'routes.csv'))
+    route_to_flow = dict(zip(df_route_mapping['ROUTE'], df_route_mapping['FLOW']))
+
+    inputs = []
+    for warehouse in get_warehouses(params['lgnums']):
+        lgnum = warehouse['lgnum']
+        for scenario in get_bflow_scenarios(params['actual_today']):
+            frames = read(lgnum, f"bflow_{scenario['name']}")
+            if frames is not None:
+                inputs.append(('bflow', scenario, warehouse, frames))
+        picking = read(lgnum, 'picking_extract')
+        packing = read(lgnum, 'packing_extract')
+        if picking is not None or packing is not None:
+            df_ltap, df_routes = picking if picking is not None else (None, None)
+            inputs.append(('transform', {'name': 'stats', 'date': params['target_date']}, warehouse, (df_ltap, df_routes, packing)))
+    return inputs, route_to_flow
+
+def build_synthetic_inputs(scale, seed):
+    from loadtest_fixtures import build_scenario_frames, build_day_extracts, load_routes
+    from process_data import get_bflow_scenarios
+
+    rng = random.Random(seed)
+    route_to_flow, routes = load_routes()
+    today = datetime.today().strftime('%Y-%m-%d')
+    ids = {'vbeln': 80000000, 'tanum': 1000000000, 'exidv': 100000000000000000}
+
+    inputs = []
+    for warehouse in get_warehouses():
+        for scenario in get_bflow_scenarios(today):
+            scenario = dict(scenario, date=today)
+            inputs.append(('bflow', scenario, warehouse, build_scenario_frames(rng, scenario, warehouse, scale, ids)))
+        inputs.append(('transform', {'name': 'stats', 'date': today}, warehouse, build_day_extracts(rng, warehouse, today, scale, routes)))
+    return inputs, route_to_flow
+
+def copy_frames(frames):
+    # The pandas engine adds columns to its input frames, so every pass gets fresh copies
+    if isinstance(frames, dict):
+        return {name: df.copy() for name, df in frames.items()}
+    return tuple(df.copy() if df is not None else None for df in frames)
+
+def input_rows(kind, frames):
+    if kind == 'bflow':
+        return len(frames['ltap'])
+    return sum(len(df) for df in frames if df is not None)
+
+def run_step(kind, scenario, warehouse, frames, route_to_flow, engine, output_dir=None):
+    # One engine on one input; with output_dir the results also go through the pipeline's writers
+    from process_data import bflow_dept_outputs, build_bflow_outputs, transform_shard, write_shard_outputs
+
+    if kind == 'bflow':
+        if output_dir:
+            build_bflow_outputs(scenario, frames, output_dir, f"bflow_{scenario['name']}", [warehouse], engine)
+        elif engine == 'polars':
+            from engine_polars import bflow_dept_outputs as dept_outputs
+            list(dept_outputs(scenario, frames, [warehouse]))
+        else:
+            list(bflow_dept_outputs(scenario, frames, [warehouse]))
+    else:
+        stats = transform_shard(warehouse, *frames, route_to_flow, engine)
+        if output_dir:
+            write_shard_outputs(warehouse, stats, scenario['date'], output_dir)
+
+def time_step(kind, scenario, warehouse, frames, route_to_flow, engine, repeat):
+    timings = []
+    for _ in range(repeat):
+        data = copy_frames(frames)
+        start = time.perf_counter()
+        run_step(kind, scenario, warehouse, data, route_to_flow, engine)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def files_equal(path_a, path_b):
+    # Byte for byte; the users index only differs in its updated_at stamp
+    if os.path.basename(path_a).startswith('users_index') and path_a.endswith('.json'):
+        with open(path_a) as fa, open(path_b) as fb:
+            index_a, index_b = json.load(fa), json.load(fb)
+        index_a.pop('updated_at', None)
+        index_b.pop('updated_at', None)
+        return index_a == index_b
+    return filecmp.cmp(path_a, path_b, shallow=False)
+
+def output_files(output_dir):
+    # Relative paths of the output files, without the runs' lock files (locks/)
+    paths = set()
+    for root, dirs, files in os.walk(output_dir):
+        dirs[:] = [d for d in dirs if d != 'locks']
+        paths.update(os.path.relpath(os.path.join(root, name), output_dir) for name in files)
+    return paths
+
+def compare_outputs(dir_a, dir_b):
+    # Relative paths of the files that differ
+    files_a, files_b = output_files(dir_a), output_files(dir_b)
+    differences = files_a ^ files_b
+    differences.update(rel for rel in files_a & files_b if not files_equal(os.path.join(dir_a, rel), os.path.join(dir_b, rel)))
+    return sorted(differences)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pandas and polars transformation engines side by side.")
+    parser.add_argument('--run', type=str, metavar='RUN_ID', help="Use the checkpointed extracts of this run (output/runs/<RUN_ID>).")
+    parser.add_argument('--scale', type=float, default=1.0, help="Size of the synthetic input when no --run is given; 1 is roughly a busy day per warehouse. Defaults to 1.")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed of the synthetic input. Defaults to 1.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed passes per engine and step. Defaults to 3.")
+    parser.add_argument('--keep', action='store_true', help="Keep the output directories of both engines.")
+    args = parser.parse_args()
+
+    if args.repeat <= 0:
+        parser.error("--repeat must be a positive number")
+    if args.scale <= 0:
+        parser.error("--scale must be positive")
+    if args.run and checkpoint.load_manifest(OUTPUT_DIR, args.run) is None:
+        parser.error(f"No checkpointed run '{args.run}' in {checkpoint.get_runs_dir(OUTPUT_DIR)}")
+    try:
+        import polars
+    except ImportError:
+        parser.error("the polars engine requires the polars package (pip install polars)")
+
+    # Output of both engines under the same generation, so their delta snapshots compare equal
+    configure(events=False, generation='bench')
+    print(f"Building input ({f'run {args.run}' if args.run else f'synthetic, scale {args.scale}'})...")
+    with redirect_stdout(io.StringIO()):
+        inputs, route_to_flow = load_run_inputs(args.run) if args.run else build_synthetic_inputs(args.scale, args.seed)
+    if not inputs:
+        print("No extracts to benchmark.")
+        return
+
+    header = f"{'step':<16} {'lgnum':>5} {'rows':>9} {'pandas ms':>10} {'polars ms':>10} {'speedup':>8}"
+    print(f"\npolars {polars.__version__}, {polars.thread_pool_size()} threads, median of {args.repeat}\n")
+    print(header)
+    print('-' * len(header))
+    totals = dict.fromkeys(ENGINES, 0.0)
+    for kind, scenario, warehouse, frames in inputs:
+        with redirect_stdout(io.StringIO()):
+            timings = {engine: time_step(kind, scenario, warehouse, frames, route_to_flow, engine, args.repeat) for engine in ENGINES}
+        for engine in ENGINES:
+            totals[engine] += timings[engine]
+        step = f"bflow_{scenario['name']}" if kind == 'bflow' else 'picking/packing'
+        print(f"{step:<16} {warehouse['lgnum']:>5} {input_rows(kind, frames):>9} {timings['pandas']:>10.1f} {timings['polars']:>10.1f} {timings['pandas'] / timings['polars']:>7.2f}x")
+    print('-' * len(header))
+    print(f"{'total':<16} {'':>5} {'':>9} {totals['pandas']:>10.1f} {totals['polars']:>10.1f} {totals['pandas'] / totals['polars']:>7.2f}x")
+
+    # --- OUTPUT EQUALITY ---
+    output_dirs = {engine: tempfile.mkdtemp(prefix=f"bench_{engine}_") for engine in ENGINES}
+    with redirect_stdout(io.StringIO()):
+        for kind, scenario, warehouse, frames in inputs:
+            for engine in ENGINES:
+                run_step(kind, scenario, warehouse, copy_frames(frames), route_to_flow, engine, output_dirs[engine])
+    differences = compare_outputs(output_dirs['pandas'], output_dirs['polars'])
+    file_count = len(output_files(output_dirs['pandas']))
+
+    if differences:
+        print(f"\nOutputs differ in {len(differences)} of {file_count} files:")
+        for rel in differences:
+            print(f"  {rel}")
+    else:
+        print(f"\nOutputs identical ({file_count} files).")
+
+    if args.keep:
+        print(f"Outputs kept in {output_dirs['pandas']} and {output_dirs['polars']}")
+    else:
+        for path in output_dirs.values():
+            shutil.rmtree(path, ignore_errors=True)
+    sys.exit(1 if differences else 0)
+
+if __name__ == "__main__":
+    main()
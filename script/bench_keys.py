@@ -0,0 +1,174 @@
+import os
+import io
+import sys
+import argparse
+import statistics
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import checkpoint
+from bench_engines import OUTPUT_DIR, build_synthetic_inputs, load_run_inputs
+from events import configure
+
+# Benchmark of the document key handling of the B-flow dashboards on the full backlog: the string
+# normalisation used before the int64 keys (VBELN strip/lstrip('0'), TANUM strip and EXIDV zfill(20) on
+# object columns, repeated per department and for the exports) against to_int_key once at ingest.
+# The backlog extracts of every warehouse (of a checkpointed run with --run, synthetic with --scale) are
+# rendered with their keys as SAP stores them; both sides then run the same key work: normalisation,
+# the LIKP/LTAP, HU/LIKP, HU/priority group and LTAP/HU merges, the per-delivery groupby and the export
+# form. Reports the median time, the peak memory (tracemalloc) and the memory of the key columns.
+
+STORED_WIDTHS = {'VBELN': 10, 'TANUM': 10, 'EXIDV': 20}
+
+def stored_frames(frames):
+    # The extract with its keys as returned by Snowflake: zero padded strings
+    stored = {}
+    for name in ['likp', 'ltap', 'hu', 'prio_grp']:
+        df = frames[name].copy()
+        for col, width in STORED_WIDTHS.items():
+            if col in df.columns:
+                df[col] = df[col].astype(str).str.zfill(width)
+        stored[name] = df
+    return stored
+
+def load_backlog(args):
+    import pandas as pd
+
+    with redirect_stdout(io.StringIO()):
+        inputs, _route_to_flow = load_run_inputs(args.run) if args.run else build_synthetic_inputs(args.scale, args.seed)
+    backlog = [(warehouse['lgnum'], frames) for kind, scenario, warehouse, frames in inputs if kind == 'bflow' and scenario['name'] == 'backlog']
+    if not backlog:
+        return None, []
+    frames = {name: pd.concat([f[name] for _lgnum, f in backlog], ignore_index=True) for name in ['likp', 'ltap', 'hu', 'prio_grp']}
+    return stored_frames(frames), [lgnum for lgnum, _f in backlog]
+
+def normalise_strings(stored):
+    def vbeln(values):
+        return values.astype(str).str.strip().str.lstrip('0')
+
+    likp, ltap, hu, prio = (stored[name].copy() for name in ['likp', 'ltap', 'hu', 'prio_grp'])
+    likp['VBELN'] = vbeln(likp['VBELN'])
+    ltap['VBELN'] = vbeln(ltap['VBELN'])
+    ltap['TANUM'] = ltap['TANUM'].astype(str).str.strip()
+    hu['VBELN'] = vbeln(hu['VBELN'])
+    hu['TANUM'] = hu['TANUM'].astype(str).str.strip()
+    prio['EXIDV'] = prio['EXIDV'].astype(str).str.strip()
+    return likp, ltap, hu, prio
+
+def string_keys(stored, lgnums):
+    # Before: every frame normalised again where it is used, merges on object columns
+    likp, ltap, hu, prio = normalise_strings(stored)
+    matches = [0, 0, 0, 0]
+    for lgnum in lgnums:
+        likp_dept = likp[likp['LGNUM'] == lgnum].copy()
+        likp_dept['VBELN'] = likp_dept['VBELN'].astype(str).str.strip().str.lstrip('0')
+        ltap_dept = ltap[ltap['VBELN'].isin(likp_dept['VBELN'])].copy()
+        ltap_dept['VBELN'] = ltap_dept['VBELN'].astype(str).str.strip().str.lstrip('0')
+        hu_dept = hu[hu['VBELN'].isin(likp_dept['VBELN'])].copy()
+        hu_dept['VBELN'] = hu_dept['VBELN'].astype(str).str.strip().str.lstrip('0')
+
+        ltap_ctx = ltap_dept.merge(likp_dept[['VBELN', 'LPRIO', 'WAUHR']], on='VBELN', how='left')
+        hu_model = hu_dept.merge(likp_dept[['VBELN', 'LPRIO', 'WAUHR']], on='VBELN', how='left')
+        hu_model['EXIDV_STR'] = hu_model['EXIDV'].astype(str).str.strip().str.zfill(20)
+        hu_model = hu_model.merge(prio.rename(columns={'EXIDV': 'EXIDV_STR'}), on='EXIDV_STR', how='left')
+        picks = ltap_dept[['TANUM', 'QDATU']].merge(hu_dept[['EXIDV', 'TANUM']], on='TANUM', how='inner')
+        per_delivery = ltap_ctx.groupby('VBELN').size()
+        ltap_ctx['VBELN_EXPORT'] = ltap_ctx['VBELN'].astype(str).str.strip().str.lstrip('0')
+
+        matches[0] += int(ltap_ctx['LPRIO'].notnull().sum())
+        matches[1] += int(hu_model['ZEXIDVGRP'].notnull().sum())
+        matches[2] += len(picks)
+        matches[3] += len(per_delivery)
+    return matches
+
+def normalise_ints(stored):
+    from process_data import to_int_key
+
+    likp, ltap, hu, prio = (stored[name].copy() for name in ['likp', 'ltap', 'hu', 'prio_grp'])
+    likp['VBELN'] = to_int_key(likp['VBELN'])
+    ltap['VBELN'] = to_int_key(ltap['VBELN'])
+    ltap['TANUM'] = to_int_key(ltap['TANUM'])
+    hu['VBELN'] = to_int_key(hu['VBELN'])
+    hu['TANUM'] = to_int_key(hu['TANUM'])
+    hu['EXIDV'] = to_int_key(hu['EXIDV'])
+    prio['EXIDV'] = to_int_key(prio['EXIDV'])
+    return likp, ltap, hu, prio.dropna(subset=['EXIDV'])
+
+def int_keys(stored, lgnums):
+    # Now: int64 keys computed once at ingest, merges on integers, <NA> keys kept off the right side
+    likp, ltap, hu, prio = normalise_ints(stored)
+    matches = [0, 0, 0, 0]
+    for lgnum in lgnums:
+        likp_dept = likp[likp['LGNUM'] == lgnum]
+        ltap_dept = ltap[ltap['VBELN'].isin(likp_dept['VBELN'])]
+        hu_dept = hu[hu['VBELN'].isin(likp_dept['VBELN'])]
+
+        ltap_ctx = ltap_dept.merge(likp_dept[['VBELN', 'LPRIO', 'WAUHR']].dropna(subset=['VBELN']), on='VBELN', how='left')
+        hu_model = hu_dept.merge(likp_dept[['VBELN', 'LPRIO', 'WAUHR']].dropna(subset=['VBELN']), on='VBELN', how='left')
+        hu_model = hu_model.merge(prio, on='EXIDV', how='left')
+        picks = ltap_dept[['TANUM', 'QDATU']].merge(hu_dept[['EXIDV', 'TANUM']].dropna(subset=['TANUM']), on='TANUM', how='inner')
+        per_delivery = ltap_ctx.groupby('VBELN').size()
+        ltap_ctx['VBELN_EXPORT'] = ltap_ctx['VBELN'].astype(str)
+
+        matches[0] += int(ltap_ctx['LPRIO'].notnull().sum())
+        matches[1] += int(hu_model['ZEXIDVGRP'].notnull().sum())
+        matches[2] += len(picks)
+        matches[3] += len(per_delivery)
+    return matches
+
+def key_memory(frames):
+    # Bytes held by the key columns of the normalised frames
+    return sum(int(df[col].memory_usage(deep=True, index=False)) for df in frames for col in STORED_WIDTHS if col in df.columns)
+
+def measure(side, stored, lgnums, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        matches = side(stored, lgnums)
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    side(stored, lgnums)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, matches
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark string document keys against int64 keys on the B-flow backlog.")
+    parser.add_argument('--run', type=str, metavar='RUN_ID', help="Use the backlog extracts of this run (output/runs/<RUN_ID>).")
+    parser.add_argument('--scale', type=float, default=1.0, help="Size of the synthetic input when no --run is given; 1 is roughly a busy day per warehouse. Defaults to 1.")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed of the synthetic input. Defaults to 1.")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed passes per side. Defaults to 5.")
+    args = parser.parse_args()
+
+    if args.repeat <= 0:
+        parser.error("--repeat must be a positive number")
+    if args.scale <= 0:
+        parser.error("--scale must be positive")
+    if args.run and checkpoint.load_manifest(OUTPUT_DIR, args.run) is None:
+        parser.error(f"No checkpointed run '{args.run}' in {checkpoint.get_runs_dir(OUTPUT_DIR)}")
+
+    configure(events=False, generation='bench')
+    print(f"Building input ({f'run {args.run}' if args.run else f'synthetic, scale {args.scale}'})...")
+    stored, lgnums = load_backlog(args)
+    if stored is None:
+        print("No backlog extracts to benchmark.")
+        return
+    print(f"Backlog: {len(stored['likp'])} deliveries, {len(stored['ltap'])} lines, {len(stored['hu'])} HU links, {len(lgnums)} warehouses\n")
+
+    results = {label: measure(side, stored, lgnums, args.repeat) for label, side in [('string', string_keys), ('int64', int_keys)]}
+    memory = {'string': key_memory(normalise_strings(stored)), 'int64': key_memory(normalise_ints(stored))}
+
+    header = f"{'keys':<8} {'median ms':>10} {'peak MiB':>10} {'key cols MiB':>13}  matches (context, groups, picks, deliveries)"
+    print(header)
+    print('-' * len(header))
+    for label, (median, peak, matches) in results.items():
+        print(f"{label:<8} {median:>10.1f} {peak / 2 ** 20:>10.1f} {memory[label] / 2 ** 20:>13.2f}  {', '.join(str(m) for m in matches)}")
+    string_ms, int_ms = results['string'][0], results['int64'][0]
+    print(f"\nint64 keys: {string_ms / int_ms:.2f}x faster, key columns {memory['string'] / memory['int64']:.1f}x smaller")
+    if results['string'][2] != results['int64'][2]:
+        print("Match counts differ: the extract has non-numeric keys, which the int64 keys leave unmatched.")
+
+if __name__ == "__main__":
+    main()
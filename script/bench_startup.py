@@ -0,0 +1,64 @@
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import time
+
+# Startup benchmark for the script entry points.
+# Runs each fast-path invocation several times, reports wall-clock time against the 200 ms target,
+# and uses `python -X importtime` to list the most expensive imports of each path.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TARGET_MS = 200
+
+CASES = [
+    ("user-stats invalid qname", ['fetch_user_stats.py', '--qname', "bad name'", '--lgnum', '245']),
+    ("user-stats invalid lgnum", ['fetch_user_stats.py', '--qname', 'USER1', '--lgnum', '999']),
+    ("process_data invalid date", ['process_data.py', '--date', '2026-13-45']),
+    ("heavy imports (reference)", ['-c', 'import pandas, snowflake.connector, dotenv'])
+]
+
+def run_case(args, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=SCRIPT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def top_imports(args, limit):
+    # -X importtime writes "import time: self [us] | cumulative | imported package" lines to stderr
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=SCRIPT_DIR, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        # Only top-level imports (no extra indentation) so nested modules are not counted twice
+        if name.startswith('  '):
+            continue
+        rows.append((int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark interpreter startup of the script entry points.")
+    parser.add_argument('--runs', type=int, default=10, help="Runs per case. Defaults to 10.")
+    parser.add_argument('--top', type=int, default=5, help="Number of top-level imports to list per case.")
+    args = parser.parse_args()
+
+    print(f"{'case':<30} {'median ms':>10} {'max ms':>10}  target <{TARGET_MS} ms")
+    for label, case_args in CASES:
+        timings = run_case(case_args, args.runs)
+        median = statistics.median(timings)
+        status = 'ok' if median < TARGET_MS else 'over'
+        print(f"{label:<30} {median:>10.1f} {max(timings):>10.1f}  {status}")
+
+    for label, case_args in CASES:
+        print(f"\nSlowest top-level imports: {label}")
+        for cumulative_us, name in top_imports(case_args, args.top):
+            print(f"  {cumulative_us / 1000:>8.1f} ms  {name}")
+
+if __name__ == "__main__":
+    main()
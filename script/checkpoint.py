@@ -0,0 +1,150 @@
+import os
+import json
+import shutil
+import threading
+from datetime import datetime, timedelta
+
+# Stage checkpoints of process_data.py runs: output/runs/<run-id>/
+# manifest.json records the run parameters and the status of every "<LGNUM>/<stage>"; the extracted
+# frames of completed stages are kept next to it (<LGNUM>_<stage>.pkl) so `--resume <run-id>` only
+# re-executes stages that failed or whose inputs are gone, and reuses every completed extract.
+
+RETAIN_RUNS = 5
+
+# Runs selecting other --stages may overlap; an unfinished run younger than this is never pruned
+ACTIVE_RUN_HOURS = 6
+
+_state = {
+    'dir': None,
+    'manifest': None,
+    'executed': set()
+}
+_lock = threading.Lock()
+
+def get_runs_dir(output_dir):
+    return os.path.join(output_dir, 'runs')
+
+def get_run_dir(output_dir, run_id):
+    return os.path.join(get_runs_dir(output_dir), run_id)
+
+def _save_manifest():
+    path = os.path.join(_state['dir'], 'manifest.json')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(_state['manifest'], f, indent=4)
+    os.replace(tmp_path, path)
+
+def load_manifest(output_dir, run_id):
+    path = os.path.join(get_run_dir(output_dir, run_id), 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def prune_runs(output_dir, keep=RETAIN_RUNS):
+    # Run ids start with a timestamp, so name order is age order
+    runs_dir = get_runs_dir(output_dir)
+    if not os.path.isdir(runs_dir):
+        return
+    active_since = datetime.now() - timedelta(hours=ACTIVE_RUN_HOURS)
+    for run_id in sorted(os.listdir(runs_dir))[:-keep]:
+        manifest = load_manifest(output_dir, run_id)
+        if manifest and not manifest.get("finished_at") and datetime.fromisoformat(manifest.get("resumed_at", manifest["started_at"])) > active_since:
+            continue
+        shutil.rmtree(os.path.join(runs_dir, run_id), ignore_errors=True)
+
+def start_run(output_dir, run_id, params):
+    prune_runs(output_dir, keep=RETAIN_RUNS - 1)
+    _state['dir'] = get_run_dir(output_dir, run_id)
+    os.makedirs(_state['dir'], exist_ok=True)
+    _state['manifest'] = {
+        "run_id": run_id,
+        "started_at": datetime.now().isoformat(timespec='seconds'),
+        "params": params,
+        "stages": {}
+    }
+    _state['executed'] = set()
+    _save_manifest()
+
+def resume_run(output_dir, run_id):
+    _state['dir'] = get_run_dir(output_dir, run_id)
+    _state['manifest'] = load_manifest(output_dir, run_id)
+    _state['manifest']["resumed_at"] = datetime.now().isoformat(timespec='seconds')
+    _state['manifest'].pop("finished_at", None)
+    _state['executed'] = set()
+    with _lock:
+        _save_manifest()
+    return _state['manifest']["params"]
+
+def finish_run():
+    if _state['manifest'] is None:
+        return
+    with _lock:
+        _state['manifest']["finished_at"] = datetime.now().isoformat(timespec='seconds')
+        _save_manifest()
+
+def _key(lgnum, stage):
+    return f"{lgnum}/{stage}"
+
+def is_complete(lgnum, stage, outputs=None):
+    # Completed in an earlier attempt, its checkpoint still readable and its output files still present
+    if _state['manifest'] is None:
+        return False
+    record = _state['manifest']["stages"].get(_key(lgnum, stage))
+    if not record or record["status"] != 'completed':
+        return False
+    if record.get("checkpoint") and not os.path.exists(os.path.join(_state['dir'], record["checkpoint"])):
+        return False
+    return all(os.path.exists(path) for path in (outputs or []))
+
+def was_executed(lgnum, stage):
+    # True when the stage ran (rather than being reused) in this process, which invalidates its dependents
+    return _key(lgnum, stage) in _state['executed']
+
+def checkpoint_name(lgnum, stage):
+    return f"{lgnum}_{stage}.pkl"
+
+def save_extract(lgnum, stage, frames):
+    import pandas as pd
+
+    if _state['dir'] is None:
+        return None
+    filename = checkpoint_name(lgnum, stage)
+    tmp_path = os.path.join(_state['dir'], filename + '.tmp')
+    pd.to_pickle(frames, tmp_path)
+    os.replace(tmp_path, os.path.join(_state['dir'], filename))
+    return filename
+
+def has_extract(lgnum, stage):
+    return _state['dir'] is not None and os.path.exists(os.path.join(_state['dir'], checkpoint_name(lgnum, stage)))
+
+def load_extract(lgnum, stage):
+    # Frames saved by an earlier attempt of this run, also when a later step of that stage failed
+    import pandas as pd
+
+    if _state['dir'] is None:
+        return None
+    path = os.path.join(_state['dir'], checkpoint_name(lgnum, stage))
+    if not os.path.exists(path):
+        return None
+    return pd.read_pickle(path)
+
+def failed_stages():
+    # Stages --resume executes again: failed ones and those skipped because an upstream stage failed
+    if _state['manifest'] is None:
+        return []
+    return [key for key, record in _state['manifest']["stages"].items() if record["status"] in ('failed', 'skipped')]
+
+def mark_stage(lgnum, stage, status, checkpoint=None, error=None, duration_ms=None):
+    if _state['manifest'] is None:
+        return
+    with _lock:
+        _state['executed'].add(_key(lgnum, stage))
+        _state['manifest']["stages"][_key(lgnum, stage)] = {
+            "status": status,
+            "checkpoint": checkpoint,
+            "error": error,
+            "duration_ms": duration_ms,
+            "finished_at": datetime.now().isoformat(timespec='seconds')
+        }
+        _save_manifest()
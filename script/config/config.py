@@ -36,4 +36,38 @@ BREAK_MAPPING = {
     17: 0.75,
     19: 0.50,
     21: 0.75
-}
\ No newline at end of file
+}
+# Box closings by this interface user are counted as packing only where a warehouse enables remote_packing
+REMOTE_PACKING_USER = 'WEBMREMOTEWS'
+
+# Warehouse registry: one entry per LGNUM, each processed as an independent shard by process_data.py.
+#   prefix: output file prefix (dashboard_data_<prefix>.json, <prefix>_picking_daily_stats.csv, ...)
+#   vstel: shipping points of the B-flow deliveries, None for all
+#   vlpla_starts / vlpla_not_starts: source bin prefixes that count as picking lines
+#   dashboard_exclude_vltyp: storage types left out of the B-flow dashboard lines
+#   floor: fixed floor of every line, None to map VLTYP through FLOOR_MAPPING
+#   floor_breakdown: add the per-floor section to the B-flow dashboard
+WAREHOUSES = {
+    '245': {
+        'name': 'MS',
+        'prefix': 'ms',
+        'vstel': None,
+        'vlpla_starts': ['B', 'C', 'D', 'V', 'E'],
+        'vlpla_not_starts': [],
+        'dashboard_exclude_vltyp': ['REP'],
+        'floor': 'ground_floor',
+        'floor_breakdown': False,
+        'remote_packing': True
+    },
+    '266': {
+        'name': 'CVNS',
+        'prefix': 'cvns',
+        'vstel': ['1NLA', '2NLA', '3NLA', '4NLA'],
+        'vlpla_starts': ['L', 'F', 'X', 'N', 'O', 'Y', 'W'],
+        'vlpla_not_starts': ['YES', 'NO', 'LONGGOODS', 'NCS', 'OSO'],
+        'dashboard_exclude_vltyp': [],
+        'floor': None,
+        'floor_breakdown': True,
+        'remote_packing': False
+    }
+}
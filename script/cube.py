@@ -0,0 +1,164 @@
+import os
+import argparse
+import json
+from datetime import datetime, timedelta
+
+# On-disk aggregate cube of hourly picking/packing stats.
+# One partition per day: output/cube/date=YYYY-MM-DD/<LGNUM>_<activity>.csv
+# Dimensions: DATE x LGNUM x FLOW x FLOOR x HOUR x QNAME
+# Measures are stored unrounded, so multi-day sums and ratios are only rounded once, in rollup
+
+CUBE_DIMENSIONS = ['DATE', 'LGNUM', 'FLOW', 'FLOOR', 'HOUR', 'QNAME']
+
+CUBE_MEASURES = {
+    'picking': ['LINES_PICKED', 'ITEMS_PICKED', 'WEIGHT_PICKED', 'EFFORT'],
+    'packing': ['BOXES_PACKED', 'EFFORT']
+}
+
+# Columns of the hourly stats holding a measure before it is rounded for the stats CSVs
+EXACT_COLUMNS = {'WEIGHT_PICKED': 'WEIGHT_PICKED_EXACT', 'EFFORT': 'EFFORT_EXACT'}
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+
+def get_cube_dir(output_dir=None):
+    return os.path.join(output_dir or DEFAULT_OUTPUT_DIR, 'cube')
+
+def append_day(df_hourly, date, lgnum, activity, output_dir=None):
+    # Writes (or replaces) the partition for one day, so re-running a date keeps the cube consistent;
+    # a day without activity removes the partition an earlier run of the date wrote
+    partition_dir = os.path.join(get_cube_dir(output_dir), f"date={date}")
+    partition_path = os.path.join(partition_dir, f"{lgnum}_{activity}.csv")
+    if df_hourly is None or df_hourly.empty:
+        if os.path.exists(partition_path):
+            os.remove(partition_path)
+        return None
+
+    os.makedirs(partition_dir, exist_ok=True)
+
+    exact = {col: exact_col for col, exact_col in EXACT_COLUMNS.items() if exact_col in df_hourly.columns}
+    df_part = df_hourly.drop(columns=list(exact)).rename(columns={exact_col: col for col, exact_col in exact.items()})
+    df_part['DATE'] = date
+    df_part['LGNUM'] = str(lgnum)
+    df_part = df_part[CUBE_DIMENSIONS + CUBE_MEASURES[activity]]
+
+    tmp_path = partition_path + '.tmp'
+    df_part.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, partition_path)
+    return partition_path
+
+def list_partitions(output_dir=None, start=None, end=None):
+    cube_dir = get_cube_dir(output_dir)
+    if not os.path.isdir(cube_dir):
+        return []
+
+    dates = []
+    for entry in os.listdir(cube_dir):
+        if not entry.startswith('date='):
+            continue
+        date = entry[len('date='):]
+        # ISO dates compare correctly as strings, so pruning needs no parsing
+        if start and date < start:
+            continue
+        if end and date > end:
+            continue
+        dates.append(date)
+    return sorted(dates)
+
+def load_cube(activity, lgnum=None, start=None, end=None, output_dir=None):
+    # pandas is imported lazily so process_data.py can import this module without paying for it up front
+    import pandas as pd
+
+    cube_dir = get_cube_dir(output_dir)
+    lgnums = [str(lgnum)] if lgnum else None
+
+    frames = []
+    for date in list_partitions(output_dir, start, end):
+        partition_dir = os.path.join(cube_dir, f"date={date}")
+        for filename in os.listdir(partition_dir):
+            if not filename.endswith(f"_{activity}.csv"):
+                continue
+            if lgnums and filename.split('_')[0] not in lgnums:
+                continue
+            frames.append(pd.read_csv(os.path.join(partition_dir, filename), dtype={'LGNUM': str, 'QNAME': str}))
+
+    if not frames:
+        return pd.DataFrame(columns=CUBE_DIMENSIONS + CUBE_MEASURES[activity])
+    return pd.concat(frames, ignore_index=True)
+
+def rollup(activity, period='week', days=7, lgnum=None, by_user=False, end=None, output_dir=None):
+    # period: 'day', 'week' (ISO), 'month' or 'rolling' (last `days` days up to `end`)
+    end = end or datetime.today().strftime('%Y-%m-%d')
+    start = None
+    if period == 'rolling':
+        start = (datetime.strptime(end, '%Y-%m-%d') - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+    import pandas as pd
+
+    df = load_cube(activity, lgnum=lgnum, start=start, end=end, output_dir=output_dir)
+    if df.empty:
+        return pd.DataFrame()
+
+    dates = pd.to_datetime(df['DATE'])
+    if period == 'day':
+        df['PERIOD'] = df['DATE']
+    elif period == 'week':
+        iso = dates.dt.isocalendar()
+        df['PERIOD'] = iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)
+    elif period == 'month':
+        df['PERIOD'] = dates.dt.strftime('%Y-%m')
+    elif period == 'rolling':
+        df['PERIOD'] = f"{start}..{end}"
+    else:
+        raise ValueError(f"Unknown rollup period: {period}")
+
+    keys = ['PERIOD', 'LGNUM', 'FLOW', 'FLOOR'] + (['QNAME'] if by_user else [])
+    measures = CUBE_MEASURES[activity]
+
+    df_r = df.groupby(keys).agg(
+        **{m: (m, 'sum') for m in measures},
+        DAYS=('DATE', 'nunique')
+    ).reset_index()
+
+    # Ratios from the unrounded sums; the sums themselves are rounded last
+    if activity == 'picking':
+        lines = df_r['LINES_PICKED']
+        df_r['RATIO'] = (df_r['ITEMS_PICKED'] / lines).round(2)
+        df_r['PRODUCTIVITY'] = (lines / df_r['EFFORT']).round(2)
+        # Same definition as the per-day FLOW x FLOOR context benchmarks in process_data.py
+        df_r['AVG_WEIGHT_PER_LINE'] = (df_r['WEIGHT_PICKED'] / lines).round(4)
+        df_r['AVG_ITEMS_PER_LINE'] = (df_r['ITEMS_PICKED'] / lines).round(4)
+        df_r['WEIGHT_PICKED'] = df_r['WEIGHT_PICKED'].round(2)
+    else:
+        df_r['PRODUCTIVITY'] = (df_r['BOXES_PACKED'] / df_r['EFFORT']).round(2)
+    df_r['EFFORT'] = df_r['EFFORT'].round(2)
+
+    return df_r.sort_values(keys).reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Query rollups from the local productivity cube.")
+    parser.add_argument('--activity', type=str, default='picking', choices=['picking', 'packing'], help="Activity type.")
+    parser.add_argument('--period', type=str, default='week', choices=['day', 'week', 'month', 'rolling'], help="Rollup period.")
+    parser.add_argument('--days', type=int, default=7, help="Window size for the rolling period.")
+    parser.add_argument('--lgnum', type=str, help="Restrict to one LGNUM.")
+    parser.add_argument('--end', type=str, help="Last date included (YYYY-MM-DD). Defaults to today.")
+    parser.add_argument('--by-user', action='store_true', help="Keep QNAME as a rollup dimension.")
+    args = parser.parse_args()
+
+    if args.days <= 0:
+        parser.error("--days must be a positive number")
+    if args.end:
+        try:
+            datetime.strptime(args.end, '%Y-%m-%d')
+        except ValueError:
+            parser.error(f"--end must be in YYYY-MM-DD format, got '{args.end}'")
+
+    df = rollup(args.activity, period=args.period, days=args.days, lgnum=args.lgnum, by_user=args.by_user, end=args.end)
+    print(json.dumps({
+        "success": True,
+        "activity": args.activity,
+        "period": args.period,
+        "data": df.to_dict(orient='records')
+    }))
+
+if __name__ == "__main__":
+    main()
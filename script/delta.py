@@ -0,0 +1,112 @@
+import os
+import json
+
+# Delta snapshots between consecutive generations of the B-flow dashboard exports.
+# Before a dashboard file is overwritten, its new content is diffed against the previous generation
+# and written to output/delta/<file> as {"base_generation", "generation", "added", "removed", "changed"}.
+# output/delta/<file>.generation records which generation each full export currently holds.
+
+LINE_KEY = ['VBELN', 'TANUM', 'TAPOS']
+HU_KEY = ['EXIDV', 'VBELN']
+
+def get_delta_dir(output_dir):
+    return os.path.join(output_dir, 'delta')
+
+def write_json_atomic(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def get_generation_path(output_dir, filename):
+    return os.path.join(get_delta_dir(output_dir), f"{filename}.generation")
+
+def load_generation(output_dir, filename):
+    # One marker per export, so warehouse shards (or hosts) sharing the output directory never rewrite each other's
+    path = get_generation_path(output_dir, filename)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip() or None
+
+def record_generation(output_dir, filename, generation):
+    os.makedirs(get_delta_dir(output_dir), exist_ok=True)
+    path = get_generation_path(output_dir, filename)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(generation)
+    os.replace(tmp_path, path)
+
+def read_previous(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def row_key(record, key_cols):
+    return '|'.join(str(record.get(c)) for c in key_cols)
+
+def keyed_rows(records, key_cols):
+    # Duplicate keys get an occurrence suffix so every row stays addressable
+    rows = {}
+    for record in records:
+        key = row_key(record, key_cols)
+        if key in rows:
+            n = 1
+            while f"{key}#{n}" in rows:
+                n += 1
+            key = f"{key}#{n}"
+        rows[key] = record
+    return rows
+
+def diff_records(previous, current, key_cols):
+    old_rows = keyed_rows(previous, key_cols)
+    new_rows = keyed_rows(current, key_cols)
+
+    added = [dict(row, _key=key) for key, row in new_rows.items() if key not in old_rows]
+    removed = [key for key in old_rows if key not in new_rows]
+    changed = [dict(row, _key=key) for key, row in new_rows.items() if key in old_rows and old_rows[key] != row]
+    return added, removed, changed
+
+def diff_dict(previous, current):
+    # Top-level keys only: a changed section is shipped whole
+    added = {k: v for k, v in current.items() if k not in previous}
+    removed = [k for k in previous if k not in current]
+    changed = {k: v for k, v in current.items() if k in previous and previous[k] != v}
+    return added, removed, changed
+
+def write_delta(output_dir, filename, previous, current, generation, key_cols=None):
+    delta_dir = get_delta_dir(output_dir)
+    os.makedirs(delta_dir, exist_ok=True)
+    delta_path = os.path.join(delta_dir, filename)
+    base_generation = load_generation(output_dir, filename)
+
+    # No usable base (first run, unknown generation, or rows exported before the key columns existed)
+    usable = previous is not None and base_generation is not None
+    if usable and key_cols:
+        usable = isinstance(previous, list) and all(all(c in r for c in key_cols) for r in previous)
+    if usable and not key_cols:
+        usable = isinstance(previous, dict)
+    if not usable:
+        if os.path.exists(delta_path):
+            os.remove(delta_path)
+        return None
+
+    if key_cols:
+        added, removed, changed = diff_records(previous, current, key_cols)
+    else:
+        added, removed, changed = diff_dict(previous, current)
+
+    write_json_atomic(delta_path, {
+        "file": filename,
+        "base_generation": base_generation,
+        "generation": generation,
+        "key": key_cols,
+        "added": added,
+        "removed": removed,
+        "changed": changed
+    })
+    return {"added": len(added), "removed": len(removed), "changed": len(changed)}
@@ -0,0 +1,523 @@
+import numpy as np
+import polars as pl
+
+from config.config import FLOOR_MAPPING, BREAK_MAPPING, REMOTE_PACKING_USER
+from events import log
+
+# Polars engine of process_data.py (--engine polars): the B-flow dashboards, the HU model and the
+# picking/packing hourly and daily stats as lazy query plans, collected together on polars' thread pool.
+# It takes the extracted pandas frames and hands dicts/pandas frames back to the writers of
+# process_data.py, so both engines write identical files. To that end float sums follow numpy's
+# pairwise summation (pandas' Series.sum), and the values the pandas engine rounds with Python's
+# round() are rounded the same way after collecting.
+
+# numpy sums up to this many values with 8 unrolled accumulators and splits longer runs recursively
+PAIRWISE_BLOCK = 128
+
+# --- FRAME CONVERSION ---
+
+def to_polars(df):
+    # Column by column, so no pyarrow is needed: numpy-backed columns as they are, the others through Python objects
+    import pandas as pd
+
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        if isinstance(series.dtype, np.dtype) and pd.api.types.is_numeric_dtype(series.dtype):
+            columns.append(pl.Series(name, series.to_numpy(), nan_to_null=True))
+        else:
+            values = series.to_numpy(dtype=object, na_value=None).tolist()
+            dtype = pl.Int64 if str(series.dtype) == 'Int64' else None
+            columns.append(pl.Series(name, values, dtype=dtype, strict=False))
+    return pl.DataFrame(columns)
+
+def to_pandas(df):
+    # pandas infers the dtypes from the values, as it does for the frames the pandas engine builds
+    import pandas as pd
+
+    columns = {}
+    for name, dtype in df.schema.items():
+        series = df.get_column(name)
+        if dtype.is_integer() and series.null_count() > 0:
+            columns[name] = pd.Series(series.to_list(), dtype='Int64')
+        elif dtype.is_float() or ((dtype.is_integer() or dtype == pl.Boolean) and series.null_count() == 0):
+            columns[name] = series.to_numpy()
+        else:
+            columns[name] = series.to_list()
+    return pd.DataFrame(columns)
+
+def missing_label(series):
+    # str() of the missing value the pandas engine meets when it iterates a column's unique values
+    missing = series[series.isna()]
+    return str(missing.iloc[0]) if len(missing) else 'nan'
+
+def join(left, right, on, how='left'):
+    # pd.merge semantics: left row order, null keys match each other, right keys cast to the left dtype
+    keys = [on] if isinstance(on, str) else on
+    left_schema, right_schema = left.collect_schema(), right.collect_schema()
+    right = right.with_columns(pl.col(k).cast(left_schema[k], strict=False) for k in keys if right_schema[k] != left_schema[k])
+    return left.join(right, on=keys, how=how, maintain_order='left', nulls_equal=True)
+
+# --- EXPRESSIONS ---
+
+def pairwise_segment_sums(values, starts, lengths):
+    # numpy's pairwise sum of every segment values[start:start + length], all segments at once: the
+    # 8 accumulators advance one block per step across the segments still that long, so every addition
+    # happens in the order of numpy's unrolled loop
+    sums = np.zeros(len(starts), dtype=values.dtype)
+    large = lengths > PAIRWISE_BLOCK
+    if large.any():
+        # Both halves of every long segment in one call, then added left + right
+        halves = lengths[large] // 2
+        halves -= halves % 8
+        parts = pairwise_segment_sums(values, np.concatenate([starts[large], starts[large] + halves]),
+                                      np.concatenate([halves, lengths[large] - halves]))
+        sums[large] = parts[:len(halves)] + parts[len(halves):]
+    small = ~large
+    starts, lengths = starts[small], lengths[small]
+    blocked = np.where(lengths >= 8, lengths - lengths % 8, 0)
+    lanes = np.arange(8)
+    unrolled = blocked > 0
+    unrolled_starts, unrolled_blocked = starts[unrolled], blocked[unrolled]
+    acc = values[unrolled_starts[:, None] + lanes]
+    for step in range(8, PAIRWISE_BLOCK, 8):
+        more = unrolled_blocked > step
+        if not more.any():
+            break
+        acc[more] += values[unrolled_starts[more, None] + step + lanes]
+    result = np.zeros(len(starts), dtype=values.dtype)
+    result[unrolled] = ((acc[:, 0] + acc[:, 1]) + (acc[:, 2] + acc[:, 3])) + ((acc[:, 4] + acc[:, 5]) + (acc[:, 6] + acc[:, 7]))
+    for j in range(7):
+        rest = blocked + j < lengths
+        result[rest] += values[starts[rest] + blocked[rest] + j]
+    sums[small] = result
+    return sums
+
+def pairwise_list_sums(lists):
+    # Series of float lists -> numpy's sum of each list
+    lengths = lists.list.len().to_numpy().astype(np.int64)
+    values = lists.explode().to_numpy()
+    return pl.Series(lists.name, pairwise_segment_sums(values, np.cumsum(lengths) - lengths, lengths))
+
+def group_sums(lf, by, columns):
+    # Per group of `by`: row count (_N) and the sums of `columns`. Float sums are numpy's over the group's
+    # rows in order (nulls counting as 0, as in pandas' Series.sum), bit-identical to the pandas engine's
+    schema = lf.collect_schema()
+    floats = [c for c in columns if schema[c].is_float()]
+    return lf.group_by(by).agg(
+        pl.len().alias('_N'),
+        *(pl.col(c).fill_null(0.0) if c in floats else pl.col(c).sum() for c in columns)
+    ).with_columns(
+        pl.col(c).map_batches(pairwise_list_sums, return_dtype=schema[c]) for c in floats
+    )
+
+def hour_expr(column):
+    # extract_hour of process_data.py
+    text = pl.col(column).cast(pl.String).str.strip_chars()
+    clock = text.str.extract(r'(\S+)$').str.split(':').list.first()
+    digits = text.str.split('.').list.first().str.zfill(6).str.slice(0, 2)
+    hour = pl.when(text.str.contains(':', literal=True)).then(clock).otherwise(digits).cast(pl.Int64, strict=False)
+    return (pl.when(text.is_null() | text.is_in(['None', 'NaN', 'NaT', '']))
+            .then(-1)
+            .otherwise(hour.fill_null(-1)))
+
+def flow_expr(column, route_to_flow):
+    # map_flow of process_data.py
+    mapping = {route: ('A-flow' if flow == 'Y2-flow' else flow) for route, flow in route_to_flow.items() if isinstance(route, str)}
+    return pl.col(column).cast(pl.String).replace_strict(mapping, default='unknown_flow', return_dtype=pl.String).fill_null('unknown_flow')
+
+def floor_expr(column, warehouse):
+    # map_floor of warehouses.py
+    if warehouse['floor']:
+        return pl.lit(warehouse['floor'])
+    return pl.col(column).cast(pl.String).fill_null('').replace_strict(FLOOR_MAPPING, default='unknown_floor', return_dtype=pl.String)
+
+def line_filter_expr(warehouse, dashboard=False):
+    # filter_lines of warehouses.py
+    vlpla = pl.col('VLPLA').cast(pl.String).fill_null('')
+    def starts_with(prefixes):
+        return pl.any_horizontal(vlpla.str.starts_with(p) for p in prefixes) if prefixes else pl.lit(False)
+    mask = starts_with(warehouse['vlpla_starts'])
+    if warehouse['vlpla_not_starts']:
+        mask &= ~starts_with(warehouse['vlpla_not_starts'])
+    if dashboard and warehouse['dashboard_exclude_vltyp']:
+        mask &= ~pl.col('VLTYP').cast(pl.String).fill_null('').is_in(list(warehouse['dashboard_exclude_vltyp']))
+    return mask
+
+def lprio_norm(column='LPRIO'):
+    # .astype(str).str.lstrip('0') of the pandas engine
+    return pl.col(column).cast(pl.String).str.strip_chars_start('0')
+
+def intensity(value, average):
+    return pl.when(pl.col(average) > 0).then((value / pl.col(average)).round(2)).otherwise(1.0)
+
+def round_to_cents(column, schema):
+    # Series.round(2); integer sums stay integers as in the pandas engine
+    return pl.col(column).round(2) if schema[column].is_float() else pl.col(column)
+
+# --- PICKING / PACKING STATS ---
+
+def picking_stats(picking):
+    # calculate_picking_stats of process_data.py
+    keys = ['QNAME', 'QDATU', 'HOUR', 'FLOW', 'FLOOR']
+    schema = picking.collect_schema()
+
+    bench = group_sums(picking, ['FLOW', 'FLOOR'], ['BRGEW', 'NISTA']).select(
+        'FLOW', 'FLOOR',
+        (pl.col('BRGEW') / pl.col('_N')).alias('AVG_WPL'),
+        (pl.col('NISTA') / pl.col('_N')).alias('AVG_IPL')
+    )
+
+    weight = pl.col('WEIGHT_PICKED')
+    hourly = join(
+        group_sums(picking.drop_nulls(keys), keys, ['NISTA', 'BRGEW'])
+        .rename({'_N': 'LINES_PICKED', 'NISTA': 'ITEMS_PICKED', 'BRGEW': 'WEIGHT_PICKED'})
+        .with_columns(_CONTEXTS=pl.len().over(['QNAME', 'QDATU', 'HOUR'])),
+        bench, ['FLOW', 'FLOOR']
+    ).sort(keys).select(
+        *keys, 'LINES_PICKED', 'ITEMS_PICKED',
+        round_to_cents('WEIGHT_PICKED', {'WEIGHT_PICKED': schema['BRGEW']}),
+        (pl.col('ITEMS_PICKED') / pl.col('LINES_PICKED')).round(2).alias('RATIO'),
+        (pl.col('HOUR').replace_strict(BREAK_MAPPING, default=1.0, return_dtype=pl.Float64) / pl.col('_CONTEXTS')).alias('EFFORT'),
+        pl.lit(0.0).alias('PRODUCTIVITY'),
+        intensity(weight / pl.col('LINES_PICKED'), 'AVG_WPL').alias('WEIGHT_INTENSITY'),
+        intensity(pl.col('ITEMS_PICKED') / pl.col('LINES_PICKED'), 'AVG_IPL').alias('ITEM_INTENSITY'),
+        weight.alias('WEIGHT_PICKED_EXACT')
+    )
+    return hourly, bench
+
+def picking_daily(hourly, bench):
+    daily_keys = ['QNAME', 'QDATU', 'FLOW', 'FLOOR']
+    weight = pl.col('WEIGHT_PICKED')
+    daily = hourly.group_by(daily_keys).agg(pl.col('LINES_PICKED', 'ITEMS_PICKED', 'WEIGHT_PICKED', 'EFFORT').sum()).sort(daily_keys)
+    return join(
+        daily.with_columns(pl.col('EFFORT').round(2), round_to_cents('WEIGHT_PICKED', daily.collect_schema())),
+        bench, ['FLOW', 'FLOOR']
+    ).select(
+        *daily_keys, 'LINES_PICKED', 'ITEMS_PICKED', 'WEIGHT_PICKED', 'EFFORT',
+        (pl.col('ITEMS_PICKED') / pl.col('LINES_PICKED')).round(2).alias('RATIO'),
+        (pl.col('LINES_PICKED') / pl.col('EFFORT')).round(2).alias('PRODUCTIVITY'),
+        intensity(weight / pl.col('LINES_PICKED'), 'AVG_WPL').alias('WEIGHT_INTENSITY'),
+        intensity(pl.col('ITEMS_PICKED') / pl.col('LINES_PICKED'), 'AVG_IPL').alias('ITEM_INTENSITY')
+    )
+
+def packing_stats(packing):
+    # calculate_packing_stats of process_data.py
+    keys = ['QNAME', 'QDATU', 'HOUR', 'FLOW', 'FLOOR']
+    return packing.drop_nulls(keys).group_by(keys).agg(
+        pl.col('OBJECTID').drop_nulls().n_unique().alias('BOXES_PACKED')
+    ).sort(keys).select(
+        *keys, 'BOXES_PACKED',
+        (pl.col('HOUR').replace_strict(BREAK_MAPPING, default=1.0, return_dtype=pl.Float64) / pl.len().over(['QNAME', 'QDATU', 'HOUR'])).alias('EFFORT'),
+        pl.lit(0.0).alias('PRODUCTIVITY')
+    )
+
+def packing_daily(hourly):
+    daily_keys = ['QNAME', 'QDATU', 'FLOW', 'FLOOR']
+    return hourly.group_by(daily_keys).agg(pl.col('BOXES_PACKED', 'EFFORT').sum()).sort(daily_keys).with_columns(
+        pl.col('EFFORT').round(2)
+    ).with_columns(
+        (pl.col('BOXES_PACKED') / pl.col('EFFORT')).round(2).alias('PRODUCTIVITY')
+    )
+
+def round_effort(hourly, count_col):
+    # The pandas engine rounds the hourly effort and productivity with Python's round(); the cube keeps the
+    # effort unrounded
+    effort = hourly.get_column('EFFORT').to_list()
+    counts = hourly.get_column(count_col).to_list()
+    return hourly.with_columns(
+        pl.Series('EFFORT', [round(e, 2) for e in effort], dtype=pl.Float64),
+        pl.Series('PRODUCTIVITY', [round(n / e, 2) if e > 0 else 0 for n, e in zip(counts, effort)], dtype=pl.Float64),
+        pl.Series('EFFORT_EXACT', effort, dtype=pl.Float64)
+    )
+
+def transform_shard(warehouse, df_ltap_filtered, df_routes_db, df_packing, route_to_flow):
+    # transform_shard of process_data.py
+    import pandas as pd
+
+    plans = {}
+    if df_ltap_filtered is not None and not df_ltap_filtered.empty:
+        df_ltap = df_ltap_filtered.assign(**{c: pd.to_numeric(df_ltap_filtered[c], errors='coerce').fillna(0) for c in ('NISTA', 'VSOLA', 'BRGEW')})
+        picking = join(to_polars(df_ltap).lazy(), to_polars(df_routes_db).lazy(), 'VBELN').with_columns(
+            FLOW=flow_expr('ROUTE', route_to_flow),
+            HOUR=hour_expr('QZEIT'),
+            FLOOR=floor_expr('VLTYP', warehouse)
+        ).filter(pl.col('FLOOR') != 'unknown_floor')
+        plans['picking'] = picking_stats(picking)
+
+    if df_packing is not None and not df_packing.empty:
+        hour = hour_expr('UTIME')
+        packing = to_polars(df_packing).lazy().with_columns(
+            FLOW=flow_expr('ROUTE', route_to_flow),
+            HOUR=pl.when((hour != -1) & pl.col('USERNAME').ne_missing(REMOTE_PACKING_USER)).then((hour + 1) % 24).otherwise(hour),
+            FLOOR=floor_expr('VLTYP', warehouse)
+        ).filter(pl.col('FLOOR') != 'unknown_floor').rename({'USERNAME': 'QNAME', 'UDATE': 'QDATU'})
+        plans['packing'] = (packing_stats(packing), None)
+
+    log("Calculating statistics...")
+    names = list(plans)
+    collected = pl.collect_all([plans[name][0] for name in names] + [plans[name][1] for name in names if plans[name][1] is not None])
+    hourly = {name: round_effort(collected[i], 'LINES_PICKED' if name == 'picking' else 'BOXES_PACKED') for i, name in enumerate(names)}
+    benches = dict(zip([name for name in names if plans[name][1] is not None], collected[len(names):]))
+
+    daily = {}
+    if 'picking' in hourly:
+        daily['picking'] = picking_daily(hourly['picking'].lazy(), benches['picking'].lazy())
+    if 'packing' in hourly:
+        daily['packing'] = packing_daily(hourly['packing'].lazy())
+    daily = dict(zip(daily, pl.collect_all(list(daily.values()))))
+
+    stats = {}
+    for activity, extract in (('picking', df_ltap_filtered), ('packing', df_packing)):
+        if extract is None:
+            continue
+        if activity in hourly and hourly[activity].height > 0:
+            stats[activity] = (to_pandas(hourly[activity]), to_pandas(daily[activity]))
+        else:
+            stats[activity] = (pd.DataFrame(), pd.DataFrame())
+    return stats
+
+# --- B-FLOW DASHBOARDS ---
+
+def build_hu_model(likp, ltap, hu, prio_grp, lines):
+    # build_hu_model of process_data.py
+    hu = hu.join(likp.select('VBELN').unique(), on='VBELN', how='semi', maintain_order='left')
+    model = join(hu, likp.select('VBELN', 'LGNUM', 'LPRIO', 'WAUHR'), 'VBELN')
+
+    if prio_grp is not None:
+        model = join(model, prio_grp, 'EXIDV').with_columns(
+            GROUPED=pl.when(pl.col('ZEXIDVGRP').is_not_null()).then(pl.lit('OK')).otherwise(pl.lit('NOT OK'))
+        )
+    else:
+        model = model.with_columns(GROUPED=pl.lit('NOT OK'), ZEXIDVGRP=pl.lit(None), PICKINIUSER=pl.lit(None))
+
+    model = model.with_columns(
+        FLOOR=pl.col('VLTYP').cast(pl.String).replace_strict(FLOOR_MAPPING, default='unknown_floor', return_dtype=pl.String)
+    )
+
+    # A box is only picked when all of its own LTAP lines (linked through TANUM) have QDATU set
+    pick_status = join(ltap.select('TANUM', 'QDATU'), hu.select('EXIDV', 'TANUM').drop_nulls('TANUM'), 'TANUM', how='inner').drop_nulls('EXIDV').group_by('EXIDV').agg(
+        IS_PICKED=pl.col('QDATU').is_not_null().all()
+    )
+    model = join(model, pick_status, 'EXIDV').with_columns(pl.col('IS_PICKED').fill_null(False))
+
+    deliv_stats = lines.drop_nulls('VBELN').group_by('VBELN').agg(LINES_COUNT=pl.len(), ITEMS_COUNT=pl.col('VSOLA').sum())
+    hu_counts = model.drop_nulls('VBELN').group_by('VBELN').agg(HU_PER_DELIV=pl.len())
+    return join(join(model, deliv_stats, 'VBELN'), hu_counts, 'VBELN').with_columns(
+        LINES_PER_HU=(pl.col('LINES_COUNT') / pl.col('HU_PER_DELIV')).round(2),
+        ITEMS_PER_HU=(pl.col('ITEMS_COUNT') / pl.col('HU_PER_DELIV')).round(2)
+    )
+
+def metrics_plan(lines, by):
+    # Sums behind get_metrics_local of process_data.bflow_dept_outputs per group of `by`, split by pick status
+    lines = lines.with_columns(_PICKED=pl.col('QDATU').is_not_null())
+    return (
+        group_sums(lines, by, ['VSOLA', 'BRGEW', 'VOLUM']),
+        group_sums(lines, [*by, '_PICKED'], ['NISTA', 'VSOLA', 'BRGEW', 'VOLUM'])
+    )
+
+def empty_metrics():
+    empty = {"lines": 0, "items": 0, "requested_items": 0, "kg": 0.0, "vol": 0.0}
+    return {"total": dict(empty), "picked": dict(empty), "not_picked": dict(empty)}
+
+def metrics_dicts(totals, splits, by, labels):
+    # get_metrics_local per key of `by` in `labels`, from the collected metrics_plan
+    def agg(row, qty_col):
+        if row is None:
+            return empty_metrics()["total"]
+        return {
+            "lines": int(row['_N']),
+            "items": int(row[qty_col]),
+            "requested_items": int(row['VSOLA']),
+            "kg": round(float(row['BRGEW']), 2),
+            "vol": round(float(row['VOLUM']), 2)
+        }
+
+    def key(row, columns):
+        return tuple(row[c] for c in columns)
+
+    total_rows = {key(row, by): row for row in totals.iter_rows(named=True)}
+    split_rows = {key(row, [*by, '_PICKED']): row for row in splits.iter_rows(named=True)}
+    result = {}
+    for k in labels:
+        result[k] = {
+            "total": agg(total_rows.get(k), 'VSOLA'),
+            "picked": agg(split_rows.get((*k, True)), 'NISTA'),
+            "not_picked": agg(split_rows.get((*k, False)), 'VSOLA')
+        }
+    return result
+
+def bflow_dept_outputs(scenario, frames, warehouses):
+    # bflow_dept_outputs of process_data.py: every department's plans are collected in one go
+    likp = to_polars(frames['likp']).lazy()
+    ltap = to_polars(frames['ltap']).lazy()
+    hu = to_polars(frames['hu']).lazy()
+    prio_grp = to_polars(frames['prio_grp']).lazy() if not frames['prio_grp'].empty else None
+    vltyp_missing = missing_label(frames['ltap']['VLTYP'])
+    kober_missing = missing_label(frames['ltap']['KOBER'])
+
+    suffix = scenario['suffix']
+    dept_mapping = {wh['lgnum']: f"dashboard_data_{wh['prefix']}{suffix}.json" for wh in warehouses}
+    dept_warehouses = {wh['lgnum']: wh for wh in warehouses}
+
+    dept_lines = {lgnum: ltap.filter(pl.col('LGNUM') == lgnum).filter(line_filter_expr(dept_warehouses[lgnum], dashboard=True)) for lgnum in dept_mapping}
+    hu_model = build_hu_model(likp, ltap, hu, prio_grp, pl.concat(list(dept_lines.values()))).cache()
+
+    if scenario['name'] == 'today':
+        closed = to_polars(frames['closed']).lazy()
+        ltap_closed = to_polars(frames['ltap_closed']).lazy()
+        hu_closed = to_polars(frames['hu_closed']).lazy()
+
+    plans = {}
+    for lgnum in dept_mapping:
+        wh = dept_warehouses[lgnum]
+        likp_dept = likp.filter(pl.col('LGNUM') == lgnum).with_columns(LPRIO_NORM=lprio_norm())
+        lines = dept_lines[lgnum].with_columns(_ALL=pl.lit(True))
+        hu_merged = hu_model.filter(pl.col('LGNUM') == lgnum)
+        merged = join(dept_lines[lgnum], likp_dept.select('VBELN', 'LPRIO', 'WAUHR'), 'VBELN').with_columns(LPRIO_NORM=lprio_norm())
+        if wh['floor_breakdown']:
+            merged = merged.with_columns(
+                FLOOR=pl.col('VLTYP').cast(pl.String).replace_strict(FLOOR_MAPPING, default='unknown_floor', return_dtype=pl.String)
+            )
+
+        cutoffs = likp_dept.drop_nulls('WAUHR').group_by('WAUHR').agg(
+            total_deliveries=pl.len(),
+            dp10_deliveries=(pl.col('LPRIO_NORM') == '10').sum()
+        )
+        cutoffs = join(cutoffs, merged.group_by('WAUHR').agg(
+            total_lines=pl.len(),
+            picked_lines=pl.col('QDATU').is_not_null().sum(),
+            dp10_lines=(pl.col('LPRIO_NORM') == '10').sum()
+        ), 'WAUHR')
+        cutoffs = join(cutoffs, hu_merged.group_by('WAUHR').agg(
+            total_hus=pl.len(),
+            picked_hus=pl.col('IS_PICKED').sum()
+        ), 'WAUHR').sort('WAUHR')
+
+        dept = {
+            'open_deliveries': likp_dept.select(pl.len()),
+            'hu_summary': hu_merged.select(total=pl.len(), picked=pl.col('IS_PICKED').sum()),
+            'line_summary': group_sums(lines, ['_ALL'], ['VSOLA']),
+            'priorities': merged.drop_nulls('LPRIO_NORM').group_by('LPRIO_NORM').len().sort('LPRIO_NORM'),
+            'priority_hus': hu_merged.with_columns(LPRIO_NORM=lprio_norm()).drop_nulls('LPRIO_NORM').group_by('LPRIO_NORM').len().sort('LPRIO_NORM'),
+            'cutoffs': cutoffs,
+            'summary': metrics_plan(lines, ['_ALL']),
+            'vltyp_order': lines.select(pl.col('VLTYP').unique(maintain_order=True)),
+            'vltyp': metrics_plan(lines, ['VLTYP']),
+            'kober_order': lines.select(pl.col('KOBER').unique(maintain_order=True)),
+            'kober': metrics_plan(lines, ['KOBER']),
+            'lines_export': merged.select(c for c in ['VBELN', 'TANUM', 'TAPOS', 'LPRIO', 'WAUHR', 'VLPLA', 'VLTYP', 'KOBER', 'NISTA', 'BRGEW', 'VOLUM', 'QDATU', 'VSOLA', 'FLOOR'] if c in merged.collect_schema()),
+            'hu_export': hu_merged
+        }
+
+        if scenario['name'] == 'today':
+            closed_dept = closed.filter(pl.col('LGNUM') == lgnum)
+            ltap_closed_dept = ltap_closed.filter(pl.col('LGNUM') == lgnum).filter(line_filter_expr(wh, dashboard=True)).with_columns(_ALL=pl.lit(True))
+            dept['closed'] = closed_dept.select(pl.len())
+            dept['closed_hus'] = hu_closed.join(closed_dept.select('VBELN'), on='VBELN', how='semi').select(pl.len())
+            dept['closed_lines'] = group_sums(ltap_closed_dept, ['_ALL'], ['NISTA', 'VSOLA', 'VOLUM', 'BRGEW'])
+
+        if wh['floor_breakdown']:
+            floor_lines = merged.filter(pl.col('FLOOR') != 'unknown_floor')
+            dp10 = pl.col('LPRIO_NORM') == '10'
+            dept['floor_order'] = floor_lines.select(pl.col('FLOOR').unique(maintain_order=True))
+            dept['floors'] = metrics_plan(floor_lines, ['FLOOR'])
+            dept['floor_extra'] = floor_lines.group_by('FLOOR').agg(
+                deliveries=pl.col('VBELN').drop_nulls().n_unique(),
+                dp10_deliveries=pl.col('VBELN').filter(dp10).drop_nulls().n_unique(),
+                dp10_lines=dp10.sum()
+            )
+            floor_vbelns = floor_lines.select('FLOOR', 'VBELN').drop_nulls('VBELN').unique()
+            dept['floor_hu'] = join(floor_vbelns, hu_merged.select('VBELN', 'IS_PICKED'), 'VBELN', how='inner').group_by('FLOOR').agg(
+                total=pl.len(),
+                picked=pl.col('IS_PICKED').sum(),
+                not_picked=(~pl.col('IS_PICKED')).sum()
+            )
+        plans[lgnum] = dept
+
+    # One collect for all departments: polars runs the independent plans in parallel and shares their common inputs
+    names = [(lgnum, name) for lgnum, dept in plans.items() for name in dept]
+    flat = []
+    for lgnum, name in names:
+        plan = plans[lgnum][name]
+        flat.extend(plan if isinstance(plan, tuple) else [plan])
+    collected = iter(pl.collect_all(flat))
+    results = {}
+    for lgnum, name in names:
+        plan = plans[lgnum][name]
+        results.setdefault(lgnum, {})[name] = tuple(next(collected) for _ in plan) if isinstance(plan, tuple) else next(collected)
+
+    for lgnum, filename in dept_mapping.items():
+        r = results[lgnum]
+        total_hus = r['hu_summary'].item(0, 'total')
+        picked_hus = r['hu_summary'].item(0, 'picked')
+        total_lines = r['line_summary'].item(0, '_N') if r['line_summary'].height else 0
+        total_items = np.float64(r['line_summary'].item(0, 'VSOLA')) if r['line_summary'].height else np.float64(0)
+
+        dashboard_json = {
+            "open_deliveries": r['open_deliveries'].item(),
+            "open_hus": total_hus,
+            "hu_summary": {
+                "total": total_hus,
+                "picked": picked_hus,
+                "not_picked": total_hus - picked_hus,
+                "avg_lines_per_hu": round(total_lines / total_hus, 2) if total_hus > 0 else 0,
+                "avg_items_per_hu": round(total_items / total_hus, 2) if total_hus > 0 else 0
+            },
+            "priorities": {str(k): int(v) for k, v in r['priorities'].iter_rows()},
+            "priority_hus": {str(k): int(v) for k, v in r['priority_hus'].iter_rows()},
+            "cutoffs": {
+                str(row['WAUHR']): {
+                    "total_deliveries": int(row['total_deliveries']),
+                    "dp10_deliveries": int(row['dp10_deliveries']),
+                    "total_lines": int(row['total_lines'] or 0),
+                    "picked_lines": int(row['picked_lines'] or 0),
+                    "dp10_lines": int(row['dp10_lines'] or 0),
+                    "total_hus": int(row['total_hus'] or 0),
+                    "picked_hus": int(row['picked_hus'] or 0)
+                } for row in r['cutoffs'].iter_rows(named=True)
+            },
+            "summary": metrics_dicts(*r['summary'], ['_ALL'], [(True,)])[(True,)],
+            "vltyp_distribution": {},
+            "kober_distribution": {}
+        }
+
+        # Like the pandas engine, a missing VLTYP/KOBER is listed (as str() of the missing value) with empty metrics
+        for column, distribution, missing in (('VLTYP', 'vltyp', vltyp_missing), ('KOBER', 'kober', kober_missing)):
+            values = r[f'{distribution}_order'].get_column(column).to_list()
+            metrics = metrics_dicts(*r[distribution], [column], [(v,) for v in values if v is not None])
+            for v in values:
+                dashboard_json[f"{distribution}_distribution"][missing if v is None else str(v)] = empty_metrics() if v is None else metrics[(v,)]
+
+        if scenario['name'] == 'today':
+            closed_lines = r['closed_lines'].row(0, named=True) if r['closed_lines'].height else {'_N': 0, 'NISTA': 0, 'VSOLA': 0, 'VOLUM': 0.0, 'BRGEW': 0.0}
+            dashboard_json["closed_today"] = {
+                "deliveries": int(r['closed'].item()),
+                "hus": int(r['closed_hus'].item()),
+                "lines": int(closed_lines['_N']),
+                "items": int(closed_lines['NISTA']),
+                "requested_items": int(closed_lines['VSOLA']),
+                "vol": round(float(np.float64(closed_lines['VOLUM']) / 1000000), 3), # in M3
+                "kg": round(float(closed_lines['BRGEW']), 2)
+            }
+
+        if dept_warehouses[lgnum]['floor_breakdown']:
+            dashboard_json["floors"] = {}
+            floors = r['floor_order'].get_column('FLOOR').to_list()
+            metrics = metrics_dicts(*r['floors'], ['FLOOR'], [(f,) for f in floors])
+            extra = {row['FLOOR']: row for row in r['floor_extra'].iter_rows(named=True)}
+            floor_hu = {row['FLOOR']: row for row in r['floor_hu'].iter_rows(named=True)}
+            for floor in floors:
+                floor_metrics = metrics[(floor,)]
+                floor_metrics["total"]["deliveries"] = int(extra[floor]['deliveries'])
+                floor_metrics["total"]["dp10_deliveries"] = int(extra[floor]['dp10_deliveries'])
+                floor_metrics["total"]["dp10_lines"] = int(extra[floor]['dp10_lines'])
+                hu_row = floor_hu.get(floor, {'total': 0, 'picked': 0, 'not_picked': 0})
+                floor_metrics["hu_summary"] = {
+                    "total": int(hu_row['total']),
+                    "picked": int(hu_row['picked']),
+                    "not_picked": int(hu_row['not_picked'])
+                }
+                dashboard_json["floors"][floor] = floor_metrics
+
+        yield lgnum, filename, dashboard_json, to_pandas(r['lines_export']), to_pandas(r['hu_export'])
@@ -0,0 +1,68 @@
+import sys
+import json
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Progress reporting for process_data.py.
+# Text mode prints the usual human readable lines; event mode (--events) writes one JSON
+# object per line instead, flushed immediately so callers can react while the run continues.
+
+_state = {
+    'events': False,
+    'generation': None
+}
+
+# Shards run in threads: one lock keeps lines whole, the thread-local context tags each shard's events
+_lock = threading.Lock()
+_context = threading.local()
+
+def new_generation_id():
+    return f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+def configure(events=False, generation=None):
+    _state['events'] = events
+    _state['generation'] = generation or new_generation_id()
+    return _state['generation']
+
+def next_generation():
+    _state['generation'] = new_generation_id()
+    return _state['generation']
+
+def get_generation():
+    return _state['generation']
+
+@contextmanager
+def context(**fields):
+    previous = getattr(_context, 'fields', {})
+    _context.fields = {**previous, **fields}
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+def emit(event, message=None, **fields):
+    bound = getattr(_context, 'fields', {})
+    if _state['events']:
+        record = {
+            "ts": datetime.now().isoformat(timespec='milliseconds'),
+            "event": event,
+            "generation": _state['generation']
+        }
+        if message is not None:
+            record["message"] = message
+        record.update(bound)
+        record.update(fields)
+        line = json.dumps(record, default=str)
+    elif message is not None:
+        label = bound.get('shard_name')
+        line = f"[{label}] {message}" if label else message
+    else:
+        return
+    with _lock:
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+
+def log(message):
+    emit('log', message)
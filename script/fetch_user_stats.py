@@ -1,19 +1,29 @@
 import os
+import re
 import sys
+import math
 import argparse
 import json
-import pandas as pd
 from datetime import datetime, timedelta
-import snowflake.connector
-from dotenv import load_dotenv
 
 # Add script directory to sys.path to import config
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from config.config import BREAK_MAPPING
+from config.config import BREAK_MAPPING, WAREHOUSES
+from warehouses import get_warehouses, packing_action_sql, filter_lines
+from sketches import summarize as summarize_productivity
+
+# SAP user names: up to 12 characters, no quotes or spaces (the name is used inside the SQL filter)
+QNAME_PATTERN = re.compile(r'[A-Z0-9_.@-]{1,12}')
+
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+
+# Results prepared by `process_data.py --precompute-users` (output/user_stats/<LGNUM>_<activity>/<QNAME>.json)
+# are served instead of querying Snowflake while they are younger than this
+PREPARED_MAX_AGE_MINUTES = 60
 
 def extract_hour(time_val):
     try:
-        if pd.isna(time_val):
+        if time_val is None or (isinstance(time_val, float) and math.isnan(time_val)):
             return -1
         val_str = str(time_val).strip()
         if val_str in ("None", "NaN", "NaT", ""):
@@ -28,16 +38,35 @@ def extract_hour(time_val):
     except Exception:
         return -1
 
-def main():
-    parser = argparse.ArgumentParser(description="Fetch historical user stats from Snowflake.")
-    parser.add_argument('--qname', type=str, required=True, help="Username to search for.")
-    parser.add_argument('--lgnum', type=str, required=True, choices=['245', '266'], help="LGNUM (245 for MS, 266 for CVNS).")
-    parser.add_argument('--activity', type=str, default='picking', choices=['picking', 'packing'], help="Activity type.")
-    args = parser.parse_args()
+def get_prepared_path(output_dir, lgnum, activity, qname):
+    return os.path.join(output_dir, 'user_stats', f"{lgnum}_{activity}", f"{qname}.json")
 
-    qname_search = args.qname.upper()
-    lgnum_search = args.lgnum
-    activity = args.activity
+def load_prepared(output_dir, lgnum, activity, qname):
+    path = get_prepared_path(output_dir, lgnum, activity, qname)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def is_fresh(result, max_age_minutes=PREPARED_MAX_AGE_MINUTES):
+    prepared_at = datetime.fromisoformat(result["prepared_at"])
+    return prepared_at.date() == datetime.today().date() and datetime.now() - prepared_at < timedelta(minutes=max_age_minutes)
+
+def save_prepared(output_dir, result):
+    path = get_prepared_path(output_dir, result["lgnum"], result["activity"], result["qname"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(dict(result, prepared_at=datetime.now().isoformat(timespec='seconds')), f)
+    os.replace(tmp_path, path)
+    return path
+
+def connect_snowflake():
+    import snowflake.connector
+    from dotenv import load_dotenv
 
     load_dotenv()
 
@@ -59,116 +88,98 @@ def main():
     else:
         conn_params['authenticator'] = os.getenv('authenticator')
 
-    try:
-        conn = snowflake.connector.connect(**conn_params)
-    except Exception as e:
-        print(json.dumps({"success": False, "error": f"Failed to connect to Snowflake: {str(e)}"}))
-        return
+    return snowflake.connector.connect(**conn_params)
 
-    cur = conn.cursor()
+def query_history(cur, qnames, warehouse, activity):
+    # History of one or more users (a batch shares one query); rows of every user, keyed by QNAME
+    import pandas as pd
 
+    lgnum_search = warehouse['lgnum']
+    qnames_str = ", ".join(f"'{qname}'" for qname in qnames)
     df_final = pd.DataFrame()
 
-    try:
-        if activity == 'picking':
-            columns = ['NISTA', 'QDATU', 'QZEIT', 'QNAME', 'VLPLA', 'LGNUM']
-            cols_str = ", ".join(columns)
-            
-            # Picking Query
-            query = f"""
-            SELECT {cols_str}
-            FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_LTAP
-            WHERE QNAME = '{qname_search}'
-              AND LGNUM = '{lgnum_search}'
-              AND QDATU >= '2025-01-01'
-              AND VBELN IS NOT NULL
-              AND NLPLA IS NOT NULL
-              AND VBELN = NLPLA
-            """
-            cur.execute(query)
-            df = pd.DataFrame(cur.fetchall(), columns=columns)
-            
-            if not df.empty:
-                cvns_vlpla_starts = ['L', 'F', 'X', 'N', 'O', 'Y', 'W']
-                cvns_vlpla_not_starts = ['YES', 'NO', 'LONGGOODS', 'NCS', 'OSO']
-                ms_vlpla_starts = ['B', 'C', 'D', 'V', 'E']
-
-                def filter_row(row):
-                    vlpla = str(row['VLPLA']) if row['VLPLA'] else ""
-                    if lgnum_search == '266': # CVNS
-                        if not any(vlpla.startswith(s) for s in cvns_vlpla_starts): return False
-                        if any(vlpla.startswith(s) for s in cvns_vlpla_not_starts): return False
-                        return True
-                    else: # MS (245)
-                        return any(vlpla.startswith(s) for s in ms_vlpla_starts)
-
-                df_filtered = df[df.apply(filter_row, axis=1)].copy()
-                if not df_filtered.empty:
-                    df_filtered['HOUR'] = df_filtered['QZEIT'].apply(extract_hour)
-                    df_filtered['TOTAL_COUNT'] = 1 # Each row is 1 line
-                    df_filtered['ITEMS_SUM'] = pd.to_numeric(df_filtered['NISTA'], errors='coerce').fillna(0)
-                    df_filtered['QDATU'] = pd.to_datetime(df_filtered['QDATU'])
-                    df_final = df_filtered
-
-        else: # activity == 'packing'
-            # 1. Find all boxes the user touched (ZORF_BOX_CLOSING or WEBMREMOTEWS for MS)
-            # For specific user history, we don't necessarily need the 5-day attribution logic 
-            # as strictly as the daily monitor, but let's at least ensure we pull their own closing hits.
-            
-            action_filter = f"(TCODE = 'ZORF_BOX_CLOSING' OR USERNAME = 'WEBMREMOTEWS')" if lgnum_search == '245' else "TCODE = 'ZORF_BOX_CLOSING'"
+    if activity == 'picking':
+        columns = ['NISTA', 'QDATU', 'QZEIT', 'QNAME', 'VLPLA', 'LGNUM']
+        cols_str = ", ".join(columns)
+        
+        # Picking Query
+        query = f"""
+        SELECT {cols_str}
+        FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_LTAP
+        WHERE QNAME IN ({qnames_str})
+          AND LGNUM = '{lgnum_search}'
+          AND QDATU >= '2025-01-01'
+          AND VBELN IS NOT NULL
+          AND NLPLA IS NOT NULL
+          AND VBELN = NLPLA
+        """
+        cur.execute(query)
+        df = pd.DataFrame(cur.fetchall(), columns=columns)
+        
+        if not df.empty:
+            df_filtered = filter_lines(df, warehouse).copy()
+            if not df_filtered.empty:
+                df_filtered['HOUR'] = df_filtered['QZEIT'].apply(extract_hour)
+                df_filtered['TOTAL_COUNT'] = 1 # Each row is 1 line
+                df_filtered['ITEMS_SUM'] = pd.to_numeric(df_filtered['NISTA'], errors='coerce').fillna(0)
+                df_filtered['QDATU'] = pd.to_datetime(df_filtered['QDATU'])
+                df_final = df_filtered
+
+    else: # activity == 'packing'
+        # 1. Find all boxes the user touched (ZORF_BOX_CLOSING, plus the remote interface user where the warehouse counts it)
+        # For specific user history, we don't necessarily need the 5-day attribution logic 
+        # as strictly as the daily monitor, but let's at least ensure we pull their own closing hits.
+        
+        action_filter = packing_action_sql(warehouse)
+        
+        packing_query = f"""
+        WITH USER_PACKS AS (
+            SELECT OBJECTID, USERNAME, UDATE, UTIME
+            FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_CDHDR
+            WHERE USERNAME IN ({qnames_str})
+              AND UDATE >= '20250101'
+              AND OBJECTCLAS = 'HANDL_UNIT'
+              AND {action_filter}
+        ),
+        PACK_EXIDV AS (
+            SELECT DISTINCT VENUM, EXIDV
+            FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_VEKP
+            WHERE VENUM IN (SELECT OBJECTID FROM USER_PACKS)
+        ),
+        HU_INFO AS (
+            SELECT EXIDV, LGNUM, VLTYP, ROUTE FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HU_TO_LINK
+            UNION
+            SELECT EXIDV, LGNUM, VLTYP, ROUTE FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HUTO_LNKHIS
+        )
+        SELECT 
+            H.OBJECTID, H.USERNAME, H.UDATE, H.UTIME, 
+            I.LGNUM, I.VLTYP, I.ROUTE
+        FROM USER_PACKS H
+        JOIN PACK_EXIDV E ON H.OBJECTID = E.VENUM
+        JOIN HU_INFO I ON E.EXIDV = I.EXIDV
+        WHERE I.LGNUM = '{lgnum_search}'
+        """
+        cur.execute(packing_query)
+        df_pack = pd.DataFrame(cur.fetchall(), columns=['OBJECTID', 'QNAME', 'UDATE', 'UTIME', 'LGNUM', 'VLTYP', 'ROUTE'])
+        
+        if not df_pack.empty:
+            # Basic cleanup
+            df_pack['HOUR'] = df_pack['UTIME'].apply(extract_hour)
+            df_pack['QDATU'] = pd.to_datetime(df_pack['UDATE'], format='%Y%m%d')
             
-            packing_query = f"""
-            WITH USER_PACKS AS (
-                SELECT OBJECTID, USERNAME, UDATE, UTIME
-                FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_CDHDR
-                WHERE USERNAME = '{qname_search}'
-                  AND UDATE >= '20250101'
-                  AND OBJECTCLAS = 'HANDL_UNIT'
-                  AND {action_filter}
-            ),
-            PACK_EXIDV AS (
-                SELECT DISTINCT VENUM, EXIDV
-                FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_VEKP
-                WHERE VENUM IN (SELECT OBJECTID FROM USER_PACKS)
-            ),
-            HU_INFO AS (
-                SELECT EXIDV, LGNUM, VLTYP, ROUTE FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HU_TO_LINK
-                UNION
-                SELECT EXIDV, LGNUM, VLTYP, ROUTE FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HUTO_LNKHIS
-            )
-            SELECT 
-                H.OBJECTID, H.USERNAME, H.UDATE, H.UTIME, 
-                I.LGNUM, I.VLTYP, I.ROUTE
-            FROM USER_PACKS H
-            JOIN PACK_EXIDV E ON H.OBJECTID = E.VENUM
-            JOIN HU_INFO I ON E.EXIDV = I.EXIDV
-            WHERE I.LGNUM = '{lgnum_search}'
-            """
-            cur.execute(packing_query)
-            df_pack = pd.DataFrame(cur.fetchall(), columns=['OBJECTID', 'QNAME', 'UDATE', 'UTIME', 'LGNUM', 'VLTYP', 'ROUTE'])
+            # Deduplicate by OBJECTID per user and day (in case of double hits)
+            df_pack = df_pack.drop_duplicates(subset=['QNAME', 'OBJECTID', 'QDATU'])
             
-            if not df_pack.empty:
-                # Basic cleanup
-                df_pack['HOUR'] = df_pack['UTIME'].apply(extract_hour)
-                df_pack['QDATU'] = pd.to_datetime(df_pack['UDATE'], format='%Y%m%d')
-                
-                # Deduplicate by OBJECTID per day (in case of double hits)
-                df_pack = df_pack.drop_duplicates(subset=['OBJECTID', 'QDATU'])
-                
-                df_pack['TOTAL_COUNT'] = 1 # Each row is 1 box
-                df_pack['ITEMS_SUM'] = 0 # No items concept in packing stats as requested
-                df_final = df_pack
+            df_pack['TOTAL_COUNT'] = 1 # Each row is 1 box
+            df_pack['ITEMS_SUM'] = 0 # No items concept in packing stats as requested
+            df_final = df_pack
 
-    except Exception as e:
-        print(json.dumps({"success": False, "error": f"Query execution failed: {str(e)}"}))
-        return
-    finally:
-        cur.close()
-        conn.close()
+    return df_final
 
-    if df_final.empty:
-        print(json.dumps({"success": False, "error": f"No {activity} data found for this user."}))
-        return
+def build_result(df_final, qname_search, lgnum_search, activity, end_date, sketches=None):
+    # The JSON answer for one user from their rows of query_history(); percentile bands over the sketch
+    # window ending at end_date (`sketches`: that window's sketches, when already read)
+    df_final = df_final.copy()
 
     # Aggregate
     df_final['WEEK'] = df_final['QDATU'].apply(lambda x: x.isocalendar()[1])
@@ -203,14 +214,66 @@ def main():
     
     daily_stats = daily_stats.sort_values(['DATE'], ascending=False)
     result_data = daily_stats.drop(columns=['QDATU']).to_dict(orient='records')
+
+    # Hourly productivity percentiles of the user and their LGNUM/activity peers, from the pipeline's daily sketches
+    productivity_percentiles = summarize_productivity(lgnum_search, activity, qname_search, end_date, sketches)
     
-    print(json.dumps({
+    return {
         "success": True,
         "data": result_data,
         "qname": qname_search,
         "lgnum": lgnum_search,
-        "activity": activity
-    }))
+        "activity": activity,
+        "productivity_percentiles": productivity_percentiles
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch historical user stats from Snowflake.")
+    parser.add_argument('--qname', type=str, required=True, help="Username to search for.")
+    parser.add_argument('--lgnum', type=str, required=True, choices=list(WAREHOUSES), help="LGNUM (" + ", ".join(f"{k} for {v['name']}" for k, v in WAREHOUSES.items()) + ").")
+    parser.add_argument('--activity', type=str, default='picking', choices=['picking', 'packing'], help="Activity type.")
+    parser.add_argument('--refresh', action='store_true', help="Always query Snowflake, even when a prepared result is fresh.")
+    args = parser.parse_args()
+
+    qname_search = args.qname.strip().upper()
+    lgnum_search = args.lgnum
+    warehouse = get_warehouses([lgnum_search])[0]
+    activity = args.activity
+
+    # Answer invalid requests before importing pandas/snowflake, which dominate startup time
+    if not QNAME_PATTERN.fullmatch(qname_search):
+        print(json.dumps({"success": False, "error": f"Invalid username: {args.qname}"}))
+        return
+
+    # Prepared by the last process_data.py run, also without pandas/snowflake
+    if not args.refresh:
+        prepared = load_prepared(OUTPUT_DIR, lgnum_search, activity, qname_search)
+        if prepared and is_fresh(prepared):
+            print(json.dumps(prepared))
+            return
+
+    try:
+        conn = connect_snowflake()
+    except Exception as e:
+        print(json.dumps({"success": False, "error": f"Failed to connect to Snowflake: {str(e)}"}))
+        return
+
+    cur = conn.cursor()
+
+    try:
+        df_final = query_history(cur, [qname_search], warehouse, activity)
+    except Exception as e:
+        print(json.dumps({"success": False, "error": f"Query execution failed: {str(e)}"}))
+        return
+    finally:
+        cur.close()
+        conn.close()
+
+    if df_final.empty:
+        print(json.dumps({"success": False, "error": f"No {activity} data found for this user."}))
+        return
+
+    print(json.dumps(build_result(df_final, qname_search, lgnum_search, activity, datetime.today().strftime('%Y-%m-%d'))))
 
 if __name__ == "__main__":
     main()
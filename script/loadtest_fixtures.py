@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config.config import FLOOR_MAPPING
+from events import configure, next_generation, log
+from warehouses import get_warehouses
+
+# Output fixtures for the dashboard API load test (web/scripts/loadtest.mjs).
+# Synthetic Snowflake-shaped frames are pushed through process_data.py's own writers, so the files
+# (dashboard JSON, delta snapshots, stats CSVs, cube, users index) have production structure at any size.
+# --scale 1 is roughly a busy day per warehouse; every row count grows linearly with it.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT_DIR = os.path.join(SCRIPT_DIR, 'loadtest_output')
+
+# Per warehouse at --scale 1
+OPEN_DELIVERIES = {'today': 1500, 'backlog': 600, 'future': 1200}
+CLOSED_DELIVERIES = 800
+PICKS_PER_DAY = 20000
+BOXES_PER_DAY = 6000
+USERS = 150
+
+# Share of open lines confirmed between the two generations, so the delta files have realistic content
+CONFIRMED_BETWEEN_GENERATIONS = 0.05
+
+VLPLA_SAMPLES = {
+    '245': ['B01-02', 'C11-04', 'D20-01', 'V03-07', 'E15-02'],
+    '266': ['L01-02', 'F22-01', 'X09-03', 'N14-05', 'O02-02', 'Y31-01', 'W07-04']
+}
+
+def scaled(count, scale):
+    return max(1, int(count * scale))
+
+def load_routes():
+    import pandas as pd
+
+    df_routes = pd.read_csv(os.path.join(SCRIPT_DIR, 'data', 'routes.csv'), dtype=str)
+    return dict(zip(df_routes['ROUTE'], df_routes['FLOW'])), list(df_routes['ROUTE'])
+
+def vltyp_choices(warehouse):
+    return ['REP', 'SSA'] if warehouse['floor'] else list(FLOOR_MAPPING)
+
+def build_scenario_frames(rng, scenario, warehouse, scale, ids):
+    import pandas as pd
+
+    lgnum = warehouse['lgnum']
+    vltyps = vltyp_choices(warehouse)
+    vlplas = VLPLA_SAMPLES.get(lgnum) or [f"{warehouse['vlpla_starts'][0]}01-01"]
+
+    def deliveries(count):
+        rows = []
+        for _ in range(count):
+            ids['vbeln'] += 1
+            rows.append((lgnum, rng.choice(['10', '02', '03', '05']), rng.choice(['08:00:00', '12:00:00', '16:00:00', '20:00:00']), ids['vbeln']))
+        return pd.DataFrame(rows, columns=['LGNUM', 'LPRIO', 'WAUHR', 'VBELN'])
+
+    def lines(df_likp, picked_share):
+        ltap_rows, hu_rows = [], []
+        for vbeln in df_likp['VBELN']:
+            hus = []
+            for _ in range(rng.randint(1, 3)):
+                ids['exidv'] += 1
+                hus.append(ids['exidv'])
+            for tapos in range(1, rng.randint(1, 8) + 1):
+                ids['tanum'] += 1
+                picked = rng.random() < picked_share
+                vltyp = rng.choice(vltyps)
+                vsola = rng.randint(1, 12)
+                ltap_rows.append((
+                    lgnum, vbeln, rng.choice(vlplas), vltyp, str(vbeln), scenario['date'] if picked else None,
+                    rng.choice(['K1', 'K2', 'K3']), float(vsola if picked else 0), round(rng.uniform(0.1, 25), 3),
+                    round(rng.uniform(100, 50000), 1), ids['tanum'], str(tapos).zfill(4), float(vsola)
+                ))
+                hu_rows.append((vbeln, rng.choice(hus), vltyp, ids['tanum']))
+        df_ltap = pd.DataFrame(ltap_rows, columns=['LGNUM', 'VBELN', 'VLPLA', 'VLTYP', 'NLPLA', 'QDATU', 'KOBER', 'NISTA', 'BRGEW', 'VOLUM', 'TANUM', 'TAPOS', 'VSOLA'])
+        df_hu = pd.DataFrame(hu_rows, columns=['VBELN', 'EXIDV', 'VLTYP', 'TANUM']).drop_duplicates(subset=['VBELN', 'EXIDV'])
+        df_hu['EXIDV_DISPLAY'] = df_hu['EXIDV'].astype(str).str.zfill(20)
+        return df_ltap, df_hu
+
+    df_likp = deliveries(scaled(OPEN_DELIVERIES[scenario['name']], scale))
+    df_ltap, df_hu = lines(df_likp, 0.6 if scenario['name'] == 'today' else 0.1)
+
+    grouped = df_hu.sample(frac=0.5, random_state=rng.randint(0, 2 ** 31))
+    df_prio_grp = pd.DataFrame({
+        'EXIDV': grouped['EXIDV'].values,
+        'ZEXIDVGRP': [f"G{e % 100000:05d}" for e in grouped['EXIDV']],
+        'PICKINIUSER': [f"USER{rng.randrange(USERS)}" for _ in range(len(grouped))]
+    })
+
+    closed_ltap_cols = ['LGNUM', 'VBELN', 'VLPLA', 'VLTYP', 'NLPLA', 'QDATU', 'KOBER', 'NISTA', 'BRGEW', 'VOLUM', 'VSOLA']
+    if scenario['name'] == 'today':
+        df_closed = deliveries(scaled(CLOSED_DELIVERIES, scale))
+        df_ltap_closed, df_hu_closed = lines(df_closed, 1.0)
+        df_ltap_closed = df_ltap_closed[closed_ltap_cols]
+        df_hu_closed = df_hu_closed[['VBELN', 'EXIDV']]
+    else:
+        df_closed = pd.DataFrame()
+        df_ltap_closed = pd.DataFrame(columns=closed_ltap_cols)
+        df_hu_closed = pd.DataFrame(columns=['VBELN', 'EXIDV'])
+
+    return {
+        'likp': df_likp,
+        'ltap': df_ltap,
+        'hu': df_hu,
+        'prio_grp': df_prio_grp,
+        'closed': df_closed,
+        'ltap_closed': df_ltap_closed,
+        'hu_closed': df_hu_closed
+    }
+
+def confirm_lines(rng, frames, date):
+    # Next generation: a share of the open lines gets picked, as a live refresh would see it
+    df_ltap = frames['ltap']
+    open_index = df_ltap.index[df_ltap['QDATU'].isnull()]
+    confirmed = [i for i in open_index if rng.random() < CONFIRMED_BETWEEN_GENERATIONS]
+    df_ltap.loc[confirmed, 'QDATU'] = date
+    df_ltap.loc[confirmed, 'NISTA'] = df_ltap.loc[confirmed, 'VSOLA']
+
+def build_day_extracts(rng, warehouse, date, scale, routes):
+    import pandas as pd
+
+    lgnum = warehouse['lgnum']
+    vltyps = vltyp_choices(warehouse)
+    vlplas = VLPLA_SAMPLES.get(lgnum) or [f"{warehouse['vlpla_starts'][0]}01-01"]
+    day_seed = rng.randint(0, 2 ** 31)
+    day_rng = random.Random(day_seed)
+    # Roughly three quarters of the users work on any given day
+    users = [f"USER{i}" for i in range(USERS) if day_rng.random() < 0.75]
+
+    vbelns = [90000000 + day_rng.randrange(scaled(PICKS_PER_DAY, scale)) for _ in range(scaled(PICKS_PER_DAY, scale))]
+    df_ltap = pd.DataFrame({
+        'MATNR': [f"M{day_rng.randrange(50000)}" for _ in vbelns],
+        'CHARG': 'C',
+        'NISTA': [float(day_rng.randint(1, 12)) for _ in vbelns],
+        'QDATU': date,
+        'QZEIT': [f"{day_rng.randint(6, 21):02d}{day_rng.randint(0, 59):02d}00" for _ in vbelns],
+        'QNAME': [day_rng.choice(users) for _ in vbelns],
+        'BRGEW': [round(day_rng.uniform(0.1, 25), 3) for _ in vbelns],
+        'GEWEI': 'KG',
+        'VLTYP': [day_rng.choice(vltyps) for _ in vbelns],
+        'VLPLA': [day_rng.choice(vlplas) for _ in vbelns],
+        'NLPLA': [str(v) for v in vbelns],
+        'VBELN': vbelns,
+        'LGNUM': lgnum,
+        'VSOLA': [float(day_rng.randint(1, 12)) for _ in vbelns]
+    })
+    unique_vbelns = sorted(set(vbelns))
+    df_routes = pd.DataFrame({'VBELN': unique_vbelns, 'ROUTE': [day_rng.choice(routes) for _ in unique_vbelns]})
+
+    boxes = scaled(BOXES_PER_DAY, scale)
+    df_packing = pd.DataFrame({
+        'OBJECTID': [str(n).zfill(10) for n in range(1, boxes + 1)],
+        'USERNAME': [day_rng.choice(users) for _ in range(boxes)],
+        'UDATE': date.replace('-', ''),
+        'UTIME': [f"{day_rng.randint(6, 21):02d}{day_rng.randint(0, 59):02d}00" for _ in range(boxes)],
+        'LGNUM': lgnum,
+        'VLTYP': [day_rng.choice(vltyps) for _ in range(boxes)],
+        'ROUTE': [day_rng.choice(routes) for _ in range(boxes)]
+    })
+    return df_ltap, df_routes, df_packing
+
+def count_rows(path):
+    with open(path) as f:
+        data = json.load(f)
+    return len(data) if isinstance(data, list) else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate dashboard output fixtures for the API load test.")
+    parser.add_argument('--scale', type=float, default=1.0, help="Size multiplier; 1 is roughly a busy day per warehouse. Defaults to 1.")
+    parser.add_argument('--days', type=int, default=7, help="Days of picking/packing stats (cube partitions and users index history). Defaults to 7.")
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT_DIR, help=f"Output directory. Defaults to {os.path.relpath(DEFAULT_OUTPUT_DIR)}.")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed, for reproducible fixtures. Defaults to 1.")
+    args = parser.parse_args()
+
+    if args.scale <= 0:
+        parser.error("--scale must be positive")
+    if args.days <= 0:
+        parser.error("--days must be a positive number")
+    output_dir = os.path.abspath(args.output)
+    if os.path.exists(os.path.join(output_dir, 'runs')):
+        parser.error(f"{output_dir} holds pipeline runs; choose an empty or fixtures-only directory")
+
+    from process_data import build_bflow_outputs, get_bflow_scenarios, transform_shard, write_shard_outputs
+
+    rng = random.Random(args.seed)
+    warehouses = get_warehouses()
+    route_to_flow, routes = load_routes()
+    today = datetime.today().strftime('%Y-%m-%d')
+    os.makedirs(output_dir, exist_ok=True)
+
+    # --- B-FLOW DASHBOARDS: TWO GENERATIONS, SO DELTA SNAPSHOTS EXIST ---
+    base_generation = configure(events=False)
+    ids = {'vbeln': 80000000, 'tanum': 1000000000, 'exidv': 100000000000000000}
+    scenario_frames = []
+    for warehouse in warehouses:
+        for scenario in get_bflow_scenarios(today):
+            scenario = dict(scenario, date=today)
+            frames = build_scenario_frames(rng, scenario, warehouse, args.scale, ids)
+            scenario_frames.append((scenario, warehouse, frames))
+            build_bflow_outputs(scenario, frames, output_dir, f"bflow_{scenario['name']}", [warehouse])
+
+    generation = next_generation()
+    for scenario, warehouse, frames in scenario_frames:
+        confirm_lines(rng, frames, today)
+        build_bflow_outputs(scenario, frames, output_dir, f"bflow_{scenario['name']}", [warehouse])
+
+    # --- STATS, CUBE AND USERS INDEX, ONE PASS PER DAY (OLDEST FIRST) ---
+    for offset in range(args.days - 1, -1, -1):
+        date = (datetime.today() - timedelta(days=offset)).strftime('%Y-%m-%d')
+        for warehouse in warehouses:
+            log(f"Building {warehouse['name']} stats for {date}...")
+            df_ltap, df_routes, df_packing = build_day_extracts(rng, warehouse, date, args.scale, routes)
+            stats = transform_shard(warehouse, df_ltap, df_routes, df_packing, route_to_flow)
+            write_shard_outputs(warehouse, stats, date, output_dir)
+
+    # Manifest read by the load test driver (delta requests need the base generation)
+    files = {}
+    for name in sorted(os.listdir(output_dir)):
+        path = os.path.join(output_dir, name)
+        if os.path.isfile(path) and not name.startswith('loadtest'):
+            files[name] = {"bytes": os.path.getsize(path), "rows": count_rows(path) if name.startswith('dashboard_') and name.endswith('.json') else None}
+    with open(os.path.join(output_dir, 'loadtest.json'), 'w') as f:
+        json.dump({
+            "scale": args.scale,
+            "days": args.days,
+            "seed": args.seed,
+            "created_at": datetime.now().isoformat(timespec='seconds'),
+            "base_generation": base_generation,
+            "generation": generation,
+            "warehouses": [wh['prefix'] for wh in warehouses],
+            "files": files
+        }, f, indent=4)
+
+    total_mb = sum(entry["bytes"] for entry in files.values()) / 1024 / 1024
+    log(f"Fixtures written to {output_dir}: {len(files)} files, {total_mb:.1f} MB (scale {args.scale}).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import re
+import sys
+import json
+import argparse
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from partitions import get_partition_dir, load_current
+from warehouses import get_warehouses
+
+# Point-lookup index over the B-flow line and HU exports of a date partition (see partitions.py): output/date=YYYY-MM-DD/lookup_index.json
+# {"version", "updated_at", "files": {filename: {"lgnum", "type", "scenario", "kind", "size", "mtime_ns",
+#   "offsets": [...], "lengths": [...], "keys": {KEY: {value: [row, ...]}}}}}
+# offsets/lengths are the byte span of each row (record) in the export, so a lookup reads the index and the
+# matching records instead of parsing every dashboard_lines_*/dashboard_hu_* file. mtime_ns is a string so
+# JavaScript readers can compare it exactly. Values are indexed and looked up in the form of normalize_value().
+
+LOOKUP_KEYS = {
+    'lines': ['VBELN'],
+    'hu': ['VBELN', 'EXIDV', 'ZEXIDVGRP', 'PICKINIUSER']
+}
+
+# Bumped whenever the indexed value form changes; indexes of another version are rebuilt in full
+INDEX_VERSION = 2
+
+# Document numbers are matched without their leading zeros: the exports hold VBELN as an integer and
+# EXIDV/ZEXIDVGRP as SAP stores them (EXIDV_DISPLAY), while users type either form
+NUMBER_KEYS = {'VBELN', 'EXIDV', 'ZEXIDVGRP'}
+
+SCENARIO_SUFFIXES = {
+    '': 'today',
+    '_backlog': 'backlog',
+    '_future': 'future'
+}
+
+RECORD_SEPARATOR = re.compile(r'[\s,]*')
+
+def normalize_value(key, value):
+    # Same rule as normalizeValue in web/app/api/lookup/route.js
+    value = str(value).strip().upper()
+    if key in NUMBER_KEYS and value.isascii() and value.isdigit():
+        return value.lstrip('0') or '0'
+    return value
+
+def get_index_path(output_dir):
+    return os.path.join(output_dir, 'lookup_index.json')
+
+def load_index(output_dir):
+    path = get_index_path(output_dir)
+    if not os.path.exists(path):
+        return {"files": {}}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}}
+
+def export_files():
+    # filename -> (lgnum, type, scenario, kind) of every export the dashboards read
+    files = {}
+    for warehouse in get_warehouses():
+        for suffix, scenario in SCENARIO_SUFFIXES.items():
+            for kind in LOOKUP_KEYS:
+                files[f"dashboard_{kind}_{warehouse['prefix']}{suffix}.json"] = (warehouse['lgnum'], warehouse['prefix'], scenario, kind)
+    return files
+
+def record_spans(text):
+    # (record, start, end) of every element of a JSON array of records
+    decoder = json.JSONDecoder()
+    pos = RECORD_SEPARATOR.match(text, text.index('[') + 1).end()
+    while text[pos] != ']':
+        record, end = decoder.raw_decode(text, pos)
+        yield record, pos, end
+        pos = RECORD_SEPARATOR.match(text, end).end()
+
+def index_file(path, kind):
+    # The exports are written ASCII-only (non-ASCII is escaped), and latin-1 keeps one character per byte either way
+    with open(path, 'rb') as f:
+        text = f.read().decode('latin-1')
+
+    keys = {key: {} for key in LOOKUP_KEYS[kind]}
+    offsets, lengths = [], []
+    for row, (record, start, end) in enumerate(record_spans(text)):
+        offsets.append(start)
+        lengths.append(end - start)
+        for key, values in keys.items():
+            value = record.get(key)
+            if value is None or value == '':
+                continue
+            values.setdefault(normalize_value(key, value), []).append(row)
+    return {"offsets": offsets, "lengths": lengths, "keys": keys}
+
+def build_index(output_dir):
+    # Re-indexes only the exports that changed since the last build; entries of deleted exports are dropped
+    index = load_index(output_dir)
+    previous = index["files"] if index.get("version") == INDEX_VERSION else {}
+    files = {}
+    for filename, (lgnum, type_, scenario, kind) in export_files().items():
+        path = os.path.join(output_dir, filename)
+        if not os.path.exists(path):
+            continue
+        stat = os.stat(path)
+        entry = previous.get(filename)
+        if not entry or entry["size"] != stat.st_size or entry["mtime_ns"] != str(stat.st_mtime_ns):
+            try:
+                spans = index_file(path, kind)
+            except ValueError:
+                # Being rewritten by a concurrent run; that run rebuilds the index when it finishes
+                continue
+            entry = {"lgnum": lgnum, "type": type_, "scenario": scenario, "kind": kind,
+                     "size": stat.st_size, "mtime_ns": str(stat.st_mtime_ns), **spans}
+        files[filename] = entry
+
+    path = get_index_path(output_dir)
+    # Per-process temp file: concurrent runs (another date, a live poll) can rebuild the same index
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"version": INDEX_VERSION, "updated_at": datetime.now().isoformat(timespec='seconds'), "files": files}, f)
+    os.replace(tmp_path, path)
+    return path
+
+def lookup(output_dir, key, value):
+    # Matching records of every export holding `value` under `key`; exports changed since the index was built are skipped
+    matches = []
+    for filename, entry in load_index(output_dir)["files"].items():
+        hits = entry["keys"].get(key, {}).get(normalize_value(key, value))
+        if not hits:
+            continue
+        path = os.path.join(output_dir, filename)
+        if not os.path.exists(path):
+            continue
+        stat = os.stat(path)
+        if stat.st_size != entry["size"] or str(stat.st_mtime_ns) != entry["mtime_ns"]:
+            continue
+        with open(path, 'rb') as f:
+            for row in hits:
+                f.seek(entry["offsets"][row])
+                matches.append({"file": filename, "lgnum": entry["lgnum"], "type": entry["type"], "scenario": entry["scenario"],
+                                "kind": entry["kind"], "row": row, "record": json.loads(f.read(entry["lengths"][row]))})
+    return matches
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up deliveries, HUs and pickers in the B-flow exports.")
+    parser.add_argument('key', choices=sorted({key for keys in LOOKUP_KEYS.values() for key in keys}), help="Field to look up.")
+    parser.add_argument('value', help="Value of the field.")
+    parser.add_argument('--date', type=str, help="Date partition to search (YYYY-MM-DD). Defaults to the current one.")
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild the index from the current exports first.")
+    args = parser.parse_args()
+
+    if args.date:
+        try:
+            datetime.strptime(args.date, '%Y-%m-%d')
+        except ValueError:
+            parser.error(f"--date must be in YYYY-MM-DD format, got '{args.date}'")
+    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+    date = args.date or load_current(output_dir)
+    if date:
+        output_dir = get_partition_dir(output_dir, date)
+    if args.rebuild:
+        build_index(output_dir)
+    print(json.dumps(lookup(output_dir, args.key, args.value), indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import os
+import json
+from contextlib import contextmanager, ExitStack
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no advisory locks, runs are only serialised by the web app's scriptRunner
+    fcntl = None
+
+# Date partitions of process_data.py's per-day outputs: output/date=YYYY-MM-DD/
+# A run writes its stats CSVs, B-flow dashboard exports (with their deltas) and lookup index into the
+# partition of its target date, so runs for different dates never touch each other's files and a
+# historical re-run no longer overwrites today's data. output/current.json {"date", "run_id", "updated_at"}
+# points the readers at the latest partition of today. Data spanning dates (cube/, sketches/, user_stats/,
+# users_index_*.json) and the run checkpoints (runs/<run-id>/) stay at the root.
+# Each partition has one lock per warehouse shard and stage (locks/<lgnum>-<stage>.lock), held by the run
+# writing that shard's stage outputs (by the live refresh only while it rewrites the today dashboards), so
+# runs of the same date for other warehouses proceed in parallel. Only the outputs shared by every shard
+# take a lock of their own around each update: current.json, the partition's lookup index and the users
+# indexes (users_index.py).
+
+CURRENT_FILE = 'current.json'
+
+# Lock files held by this process; released when it exits
+_held = []
+
+def get_partition_dir(output_dir, date):
+    return os.path.join(output_dir, f"date={date}")
+
+def load_current(output_dir):
+    path = os.path.join(output_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f).get("date")
+    except (OSError, ValueError):
+        return None
+
+def set_current(output_dir, date, run_id=None):
+    # Never moves back, e.g. when yesterday's run is resumed after midnight
+    path = os.path.join(output_dir, CURRENT_FILE)
+    with file_lock(os.path.join(output_dir, 'locks', 'current.lock')):
+        current = load_current(output_dir)
+        if current and current > date:
+            return None
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"date": date, "run_id": run_id, "updated_at": datetime.now().isoformat(timespec='seconds')}, f)
+        os.replace(tmp_path, path)
+    return path
+
+def get_stage_lock_path(partition_dir, lgnum, stage):
+    return os.path.join(partition_dir, 'locks', f"{lgnum}-{stage}.lock")
+
+def lock_stages(partition_dir, lgnums, stages):
+    # Takes the partition's lock of every stage of every warehouse shard for the rest of the process;
+    # returns the (lgnum, stage) pairs held by another run instead (nothing is locked then)
+    if fcntl is None:
+        return []
+    os.makedirs(os.path.join(partition_dir, 'locks'), exist_ok=True)
+    acquired, busy = [], []
+    for lgnum in lgnums:
+        for stage in stages:
+            f = open(get_stage_lock_path(partition_dir, lgnum, stage), 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired.append(f)
+            except BlockingIOError:
+                f.close()
+                busy.append((lgnum, stage))
+    if busy:
+        for f in acquired:
+            f.close()
+        return busy
+    _held.extend(acquired)
+    return []
+
+@contextmanager
+def stage_lock(partition_dir, lgnums, stage):
+    # Waits for the partition's lock of `stage` of every warehouse shard and holds them for the with block
+    # only, e.g. around one rebuild of the live refresh, which would otherwise hold them all day
+    with ExitStack() as stack:
+        for lgnum in sorted(lgnums):
+            stack.enter_context(file_lock(get_stage_lock_path(partition_dir, lgnum, stage)))
+        yield
+
+@contextmanager
+def file_lock(path):
+    # Waits for the exclusive lock of `path`, e.g. around a read-modify-write shared by runs of different dates
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -1,566 +1,881 @@
 import os
+import math
 import argparse
-import pandas as pd
+import importlib.util
 import json
+import time
 from datetime import datetime
-import snowflake.connector
-from dotenv import load_dotenv
 
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from config.config import FLOOR_MAPPING, BREAK_MAPPING
+from concurrent.futures import ThreadPoolExecutor
+from config.config import FLOOR_MAPPING, BREAK_MAPPING, REMOTE_PACKING_USER, WAREHOUSES
+import checkpoint
+from partitions import file_lock, get_partition_dir, lock_stages, set_current, stage_lock
+from cube import EXACT_COLUMNS, append_day
+from sketches import update_day as update_sketches
+from lookup_index import build_index as build_lookup_index
+from delta import LINE_KEY, HU_KEY, load_generation, read_previous, write_delta, record_generation
+from users_index import load_index as load_users_index, update_index as update_users_index
+from events import configure, context, emit, get_generation, log, next_generation
+from warehouses import get_warehouses, lgnum_list_sql, likp_condition_sql, packing_action_sql, filter_lines, map_floor
 
-def main():
-    parser = argparse.ArgumentParser(description="Pull and transform Snowflake picking data.")
-    parser.add_argument('--date', type=str, help="Date to pull data for (YYYY-MM-DD). Defaults to today.")
-    args = parser.parse_args()
+# Selectable with --stages: the three B-flow scenarios and the two activity stats
+STAGES = ['today', 'backlog', 'future', 'picking', 'packing']
+BFLOW_STAGES = ['today', 'backlog', 'future']
 
-    target_date = args.date if args.date else datetime.today().strftime('%Y-%m-%d')
-    print(f"Running data extraction for date: {target_date}")
+# Exit status of a run refused because another run holds some of its stage locks (see web/lib/scriptRunner.js)
+EXIT_BLOCKED = 3
 
-    load_dotenv()
+# Users sharing one history query of --precompute-users
+USER_HISTORY_BATCH = 25
 
-    # Connection parameters
-    conn_params = {
-        'user': os.getenv('user'),
-        'account': os.getenv('account'),
-        'role': os.getenv('role'),
-        'warehouse': os.getenv('warehouse'),
-        'database': os.getenv('database'),
-        'schema': os.getenv('schema')
+# LTAP columns of every consumer of the shared extraction: B-flow open and closed deliveries, picking stats
+BFLOW_LTAP_COLUMNS = ['LGNUM', 'VBELN', 'VLPLA', 'VLTYP', 'NLPLA', 'QDATU', 'KOBER', 'NISTA', 'BRGEW', 'VOLUM', 'TANUM', 'TAPOS', 'VSOLA']
+CLOSED_LTAP_COLUMNS = ['LGNUM', 'VBELN', 'VLPLA', 'VLTYP', 'NLPLA', 'QDATU', 'KOBER', 'NISTA', 'BRGEW', 'VOLUM', 'VSOLA']
+PICKING_LTAP_COLUMNS = ['MATNR', 'CHARG', 'NISTA', 'QDATU', 'QZEIT', 'QNAME', 'BRGEW', 'GEWEI', 'VLTYP', 'VLPLA', 'NLPLA', 'VBELN', 'LGNUM', 'VSOLA']
+LTAP_COLUMNS = list(dict.fromkeys(BFLOW_LTAP_COLUMNS + PICKING_LTAP_COLUMNS))
+
+# Live refresh cycles between two checks of the open/closed delivery sets (see run_live_today)
+LIVE_RELOAD_CYCLES = 10
+
+# Stored width of LTAP.TANUM (NUMC 10): live polls compare the raw column so Snowflake can prune on it
+TANUM_WIDTH = 10
+
+# HU link rows serve both the B-flow HU model and the picking routes; SOURCE tells the current table from the history
+HU_LINK_COLUMNS = ['VBELN', 'EXIDV', 'VLTYP', 'TANUM', 'ROUTE', 'SOURCE']
+
+def fetch_deliveries(cur, scenario, b_flow_routes, actual_today, warehouses):
+    # Open B-flow deliveries of the scenario and, for today, the deliveries closed (PGI'd) today
+    import pandas as pd
+
+    b_routes_str = ", ".join([f"'{r}'" for r in b_flow_routes])
+    lgnum_cond = likp_condition_sql(warehouses)
+
+    likp_query = f"""
+    SELECT LGNUM, LPRIO, WAUHR, VBELN
+    FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_LIKP
+    WHERE ROUTE IN ({b_routes_str})
+      AND WADAT {scenario['sql_cond']}
+      AND WADAT_IST IS NULL
+      AND ({lgnum_cond})
+    """
+    cur.execute(likp_query)
+    df_likp_all = pd.DataFrame(cur.fetchall(), columns=['LGNUM', 'LPRIO', 'WAUHR', 'VBELN'])
+    emit('rows_fetched', stage=f"bflow_{scenario['name']}", table='SDS_CP_LIKP', rows=len(df_likp_all))
+
+    df_closed_all = pd.DataFrame()
+    if scenario['name'] == 'today':
+        log("Fetching deliveries closed (PGI'd) today...")
+        closed_query = f"""
+        SELECT LGNUM, LPRIO, WAUHR, VBELN
+        FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_LIKP
+        WHERE ROUTE IN ({b_routes_str})
+          AND WADAT_IST = '{actual_today}'
+          AND ({lgnum_cond})
+        """
+        cur.execute(closed_query)
+        df_closed_all = pd.DataFrame(cur.fetchall(), columns=['LGNUM', 'LPRIO', 'WAUHR', 'VBELN'])
+    return df_likp_all, df_closed_all
+
+def fetch_ltap_lines(cur, vbelns, picking_date, warehouses):
+    # One pass over SDS_CP_LTAP for the union of the lines every consumer needs: the lines confirmed on
+    # picking_date, then the lines of the given deliveries that the first query did not return.
+    # Returns the lines (picking lines first) and the number of picking lines.
+    import pandas as pd
+
+    lgnums_str = lgnum_list_sql(warehouses)
+
+    def ltap_query(condition):
+        return f"""
+        SELECT {', '.join(LTAP_COLUMNS)}
+        FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_LTAP
+        WHERE NLPLA IS NOT NULL
+          AND VBELN = NLPLA
+          AND LGNUM IN ({lgnums_str})
+          AND {condition}
+        """
+
+    rows = []
+    if picking_date:
+        cur.execute(ltap_query(f"QDATU = '{picking_date}'"))
+        rows.extend(cur.fetchall())
+    picking_rows = len(rows)
+
+    not_picked = f" AND (QDATU IS NULL OR QDATU <> '{picking_date}')" if picking_date else ""
+    for i in range(0, len(vbelns), 1000):
+        chunk_str = ", ".join([f"'{v}'" for v in vbelns[i:i + 1000]])
+        cur.execute(ltap_query(f"VBELN IN ({chunk_str}){not_picked}"))
+        rows.extend(cur.fetchall())
+
+    # Every transfer order line once: a delivery line also returned as a picking line is kept among the picking lines
+    if picking_rows and len(rows) > picking_rows:
+        key_index = [LTAP_COLUMNS.index(col) for col in ('LGNUM', 'TANUM', 'TAPOS')]
+        picked_lines = {tuple(row[i] for i in key_index) for row in rows[:picking_rows]}
+        rows = rows[:picking_rows] + [row for row in rows[picking_rows:] if tuple(row[i] for i in key_index) not in picked_lines]
+    return pd.DataFrame(rows, columns=LTAP_COLUMNS), picking_rows
+
+def fetch_hu_links(cur, vbelns):
+    import pandas as pd
+
+    link_rows = []
+    for i in range(0, len(vbelns), 1000):
+        chunk_str = ", ".join([f"'{v}'" for v in vbelns[i:i + 1000]])
+        link_query = f"""
+        SELECT VBELN, EXIDV, VLTYP, TANUM, ROUTE, 'LINK' AS SOURCE
+        FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HU_TO_LINK
+        WHERE VBELN IN ({chunk_str})
+        UNION ALL
+        SELECT VBELN, EXIDV, VLTYP, TANUM, ROUTE, 'HIS' AS SOURCE
+        FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HUTO_LNKHIS
+        WHERE VBELN IN ({chunk_str})
+        """
+        cur.execute(link_query)
+        link_rows.extend(cur.fetchall())
+    return pd.DataFrame(link_rows, columns=HU_LINK_COLUMNS)
+
+def fetch_prio_groups(cur, hu_list):
+    import pandas as pd
+
+    df_prio_grp = pd.DataFrame(columns=['EXIDV', 'ZEXIDVGRP', 'PICKINIUSER'])
+    if len(hu_list) > 0:
+        hu_chunks = [hu_list[i:i + 1000] for i in range(0, len(hu_list), 1000)]
+        prio_grp_rows = []
+        for chunk in hu_chunks:
+            # Pad to 20 digits so Snowflake matches the full barcode in ZORF_HU_PRIOGRP
+            chunk_str = ", ".join([f"'{str(v).zfill(20)}'" for v in chunk])
+            prio_grp_query = f"""
+            SELECT EXIDV, ZEXIDVGRP, PICKINIUSER 
+            FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HU_PRIOGRP 
+            WHERE EXIDV IN ({chunk_str})
+            """
+            cur.execute(prio_grp_query)
+            prio_grp_rows.extend(cur.fetchall())
+        if prio_grp_rows:
+            df_prio_grp = pd.DataFrame(prio_grp_rows, columns=['EXIDV', 'ZEXIDVGRP', 'PICKINIUSER'])
+            df_prio_grp['EXIDV'] = to_int_key(df_prio_grp['EXIDV'])
+            df_prio_grp = df_prio_grp.dropna(subset=['EXIDV']).reset_index(drop=True)
+    return df_prio_grp
+
+def select_rows(df, keys, mask, columns):
+    # The consumer's rows and columns of a shared frame, its document keys (VBELN, TANUM, EXIDV) already
+    # in integer form, shaped like a frame fetched for that consumer alone. The index is kept for de-duplication.
+    import pandas as pd
+
+    if not mask.any():
+        return pd.DataFrame(columns=columns)
+    rows = df.loc[mask, columns]
+    for col in keys.columns.intersection(columns):
+        rows[col] = keys.loc[mask, col]
+    return rows
+
+def bflow_frames(df_likp_all, df_closed_all, df_lines, line_keys, df_links, link_keys, df_prio_all):
+    # The B-flow dashboard extract of one scenario, taken from the shared LTAP lines and HU link rows
+    import pandas as pd
+
+    df_ltap_closed_all = pd.DataFrame(columns=CLOSED_LTAP_COLUMNS)
+    df_hu_closed_all = pd.DataFrame(columns=['VBELN', 'EXIDV'])
+    if not df_closed_all.empty:
+        df_closed_all['VBELN'] = to_int_key(df_closed_all['VBELN'])
+        closed_keys = df_closed_all['VBELN'].unique()
+        df_ltap_closed_all = select_rows(df_lines, line_keys, line_keys['VBELN'].isin(closed_keys), CLOSED_LTAP_COLUMNS).reset_index(drop=True)
+        # Closed HUs keep the barcode as stored
+        df_hu_closed_all = select_rows(df_links, link_keys[['VBELN']], link_keys['VBELN'].isin(closed_keys), ['VBELN', 'EXIDV']).drop_duplicates().reset_index(drop=True)
+
+        # Convert numeric
+        for col in ['NISTA', 'BRGEW', 'VOLUM', 'VSOLA']:
+            df_ltap_closed_all[col] = pd.to_numeric(df_ltap_closed_all[col], errors='coerce').fillna(0)
+
+    if df_likp_all.empty and df_closed_all.empty:
+        return None
+
+    # Canonical integer document keys
+    df_likp_all['VBELN'] = to_int_key(df_likp_all['VBELN'])
+    open_keys = df_likp_all['VBELN'].unique()
+
+    df_ltap_dash = select_rows(df_lines, line_keys, line_keys['VBELN'].isin(open_keys), BFLOW_LTAP_COLUMNS).reset_index(drop=True)
+
+    # Distinct link rows, as the UNION of the link table and its history returns them
+    hu_mask = link_keys['VBELN'].isin(open_keys)
+    df_hu_dash = select_rows(df_links, link_keys.iloc[:, :0], hu_mask, ['VBELN', 'EXIDV', 'VLTYP', 'TANUM']).drop_duplicates()
+    # The barcode as stored is kept for the HU export only; everything else uses the integer key
+    df_hu_dash['EXIDV_DISPLAY'] = df_hu_dash['EXIDV'].astype(str).str.strip()
+    for col in ['VBELN', 'TANUM', 'EXIDV']:
+        df_hu_dash[col] = link_keys.loc[df_hu_dash.index, col] if len(df_hu_dash) > 0 else to_int_key(df_hu_dash[col])
+    df_hu_dash = df_hu_dash.reset_index(drop=True)
+
+    # HU priority groups of this scenario's HUs
+    df_prio_grp = pd.DataFrame(columns=['EXIDV', 'ZEXIDVGRP', 'PICKINIUSER'])
+    if not df_prio_all.empty:
+        prio_mask = df_prio_all['EXIDV'].isin(df_hu_dash['EXIDV'].dropna().unique())
+        if prio_mask.any():
+            df_prio_grp = df_prio_all[prio_mask].reset_index(drop=True)
+
+    # Convert numeric columns
+    for col in ['NISTA', 'BRGEW', 'VOLUM', 'VSOLA']:
+        df_ltap_dash[col] = pd.to_numeric(df_ltap_dash[col], errors='coerce').fillna(0)
+
+    return {
+        'likp': df_likp_all,
+        'ltap': df_ltap_dash,
+        'hu': df_hu_dash,
+        'prio_grp': df_prio_grp,
+        'closed': df_closed_all,
+        'ltap_closed': df_ltap_closed_all,
+        'hu_closed': df_hu_closed_all
     }
 
-    # Use Programmatic Access Token if available, otherwise fallback to configured authenticator
-    token = os.getenv('SNOWFLAKE_TOKEN')
-    if token:
-        conn_params['authenticator'] = 'oauth'
-        conn_params['token'] = token
+def picking_frames(df_lines, line_keys, picking_rows, df_links, link_keys, warehouse, target_date):
+    # The picking extract: the lines confirmed on target_date and the route of their deliveries
+    import pandas as pd
+
+    df_ltap = df_lines.iloc[:picking_rows][PICKING_LTAP_COLUMNS]
+    if df_ltap.empty:
+        log(f"No picking data found in SDS_CP_LTAP for date {target_date}.")
+        df_ltap_filtered = pd.DataFrame(columns=PICKING_LTAP_COLUMNS)
     else:
-        conn_params['authenticator'] = os.getenv('authenticator')
+        df_ltap_filtered = filter_lines(df_ltap, warehouse).copy()
 
-    try:
-        conn = snowflake.connector.connect(**conn_params)
-    except Exception as e:
-        print(f"Failed to connect to Snowflake: {e}")
-        return
+    if df_ltap_filtered.empty:
+        log("No valid picking rows remains after VLPLA filtering. Skipping picking stats.")
+        return df_ltap_filtered, pd.DataFrame(columns=['VBELN', 'ROUTE'])
 
-    cur = conn.cursor()
+    df_ltap_filtered['VBELN'] = line_keys.loc[df_ltap_filtered.index, 'VBELN']
 
-    # --- SHARED ROUTE MAPPING ---
-    routes_csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'routes.csv')
-    try:
-        df_route_mapping = pd.read_csv(routes_csv_path)
-        route_to_flow = dict(zip(df_route_mapping['ROUTE'], df_route_mapping['FLOW']))
-        b_flow_routes = df_route_mapping[df_route_mapping['FLOW'] == 'B-flow']['ROUTE'].unique()
-    except FileNotFoundError:
-        print(f"Warning: routes.csv not found at {routes_csv_path}.")
-        route_to_flow = {}
-        b_flow_routes = []
+    # Route of each delivery from the shared HU link rows, the current link table before its history
+    mask = link_keys['VBELN'].isin(df_ltap_filtered['VBELN'].unique())
+    df_routes_db = pd.concat([
+        select_rows(df_links, link_keys, mask & (df_links['SOURCE'] == 'LINK'), ['VBELN', 'ROUTE']),
+        select_rows(df_links, link_keys, mask & (df_links['SOURCE'] == 'HIS'), ['VBELN', 'ROUTE'])
+    ])
+    df_routes_db['VBELN'] = to_int_key(df_routes_db['VBELN']) if df_routes_db.empty else df_routes_db['VBELN']
+    df_routes_db = df_routes_db.dropna(subset=['VBELN']).drop_duplicates(subset=['VBELN'])
+    return df_ltap_filtered, df_routes_db
+
+def extract_shard(cur, warehouses, scenarios, actual_today, b_flow_routes, picking_date=None):
+    # One extraction plan for the B-flow dashboards of `scenarios` and (when picking_date is given, for a
+    # single warehouse) the picking stats: SDS_CP_LTAP and the HU link tables are each read once for the
+    # union of what the consumers need, then split per consumer.
+    # Returns {"bflow_<scenario>": frames or None, "picking_extract": (lines, routes)} for the requested ones.
+    import pandas as pd
+
+    deliveries = {scenario['name']: fetch_deliveries(cur, scenario, b_flow_routes, actual_today, warehouses) for scenario in scenarios}
+    open_vbelns = [v for df_likp_all, _df_closed in deliveries.values() for v in df_likp_all['VBELN'].unique()]
+    closed_vbelns = [v for _df_likp, df_closed_all in deliveries.values() if not df_closed_all.empty for v in df_closed_all['VBELN'].unique()]
+    delivery_vbelns = list(dict.fromkeys(open_vbelns + closed_vbelns))
+
+    df_lines, picking_rows = fetch_ltap_lines(cur, delivery_vbelns, picking_date, warehouses)
+    emit('rows_fetched', stage='extract', table='SDS_CP_LTAP', rows=len(df_lines))
+
+    # HU links of the deliveries, plus those of the picked lines for their routes
+    link_vbelns = list(delivery_vbelns)
+    if picking_date:
+        picked = filter_lines(df_lines.iloc[:picking_rows], warehouses[0])['VBELN'].unique()
+        log(f"Fetching route data for {len(picked)} unique VBELN values...")
+        link_vbelns = list(dict.fromkeys(link_vbelns + list(picked)))
+    df_links = fetch_hu_links(cur, link_vbelns)
+    emit('rows_fetched', stage='extract', table='SDS_CP_ZORF_HU_TO_LINK', rows=len(df_links))
+
+    # Integer document keys of the shared rows, computed once for every consumer
+    line_keys = pd.DataFrame({col: to_int_key(df_lines[col]) for col in ['VBELN', 'TANUM']})
+    link_keys = pd.DataFrame({col: to_int_key(df_links[col]) for col in ['VBELN', 'TANUM', 'EXIDV']})
+
+    # Priority groups of the open deliveries' HUs, for every scenario at once
+    open_keys = to_int_key(pd.Series(open_vbelns, dtype=object, name='VBELN')).unique()
+    df_prio_all = fetch_prio_groups(cur, link_keys.loc[link_keys['VBELN'].isin(open_keys), 'EXIDV'].dropna().unique())
+
+    extracts = {}
+    if scenarios:
+        # Dashboards take their rows in key order, so their sums never depend on which other consumers shared the plan
+        line_order = pd.concat([df_lines[['LGNUM', 'TAPOS']], line_keys], axis=1).sort_values(['LGNUM', 'TANUM', 'TAPOS'], kind='stable').index
+        link_order = link_keys.sort_values(['VBELN', 'EXIDV', 'TANUM'], kind='stable').index
+        sorted_lines, sorted_line_keys = df_lines.loc[line_order], line_keys.loc[line_order]
+        sorted_links, sorted_link_keys = df_links.loc[link_order], link_keys.loc[link_order]
+    for scenario in scenarios:
+        df_likp_all, df_closed_all = deliveries[scenario['name']]
+        extracts[f"bflow_{scenario['name']}"] = bflow_frames(df_likp_all, df_closed_all, sorted_lines, sorted_line_keys, sorted_links, sorted_link_keys, df_prio_all)
+    if picking_date:
+        extracts['picking_extract'] = picking_frames(df_lines, line_keys, picking_rows, df_links, link_keys, warehouses[0], picking_date)
+    return extracts
+
+def to_int_key(values):
+    # Canonical int64 key for SAP document numbers (VBELN, EXIDV, TANUM, OBJECTID).
+    # Whitespace and leading zeros are dropped once at ingest, so merges/isin/groupby compare integers.
+    # Values that are not plain numbers of up to 18 digits become <NA> and are reported; pandas merges match
+    # <NA> keys with each other, so such rows are dropped from the right side before every merge on the key.
+    import pandas as pd
+
+    # Fast path for keys as stored (zero padded digits only): parsed directly, without the string cleaning
+    text = values.astype(str)
+    if text.str.isdecimal().all() and (text.str.len() <= 20).all():
+        keys = text.astype('uint64')
+        if (keys < 10 ** 18).all():
+            return keys.astype('int64')
+
+    cleaned = text.str.strip().str.lstrip('0').replace('', '0')
+    valid = cleaned.str.fullmatch(r'\d{1,18}').fillna(False).astype(bool)
+    if valid.all():
+        return cleaned.astype('int64')
 
-    # --- B-FLOW DELIVERY EXTRACTION (FOR DASHBOARD) ---
-    actual_today = datetime.today().strftime('%Y-%m-%d')
-    if len(b_flow_routes) > 0:
-        b_routes_str = ", ".join([f"'{r}'" for r in b_flow_routes])
-        vstel_list = "'1NLA', '2NLA', '3NLA', '4NLA'"
+    invalid = values[~valid]
+    if invalid.notnull().any():
+        emit('warning', f"Warning: {int(invalid.notnull().sum())} non-numeric {values.name} values dropped from key matching.", column=values.name)
+    keys = pd.Series(pd.NA, index=values.index, dtype='Int64')
+    keys[valid] = cleaned[valid].astype('int64')
+    return keys
+
+def build_hu_model(df_likp_all, df_ltap_dash, df_hu_dash, df_prio_grp, df_lines):
+    # One row per HU link of the scenario with delivery context, grouping, floor, pick status and
+    # proportional line/item counts. Built once for all HUs and sliced per department by LGNUM.
+    import pandas as pd
+
+    df_hu = df_hu_dash[df_hu_dash['VBELN'].isin(df_likp_all['VBELN'])]
+    df_hu_model = pd.merge(df_hu, df_likp_all[['VBELN', 'LGNUM', 'LPRIO', 'WAUHR']], on='VBELN', how='left')
+
+    # Merge with HU Priority Group info
+    if not df_prio_grp.empty:
+        df_hu_model = pd.merge(df_hu_model, df_prio_grp, on='EXIDV', how='left')
+        df_hu_model['GROUPED'] = df_hu_model['ZEXIDVGRP'].notnull().map({True: 'OK', False: 'NOT OK'})
+    else:
+        df_hu_model['GROUPED'] = 'NOT OK'
+        df_hu_model['ZEXIDVGRP'] = None
+        df_hu_model['PICKINIUSER'] = None
+
+    # Add FLOOR mapping for HUs
+    df_hu_model['FLOOR'] = df_hu_model['VLTYP'].astype(str).map(FLOOR_MAPPING).fillna('unknown_floor')
+
+    # Calculate picking status per EXIDV (individual box) via TANUM.
+    # ZORF_HU_TO_LINK.TANUM = LTAP.TANUM links each Transfer Order to its HU.
+    # A box is only marked Picked when ALL of its own LTAP lines have QDATU set.
+    df_ltap_hu_join = pd.merge(df_ltap_dash[['TANUM', 'QDATU']], df_hu[['EXIDV', 'TANUM']].dropna(subset=['TANUM']), on='TANUM', how='inner')
+    exidv_pick_status = df_ltap_hu_join['QDATU'].notnull().groupby(df_ltap_hu_join['EXIDV']).all()
+    df_hu_model['IS_PICKED'] = df_hu_model['EXIDV'].map(exidv_pick_status).fillna(False)
+
+    # Per-delivery line/item counts assigned proportionally to the delivery's HUs
+    deliv_stats = df_lines.groupby('VBELN').agg(
+        LINES_COUNT=('VBELN', 'count'),
+        ITEMS_COUNT=('VSOLA', 'sum')
+    ).reset_index()
+    hu_counts = df_hu_model.groupby('VBELN').size().reset_index(name='HU_PER_DELIV')
+
+    df_hu_model = pd.merge(df_hu_model, deliv_stats, on='VBELN', how='left')
+    df_hu_model = pd.merge(df_hu_model, hu_counts, on='VBELN', how='left')
+    df_hu_model['LINES_PER_HU'] = (df_hu_model['LINES_COUNT'] / df_hu_model['HU_PER_DELIV']).round(2)
+    df_hu_model['ITEMS_PER_HU'] = (df_hu_model['ITEMS_COUNT'] / df_hu_model['HU_PER_DELIV']).round(2)
+    return df_hu_model
+
+def bflow_dept_outputs(scenario, frames, warehouses):
+    # Per department: (lgnum, dashboard filename, dashboard JSON, lines frame, HU frame), written by build_bflow_outputs.
+    # engine_polars.bflow_dept_outputs computes the same from lazy polars plans (--engine polars).
+    import pandas as pd
+
+    df_likp_all = frames['likp']
+    df_ltap_dash = frames['ltap']
+    df_hu_dash = frames['hu']
+    df_prio_grp = frames['prio_grp']
+    df_closed_all = frames['closed']
+    df_ltap_closed_all = frames['ltap_closed']
+    df_hu_closed_all = frames['hu_closed']
+
+    suffix = scenario['suffix']
+    dept_mapping = {wh['lgnum']: f"dashboard_data_{wh['prefix']}{suffix}.json" for wh in warehouses}
+    dept_warehouses = {wh['lgnum']: wh for wh in warehouses}
+
+    # Department line filters first, so the HU model can use the filtered lines of every department
+    dept_lines = {}
+    for lgnum in dept_mapping:
+        df_ltap_dept = df_ltap_dash[df_ltap_dash['LGNUM'] == lgnum].copy()
+        dept_lines[lgnum] = filter_lines(df_ltap_dept, dept_warehouses[lgnum], dashboard=True)
+
+    # --- HU MODEL (ONCE PER SCENARIO) ---
+    df_hu_model = build_hu_model(df_likp_all, df_ltap_dash, df_hu_dash, df_prio_grp, pd.concat(dept_lines.values()))
+
+    for lgnum, filename in dept_mapping.items():
+        df_likp_dept = df_likp_all[df_likp_all['LGNUM'] == lgnum]
+        df_ltap_dept = dept_lines[lgnum]
+        df_hu_merged = df_hu_model[df_hu_model['LGNUM'] == lgnum].reset_index(drop=True)
+
+        # Metrics helper
+        def get_metrics_local(df):
+            picked = df[df['QDATU'].notnull()]
+            not_picked = df[df['QDATU'].isnull()]
+            def agg(d, qty_col):
+                return {
+                    "lines": int(len(d)),
+                    "items": int(d[qty_col].sum()),
+                    "requested_items": int(d['VSOLA'].sum()),
+                    "kg": round(float(d['BRGEW'].sum()), 2),
+                    "vol": round(float(d['VOLUM'].sum()), 2)
+                }
+            return {
+                "total": agg(df, 'VSOLA'),
+                "picked": agg(picked, 'NISTA'),
+                "not_picked": agg(not_picked, 'VSOLA')
+            }
+
+        # Merge LTAP with LIKP to get WAUHR/LPRIO context for metrics
+        df_ltap_merged = pd.merge(
+            df_ltap_dept, 
+            df_likp_dept[['VBELN', 'LPRIO', 'WAUHR']], 
+            on='VBELN', 
+            how='left'
+        )
+
+        # priority count from LTAP (Lines instead of Deliveries)
+        # Normalize LPRIO for consistent grouping
+        df_ltap_merged['LPRIO_NORM'] = df_ltap_merged['LPRIO'].astype(str).str.lstrip('0')
+        p_line_counts = df_ltap_merged['LPRIO_NORM'].value_counts().sort_index().to_dict()
+        
+        # Enhanced Cutoff metrics
+        cutoff_groups = df_likp_dept.groupby('WAUHR')
+        cutoff_details = {}
+        for wauhr, group in cutoff_groups:
+            ltap_group = df_ltap_merged[df_ltap_merged['WAUHR'] == wauhr]
+            hu_group = df_hu_merged[df_hu_merged['WAUHR'] == wauhr] if not df_hu_merged.empty else pd.DataFrame()
+            
+            # Use normalized LPRIO for inner metrics as well
+            ltap_group['LPRIO_NORM'] = ltap_group['LPRIO'].astype(str).str.lstrip('0')
+            group['LPRIO_NORM'] = group['LPRIO'].astype(str).str.lstrip('0')
+            
+            cutoff_details[str(wauhr)] = {
+                "total_deliveries": int(len(group)),
+                "dp10_deliveries": int(len(group[group['LPRIO_NORM'] == '10'])),
+                "total_lines": int(len(ltap_group)),
+                "picked_lines": int(len(ltap_group[ltap_group['QDATU'].notnull()])),
+                "dp10_lines": int(len(ltap_group[ltap_group['LPRIO_NORM'] == '10'])),
+                "total_hus": int(len(hu_group)),
+                "picked_hus": int(len(hu_group[hu_group['IS_PICKED'] == True])) if not hu_group.empty else 0
+            }
         
-        scenarios = [
-            {"name": "today", "sql_cond": f"= '{actual_today}'", "suffix": ""},
-            {"name": "backlog", "sql_cond": f"< '{actual_today}'", "suffix": "_backlog"},
-            {"name": "future", "sql_cond": f"> '{actual_today}'", "suffix": "_future"}
-        ]
+        # HU Summary Stats
+        total_hus = len(df_hu_merged)
+        picked_hus = len(df_hu_merged[df_hu_merged['IS_PICKED'] == True])
+        total_lines = len(df_ltap_dept)
+        total_items = df_ltap_dept['VSOLA'].sum()
         
-        for scenario in scenarios:
-            print(f"Processing B-FLOW {scenario['name']} deliveries (WADAT {scenario['sql_cond']})...")
+        dashboard_json = {
+            "open_deliveries": len(df_likp_dept),
+            "open_hus": total_hus,
+            "hu_summary": {
+                "total": total_hus,
+                "picked": picked_hus,
+                "not_picked": total_hus - picked_hus,
+                "avg_lines_per_hu": round(total_lines / total_hus, 2) if total_hus > 0 else 0,
+                "avg_items_per_hu": round(total_items / total_hus, 2) if total_hus > 0 else 0
+            },
+            "priorities": {str(k): int(v) for k, v in p_line_counts.items()},
+            "priority_hus": df_hu_merged['LPRIO'].astype(str).str.lstrip('0').value_counts().sort_index().to_dict() if not df_hu_merged.empty else {},
+            "cutoffs": cutoff_details,
+            "summary": get_metrics_local(df_ltap_dept),
+            "vltyp_distribution": {},
+            "kober_distribution": {}
+        }
+        
+        for v_type in df_ltap_dept['VLTYP'].unique():
+            dashboard_json["vltyp_distribution"][str(v_type)] = get_metrics_local(df_ltap_dept[df_ltap_dept['VLTYP'] == v_type])
+        for k_val in df_ltap_dept['KOBER'].unique():
+            dashboard_json["kober_distribution"][str(k_val)] = get_metrics_local(df_ltap_dept[df_ltap_dept['KOBER'] == k_val])
+        
+        # Add Closed Today metrics (only for Today scenario)
+        if scenario['name'] == 'today':
+            df_c_dept = df_closed_all[df_closed_all['LGNUM'] == lgnum]
+            df_ltap_c_dept = df_ltap_closed_all[df_ltap_closed_all['LGNUM'] == lgnum]
+            df_hu_c_dept = df_hu_closed_all[df_hu_closed_all['VBELN'].isin(df_c_dept['VBELN'])]
             
-            likp_query = f"""
-            SELECT LGNUM, LPRIO, WAUHR, VBELN
-            FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_LIKP
-            WHERE ROUTE IN ({b_routes_str})
-              AND WADAT {scenario['sql_cond']}
-              AND WADAT_IST IS NULL
-              AND (
-                (LGNUM = '266' AND VSTEL IN ({vstel_list}))
-                OR (LGNUM = '245')
-              )
-            """
-            try:
-                cur.execute(likp_query)
-                rows_likp = cur.fetchall()
-                df_likp_all = pd.DataFrame(rows_likp, columns=['LGNUM', 'LPRIO', 'WAUHR', 'VBELN'])
-                
-                # --- CLOSED TODAY EXTRACTION (NEW) ---
-                df_closed_all = pd.DataFrame()
-                df_ltap_closed_all = pd.DataFrame()
-                df_hu_closed_all = pd.DataFrame()
-
-                if scenario['name'] == 'today':
-                    print("Fetching deliveries closed (PGI'd) today...")
-                    closed_query = f"""
-                    SELECT LGNUM, LPRIO, WAUHR, VBELN
-                    FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_LIKP
-                    WHERE ROUTE IN ({b_routes_str})
-                      AND WADAT_IST = '{actual_today}'
-                      AND (
-                        (LGNUM = '266' AND VSTEL IN ({vstel_list}))
-                        OR (LGNUM = '245')
-                      )
-                    """
-                    cur.execute(closed_query)
-                    df_closed_all = pd.DataFrame(cur.fetchall(), columns=['LGNUM', 'LPRIO', 'WAUHR', 'VBELN'])
-                    
-                    if not df_closed_all.empty:
-                        closed_vbelns = df_closed_all['VBELN'].unique()
-                        c_chunks = [closed_vbelns[i:i + 1000] for i in range(0, len(closed_vbelns), 1000)]
-                        
-                        ltap_c_rows = []
-                        hu_c_rows = []
-                        ltap_cols = ['LGNUM', 'VBELN', 'VLPLA', 'VLTYP', 'NLPLA', 'QDATU', 'KOBER', 'NISTA', 'BRGEW', 'VOLUM', 'VSOLA']
-                        
-                        for chunk in c_chunks:
-                            c_str = ", ".join([f"'{v}'" for v in chunk])
-                            # LTAP for closed
-                            cur.execute(f"SELECT {', '.join(ltap_cols)} FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_LTAP WHERE VBELN IN ({c_str}) AND NLPLA IS NOT NULL AND VBELN = NLPLA AND LGNUM IN ('245', '266')")
-                            ltap_c_rows.extend(cur.fetchall())
-                            # HU for closed
-                            cur.execute(f"SELECT VBELN, EXIDV FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HU_TO_LINK WHERE VBELN IN ({c_str}) UNION SELECT VBELN, EXIDV FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HUTO_LNKHIS WHERE VBELN IN ({c_str})")
-                            hu_c_rows.extend(cur.fetchall())
-                        
-                        df_ltap_closed_all = pd.DataFrame(ltap_c_rows, columns=ltap_cols)
-                        df_hu_closed_all = pd.DataFrame(hu_c_rows, columns=['VBELN', 'EXIDV'])
-                        
-                        # Convert numeric
-                        for col in ['NISTA', 'BRGEW', 'VOLUM', 'VSOLA']:
-                            df_ltap_closed_all[col] = pd.to_numeric(df_ltap_closed_all[col], errors='coerce').fillna(0)
-                        
-                        # Strip zeros
-                        df_closed_all['VBELN'] = df_closed_all['VBELN'].astype(str).str.strip().str.lstrip('0')
-                        df_ltap_closed_all['VBELN'] = df_ltap_closed_all['VBELN'].astype(str).str.strip().str.lstrip('0')
-                        df_hu_closed_all['VBELN'] = df_hu_closed_all['VBELN'].astype(str).str.strip().str.lstrip('0')
-
-                if not df_likp_all.empty or not df_closed_all.empty:
-                    # --- LTAP EXTRACTION FOR THESE VBELNs ---
-                    unique_vbeln_list = df_likp_all['VBELN'].unique()
-                    vbeln_chunks = [unique_vbeln_list[i:i + 1000] for i in range(0, len(unique_vbeln_list), 1000)]
-                    
-                    ltap_dashboard_rows = []
-                    ltap_cols = ['LGNUM', 'VBELN', 'VLPLA', 'VLTYP', 'NLPLA', 'QDATU', 'KOBER', 'NISTA', 'BRGEW', 'VOLUM', 'TANUM', 'VSOLA']
-                    
-                    for chunk in vbeln_chunks:
-                        chunk_str = ", ".join([f"'{v}'" for v in chunk])
-                        detail_query = f"""
-                        SELECT {', '.join(ltap_cols)}
-                        FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_LTAP
-                        WHERE VBELN IN ({chunk_str})
-                          AND NLPLA IS NOT NULL
-                          AND VBELN = NLPLA
-                          AND LGNUM IN ('245', '266')
-                        """
-                        cur.execute(detail_query)
-                        ltap_dashboard_rows.extend(cur.fetchall())
-                    
-                    df_ltap_dash = pd.DataFrame(ltap_dashboard_rows, columns=ltap_cols)
-
-                    # --- HU EXTRACTION FOR THESE VBELNs ---
-                    hu_dashboard_rows = []
-                    for chunk in vbeln_chunks:
-                        chunk_str = ", ".join([f"'{v}'" for v in chunk])
-                        hu_query = f"""
-                        SELECT VBELN, EXIDV, VLTYP, TANUM
-                        FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HU_TO_LINK
-                        WHERE VBELN IN ({chunk_str})
-                        UNION
-                        SELECT VBELN, EXIDV, VLTYP, TANUM
-                        FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HUTO_LNKHIS
-                        WHERE VBELN IN ({chunk_str})
-                        """
-                        cur.execute(hu_query)
-                        hu_dashboard_rows.extend(cur.fetchall())
-                    df_hu_dash = pd.DataFrame(hu_dashboard_rows, columns=['VBELN', 'EXIDV', 'VLTYP', 'TANUM'])
-                    df_hu_dash['VBELN'] = df_hu_dash['VBELN'].astype(str).str.strip().str.lstrip('0')
-                    df_hu_dash['TANUM'] = df_hu_dash['TANUM'].astype(str).str.strip()
+            # Additional filters for closed LTAP (Consistency with open lines)
+            df_ltap_c_dept = filter_lines(df_ltap_c_dept, dept_warehouses[lgnum], dashboard=True)
+
+            dashboard_json["closed_today"] = {
+                "deliveries": int(len(df_c_dept)),
+                "hus": int(len(df_hu_c_dept)),
+                "lines": int(len(df_ltap_c_dept)),
+                "items": int(df_ltap_c_dept['NISTA'].sum()),
+                "requested_items": int(df_ltap_c_dept['VSOLA'].sum()),
+                "vol": round(float(df_ltap_c_dept['VOLUM'].sum() / 1000000), 3), # in M3
+                "kg": round(float(df_ltap_c_dept['BRGEW'].sum()), 2)
+            }
+
+        if dept_warehouses[lgnum]['floor_breakdown']:
+            dashboard_json["floors"] = {}
+            df_ltap_merged['FLOOR'] = df_ltap_merged['VLTYP'].map(lambda x: FLOOR_MAPPING.get(str(x), 'unknown_floor'))
+            for floor in df_ltap_merged['FLOOR'].unique():
+                if floor != 'unknown_floor':
+                    floor_df = df_ltap_merged[df_ltap_merged['FLOOR'] == floor]
+                    floor_metrics = get_metrics_local(floor_df)
                     
-                    # --- HU PRIORITY GROUP EXTRACTION ---
-                    hu_list = df_hu_dash['EXIDV'].unique()
-                    df_prio_grp = pd.DataFrame(columns=['EXIDV', 'ZEXIDVGRP', 'PICKINIUSER'])
-                    if len(hu_list) > 0:
-                        hu_chunks = [hu_list[i:i + 1000] for i in range(0, len(hu_list), 1000)]
-                        prio_grp_rows = []
-                        for chunk in hu_chunks:
-                            # Pad to 20 digits so Snowflake matches the full barcode in ZORF_HU_PRIOGRP
-                            chunk_str = ", ".join([f"'{str(v).strip().zfill(20)}'" for v in chunk])
-                            prio_grp_query = f"""
-                            SELECT EXIDV, ZEXIDVGRP, PICKINIUSER 
-                            FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HU_PRIOGRP 
-                            WHERE EXIDV IN ({chunk_str})
-                            """
-                            cur.execute(prio_grp_query)
-                            prio_grp_rows.extend(cur.fetchall())
-                        if prio_grp_rows:
-                            df_prio_grp = pd.DataFrame(prio_grp_rows, columns=['EXIDV', 'ZEXIDVGRP', 'PICKINIUSER'])
-                            df_prio_grp['EXIDV'] = df_prio_grp['EXIDV'].astype(str).str.strip()
+                    # Normalize LPRIO for comparison (handling potential leading zeros)
+                    floor_df['LPRIO_NORM'] = floor_df['LPRIO'].astype(str).str.lstrip('0')
                     
-                    # Convert numeric columns
-                    for col in ['NISTA', 'BRGEW', 'VOLUM', 'VSOLA']:
-                        df_ltap_dash[col] = pd.to_numeric(df_ltap_dash[col], errors='coerce').fillna(0)
-
-                    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
-                    os.makedirs(output_dir, exist_ok=True)
+                    # Add extra metrics requested for Floor Operations
+                    floor_metrics["total"]["deliveries"] = int(floor_df['VBELN'].nunique())
+                    floor_metrics["total"]["dp10_deliveries"] = int(floor_df[floor_df['LPRIO_NORM'] == '10']['VBELN'].nunique())
+                    floor_metrics["total"]["dp10_lines"] = int(len(floor_df[floor_df['LPRIO_NORM'] == '10']))
                     
-                    suffix = scenario['suffix']
-                    dept_mapping = {
-                        '245': f'dashboard_data_ms{suffix}.json', 
-                        '266': f'dashboard_data_cvns{suffix}.json'
+                    # HU metrics for floor
+                    floor_vbelns = floor_df['VBELN'].unique()
+                    floor_hu = df_hu_merged[df_hu_merged['VBELN'].isin(floor_vbelns)]
+                    floor_metrics["hu_summary"] = {
+                        "total": int(len(floor_hu)),
+                        "picked": int(len(floor_hu[floor_hu['IS_PICKED'] == True])),
+                        "not_picked": int(len(floor_hu[floor_hu['IS_PICKED'] == False]))
                     }
-                    
-                    for lgnum, filename in dept_mapping.items():
-                        df_likp_dept = df_likp_all[df_likp_all['LGNUM'] == lgnum]
-                        df_ltap_dept = df_ltap_dash[df_ltap_dash['LGNUM'] == lgnum].copy()
-                        df_hu_dept = df_hu_dash[df_hu_dash['VBELN'].isin(df_likp_dept['VBELN'])].copy()
-                        
-                        # Apply specific filters
-                        if lgnum == '266': # CVNS
-                            cvns_starts = ['L', 'F', 'X', 'N', 'O', 'Y', 'W']
-                            cvns_not_starts = ['YES', 'NO', 'LONGGOODS', 'NCS', 'OSO']
-                            def filter_cvns_local(row):
-                                v = str(row['VLPLA']) if row['VLPLA'] else ""
-                                return any(v.startswith(s) for s in cvns_starts) and not any(v.startswith(s) for s in cvns_not_starts)
-                            df_ltap_dept = df_ltap_dept[df_ltap_dept.apply(filter_cvns_local, axis=1)]
-                        else: # MS (245)
-                            ms_starts = ['B', 'C', 'D', 'V', 'E']
-                            def filter_ms_local(row):
-                                v = str(row['VLPLA']) if row['VLPLA'] else ""
-                                vltyp = str(row['VLTYP']) if row['VLTYP'] else ""
-                                return any(v.startswith(s) for s in ms_starts) and vltyp != 'REP'
-                            df_ltap_dept = df_ltap_dept[df_ltap_dept.apply(filter_ms_local, axis=1)]
-
-                        # Metrics helper
-                        def get_metrics_local(df):
-                            picked = df[df['QDATU'].notnull()]
-                            not_picked = df[df['QDATU'].isnull()]
-                            def agg(d, qty_col):
-                                return {
-                                    "lines": int(len(d)),
-                                    "items": int(d[qty_col].sum()),
-                                    "requested_items": int(d['VSOLA'].sum()),
-                                    "kg": round(float(d['BRGEW'].sum()), 2),
-                                    "vol": round(float(d['VOLUM'].sum()), 2)
-                                }
-                            return {
-                                "total": agg(df, 'VSOLA'),
-                                "picked": agg(picked, 'NISTA'),
-                                "not_picked": agg(not_picked, 'VSOLA')
-                            }
-
-                        # Ensure VBELN is string and stripped of leading zeros for consistent mapping
-                        df_ltap_dept['VBELN'] = df_ltap_dept['VBELN'].astype(str).str.strip().str.lstrip('0')
-                        df_likp_dept['VBELN'] = df_likp_dept['VBELN'].astype(str).str.strip().str.lstrip('0')
-                        df_hu_dept['VBELN'] = df_hu_dept['VBELN'].astype(str).str.strip().str.lstrip('0')
-
-                        # Merge LTAP with LIKP to get WAUHR/LPRIO context for metrics
-                        df_ltap_merged = pd.merge(
-                            df_ltap_dept, 
-                            df_likp_dept[['VBELN', 'LPRIO', 'WAUHR']], 
-                            on='VBELN', 
-                            how='left'
-                        )
-                        
-                        # Merge HU with LIKP
-                        df_hu_merged = pd.merge(
-                            df_hu_dept,
-                            df_likp_dept[['VBELN', 'LPRIO', 'WAUHR']],
-                            on='VBELN',
-                            how='left'
-                        )
-                        
-                        # Merge with HU Priority Group info
-                        if not df_prio_grp.empty:
-                            df_hu_merged['EXIDV_STR'] = df_hu_merged['EXIDV'].astype(str).str.strip().str.zfill(20)
-                            df_hu_merged = pd.merge(df_hu_merged, df_prio_grp, left_on='EXIDV_STR', right_on='EXIDV', how='left', suffixes=('', '_prio'))
-                            df_hu_merged['GROUPED'] = df_hu_merged['ZEXIDVGRP'].notnull().map({True: 'OK', False: 'NOT OK'})
-                            if 'EXIDV_prio' in df_hu_merged.columns:
-                                df_hu_merged = df_hu_merged.drop(columns=['EXIDV_prio', 'EXIDV_STR'])
-                        else:
-                            df_hu_merged['GROUPED'] = 'NOT OK'
-                            df_hu_merged['ZEXIDVGRP'] = None
-                            df_hu_merged['PICKINIUSER'] = None
-                        
-                        # Add FLOOR mapping for HUs
-                        df_hu_merged['FLOOR'] = df_hu_merged['VLTYP'].map(lambda x: FLOOR_MAPPING.get(str(x), 'unknown_floor'))
-                        
-                        # Calculate picking status per EXIDV (individual box) via TANUM.
-                        # ZORF_HU_TO_LINK.TANUM = LTAP.TANUM links each Transfer Order to its HU.
-                        # A box is only marked Picked when ALL of its own LTAP lines have QDATU set.
-                        df_ltap_tanum = df_ltap_dash[['TANUM', 'QDATU']].copy()
-                        df_ltap_tanum['TANUM'] = df_ltap_tanum['TANUM'].astype(str).str.strip()
-                        
-                        df_hu_tanum = df_hu_dash[['EXIDV', 'TANUM', 'VBELN']].copy()
-                        df_hu_tanum = df_hu_tanum[df_hu_tanum['VBELN'].isin(df_likp_dept['VBELN'])]
-                        
-                        # Join LTAP lines → HUs via TANUM
-                        df_ltap_hu_join = pd.merge(df_ltap_tanum, df_hu_tanum[['EXIDV', 'TANUM']], on='TANUM', how='inner')
-                        
-                        if not df_ltap_hu_join.empty:
-                            exidv_pick_status = df_ltap_hu_join.groupby('EXIDV')['QDATU'].apply(lambda x: x.notnull().all()).to_dict()
-                        else:
-                            exidv_pick_status = {}
-                        
-                        df_hu_merged['IS_PICKED'] = df_hu_merged['EXIDV'].map(exidv_pick_status).fillna(False)
-
-                        # priority count from LTAP (Lines instead of Deliveries)
-                        # Normalize LPRIO for consistent grouping
-                        df_ltap_merged['LPRIO_NORM'] = df_ltap_merged['LPRIO'].astype(str).str.lstrip('0')
-                        p_line_counts = df_ltap_merged['LPRIO_NORM'].value_counts().sort_index().to_dict()
-                        
-                        # Enhanced Cutoff metrics
-                        cutoff_groups = df_likp_dept.groupby('WAUHR')
-                        cutoff_details = {}
-                        for wauhr, group in cutoff_groups:
-                            ltap_group = df_ltap_merged[df_ltap_merged['WAUHR'] == wauhr]
-                            hu_group = df_hu_merged[df_hu_merged['WAUHR'] == wauhr] if not df_hu_merged.empty else pd.DataFrame()
-                            
-                            # Use normalized LPRIO for inner metrics as well
-                            ltap_group['LPRIO_NORM'] = ltap_group['LPRIO'].astype(str).str.lstrip('0')
-                            group['LPRIO_NORM'] = group['LPRIO'].astype(str).str.lstrip('0')
-                            
-                            cutoff_details[str(wauhr)] = {
-                                "total_deliveries": int(len(group)),
-                                "dp10_deliveries": int(len(group[group['LPRIO_NORM'] == '10'])),
-                                "total_lines": int(len(ltap_group)),
-                                "picked_lines": int(len(ltap_group[ltap_group['QDATU'].notnull()])),
-                                "dp10_lines": int(len(ltap_group[ltap_group['LPRIO_NORM'] == '10'])),
-                                "total_hus": int(len(hu_group)),
-                                "picked_hus": int(len(hu_group[hu_group['IS_PICKED'] == True])) if not hu_group.empty else 0
-                            }
-                        
-                        # HU Summary Stats
-                        total_hus = len(df_hu_merged)
-                        picked_hus = len(df_hu_merged[df_hu_merged['IS_PICKED'] == True])
-                        total_lines = len(df_ltap_dept)
-                        total_items = df_ltap_dept['VSOLA'].sum()
-                        
-                        dashboard_json = {
-                            "open_deliveries": len(df_likp_dept),
-                            "open_hus": total_hus,
-                            "hu_summary": {
-                                "total": total_hus,
-                                "picked": picked_hus,
-                                "not_picked": total_hus - picked_hus,
-                                "avg_lines_per_hu": round(total_lines / total_hus, 2) if total_hus > 0 else 0,
-                                "avg_items_per_hu": round(total_items / total_hus, 2) if total_hus > 0 else 0
-                            },
-                            "priorities": {str(k): int(v) for k, v in p_line_counts.items()},
-                            "priority_hus": df_hu_merged['LPRIO'].astype(str).str.lstrip('0').value_counts().sort_index().to_dict() if not df_hu_merged.empty else {},
-                            "cutoffs": cutoff_details,
-                            "summary": get_metrics_local(df_ltap_dept),
-                            "vltyp_distribution": {},
-                            "kober_distribution": {}
-                        }
-                        
-                        for v_type in df_ltap_dept['VLTYP'].unique():
-                            dashboard_json["vltyp_distribution"][str(v_type)] = get_metrics_local(df_ltap_dept[df_ltap_dept['VLTYP'] == v_type])
-                        for k_val in df_ltap_dept['KOBER'].unique():
-                            dashboard_json["kober_distribution"][str(k_val)] = get_metrics_local(df_ltap_dept[df_ltap_dept['KOBER'] == k_val])
-                        
-                        # Add Closed Today metrics (only for Today scenario)
-                        if scenario['name'] == 'today':
-                            df_c_dept = df_closed_all[df_closed_all['LGNUM'] == lgnum]
-                            df_ltap_c_dept = df_ltap_closed_all[df_ltap_closed_all['LGNUM'] == lgnum]
-                            df_hu_c_dept = df_hu_closed_all[df_hu_closed_all['VBELN'].isin(df_c_dept['VBELN'])]
-                            
-                            # Additional filters for closed LTAP (Consistency with open lines)
-                            if lgnum == '266':
-                                df_ltap_c_dept = df_ltap_c_dept[df_ltap_c_dept.apply(filter_cvns_local, axis=1)]
-                            else:
-                                df_ltap_c_dept = df_ltap_c_dept[df_ltap_c_dept.apply(filter_ms_local, axis=1)]
-
-                            dashboard_json["closed_today"] = {
-                                "deliveries": int(len(df_c_dept)),
-                                "hus": int(len(df_hu_c_dept)),
-                                "lines": int(len(df_ltap_c_dept)),
-                                "items": int(df_ltap_c_dept['NISTA'].sum()),
-                                "requested_items": int(df_ltap_c_dept['VSOLA'].sum()),
-                                "vol": round(float(df_ltap_c_dept['VOLUM'].sum() / 1000000), 3), # in M3
-                                "kg": round(float(df_ltap_c_dept['BRGEW'].sum()), 2)
-                            }
-
-                        if lgnum == '266':
-                            dashboard_json["floors"] = {}
-                            df_ltap_merged['FLOOR'] = df_ltap_merged['VLTYP'].map(lambda x: FLOOR_MAPPING.get(str(x), 'unknown_floor'))
-                            for floor in df_ltap_merged['FLOOR'].unique():
-                                if floor != 'unknown_floor':
-                                    floor_df = df_ltap_merged[df_ltap_merged['FLOOR'] == floor]
-                                    floor_metrics = get_metrics_local(floor_df)
-                                    
-                                    # Normalize LPRIO for comparison (handling potential leading zeros)
-                                    floor_df['LPRIO_NORM'] = floor_df['LPRIO'].astype(str).str.lstrip('0')
-                                    
-                                    # Add extra metrics requested for Floor Operations
-                                    floor_metrics["total"]["deliveries"] = int(floor_df['VBELN'].nunique())
-                                    floor_metrics["total"]["dp10_deliveries"] = int(floor_df[floor_df['LPRIO_NORM'] == '10']['VBELN'].nunique())
-                                    floor_metrics["total"]["dp10_lines"] = int(len(floor_df[floor_df['LPRIO_NORM'] == '10']))
-                                    
-                                    # HU metrics for floor
-                                    floor_vbelns = floor_df['VBELN'].unique()
-                                    floor_hu = df_hu_merged[df_hu_merged['VBELN'].isin(floor_vbelns)]
-                                    floor_metrics["hu_summary"] = {
-                                        "total": int(len(floor_hu)),
-                                        "picked": int(len(floor_hu[floor_hu['IS_PICKED'] == True])),
-                                        "not_picked": int(len(floor_hu[floor_hu['IS_PICKED'] == False]))
-                                    }
-                                    dashboard_json["floors"][floor] = floor_metrics
-
-                        with open(os.path.join(output_dir, filename), 'w') as f:
-                            json.dump(dashboard_json, f, indent=4)
-                        print(f"Generated {filename}")
-
-                        # --- DETAILED LINES EXPORT ---
-                        lines_filename = filename.replace('dashboard_data_', 'dashboard_lines_')
-                        export_cols = ['VBELN', 'LPRIO', 'WAUHR', 'VLPLA', 'VLTYP', 'KOBER', 'NISTA', 'BRGEW', 'VOLUM', 'QDATU', 'VSOLA']
-                        if 'FLOOR' in df_ltap_merged.columns:
-                            export_cols.append('FLOOR')
-                        
-                        # Filter to columns that exist
-                        existing_cols = [c for c in export_cols if c in df_ltap_merged.columns]
-                        df_lines_export = df_ltap_merged[existing_cols].copy()
-                        
-                        # Ensure string types for joining/export
-                        df_lines_export['VBELN'] = df_lines_export['VBELN'].astype(str).str.strip().str.lstrip('0')
-                        df_lines_export['LPRIO'] = df_lines_export['LPRIO'].astype(str)
-                        df_lines_export['WAUHR'] = df_lines_export['WAUHR'].astype(str)
-                        
-                        # Save specifically for the detailed view modal
-                        df_lines_export.to_json(os.path.join(output_dir, lines_filename), orient='records', indent=4)
-                        print(f"Generated {lines_filename}")
-
-                        # --- DETAILED HU EXPORT ---
-                        hu_export_filename = filename.replace('dashboard_data_', 'dashboard_hu_')
-                        # Calculate per-delivery stats to assign proportionally to HUs
-                        deliv_stats = df_ltap_dept.groupby('VBELN').agg({
-                            'NISTA': 'sum',
-                            'VSOLA': 'sum',
-                            'VBELN': 'count' # Line count
-                        }).rename(columns={'VBELN': 'LINES_COUNT', 'VSOLA': 'ITEMS_COUNT'}).reset_index()
-                        
-                        # Get HU count per delivery
-                        hu_counts = df_hu_merged.groupby('VBELN').size().reset_index(name='HU_PER_DELIV')
-                        
-                        # Merge stats
-                        hu_stats_merged = pd.merge(df_hu_merged, deliv_stats, on='VBELN', how='left')
-                        hu_stats_merged = pd.merge(hu_stats_merged, hu_counts, on='VBELN', how='left')
-                        
-                        # Calculate proportional counts
-                        hu_stats_merged['LINES_PER_HU'] = (hu_stats_merged['LINES_COUNT'] / hu_stats_merged['HU_PER_DELIV']).round(2)
-                        hu_stats_merged['ITEMS_PER_HU'] = (hu_stats_merged['ITEMS_COUNT'] / hu_stats_merged['HU_PER_DELIV']).round(2)
-                        
-                        # Prepare export columns
-                        hu_export_cols = ['EXIDV', 'VBELN', 'LPRIO', 'WAUHR', 'IS_PICKED', 'LINES_PER_HU', 'ITEMS_PER_HU', 'FLOOR', 'GROUPED', 'ZEXIDVGRP', 'PICKINIUSER']
-                        # Ensure all columns exist 
-                        for col in hu_export_cols:
-                            if col not in hu_stats_merged.columns:
-                                hu_stats_merged[col] = None
-                                
-                        df_hu_export = hu_stats_merged[hu_export_cols].copy()
-                        df_hu_export['LPRIO'] = df_hu_export['LPRIO'].astype(str)
-                        df_hu_export['WAUHR'] = df_hu_export['WAUHR'].astype(str)
-                        df_hu_export['FLOOR'] = df_hu_export['FLOOR'].astype(str)
-                        
-                        df_hu_export.to_json(os.path.join(output_dir, hu_export_filename), orient='records', indent=4)
-                        print(f"Generated {hu_export_filename}")
-                else:
-                    print(f"No B-FLOW {scenario['name']} deliveries found.")
-            except Exception as ex:
-                print(f"B-FLOW {scenario['name']} Extraction Error: {ex}")
+                    dashboard_json["floors"][floor] = floor_metrics
+
+        yield lgnum, filename, dashboard_json, df_ltap_merged, df_hu_merged
+
+def build_bflow_outputs(scenario, frames, output_dir, stage, warehouses, engine='pandas'):
+    if engine == 'polars':
+        from engine_polars import bflow_dept_outputs as dept_outputs
     else:
-        print("No B-flow routes found in routes.csv. Skipping dashboard JSON generation.")
+        dept_outputs = bflow_dept_outputs
 
+    os.makedirs(output_dir, exist_ok=True)
 
-    # --- PICKING EXTRACTION ---
-    columns = ['MATNR', 'CHARG', 'NISTA', 'QDATU', 'QZEIT', 'QNAME', 'BRGEW', 'GEWEI', 'VLTYP', 'VLPLA', 'NLPLA', 'VBELN', 'LGNUM', 'VSOLA']
-    cols_str = ", ".join(columns)
+    for lgnum, filename, dashboard_json, df_ltap_merged, df_hu_merged in dept_outputs(scenario, frames, warehouses):
+        previous = read_previous(os.path.join(output_dir, filename))
+        with open(os.path.join(output_dir, filename), 'w') as f:
+            json.dump(dashboard_json, f, indent=4)
+        emit('file_generated', f"Generated {filename}", stage=stage, lgnum=lgnum, file=filename, path=os.path.join(output_dir, filename))
+        publish_delta(output_dir, filename, previous, json.loads(json.dumps(dashboard_json)), None, stage, lgnum)
 
-    print(f"Fetching base picking data from SDS_CP_LTAP for {target_date}...")
-    
-    cvns_vlpla_starts = ['L', 'F', 'X', 'N', 'O', 'Y', 'W']
-    cvns_vlpla_not_starts = ['YES', 'NO', 'LONGGOODS', 'NCS', 'OSO']
-    
-    ms_vlpla_starts = ['B', 'C', 'D', 'V', 'E']
-
-    ltap_query = f"""
-    SELECT {cols_str}
-    FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_LTAP
-    WHERE QDATU = '{target_date}'
-      AND VBELN IS NOT NULL
-      AND NLPLA IS NOT NULL
-      AND VBELN = NLPLA
-      AND LGNUM IN ('245', '266')
-    """
-    
-    cur.execute(ltap_query)
-    rows = cur.fetchall()
-    df_ltap = pd.DataFrame(rows, columns=columns)
+        # --- DETAILED LINES EXPORT ---
+        lines_filename = filename.replace('dashboard_data_', 'dashboard_lines_')
+        export_cols = ['VBELN', 'TANUM', 'TAPOS', 'LPRIO', 'WAUHR', 'VLPLA', 'VLTYP', 'KOBER', 'NISTA', 'BRGEW', 'VOLUM', 'QDATU', 'VSOLA']
+        if 'FLOOR' in df_ltap_merged.columns:
+            export_cols.append('FLOOR')
+        
+        # Filter to columns that exist
+        existing_cols = [c for c in export_cols if c in df_ltap_merged.columns]
+        df_lines_export = df_ltap_merged[existing_cols].copy()
+        
+        # Display form of the integer keys for export
+        df_lines_export['VBELN'] = df_lines_export['VBELN'].astype(str)
+        df_lines_export['TANUM'] = df_lines_export['TANUM'].astype(str)
+        df_lines_export['TAPOS'] = df_lines_export['TAPOS'].astype(str)
+        df_lines_export['LPRIO'] = df_lines_export['LPRIO'].astype(str)
+        df_lines_export['WAUHR'] = df_lines_export['WAUHR'].astype(str)
+        
+        # Save specifically for the detailed view modal
+        previous = read_previous(os.path.join(output_dir, lines_filename))
+        df_lines_export.to_json(os.path.join(output_dir, lines_filename), orient='records', indent=4)
+        emit('file_generated', f"Generated {lines_filename}", stage=stage, lgnum=lgnum, file=lines_filename, path=os.path.join(output_dir, lines_filename), rows=len(df_lines_export))
+        publish_delta(output_dir, lines_filename, previous, json.loads(df_lines_export.to_json(orient='records')), LINE_KEY, stage, lgnum)
 
-    if df_ltap.empty:
-        print(f"No picking data found in SDS_CP_LTAP for date {target_date}.")
-        df_ltap_filtered = pd.DataFrame(columns=columns)
+        # --- DETAILED HU EXPORT ---
+        hu_export_filename = filename.replace('dashboard_data_', 'dashboard_hu_')
+        hu_stats_merged = df_hu_merged
+
+        # Prepare export columns
+        hu_export_cols = ['EXIDV', 'VBELN', 'LPRIO', 'WAUHR', 'IS_PICKED', 'LINES_PER_HU', 'ITEMS_PER_HU', 'FLOOR', 'GROUPED', 'ZEXIDVGRP', 'PICKINIUSER']
+        # Ensure all columns exist 
+        for col in hu_export_cols:
+            if col not in hu_stats_merged.columns:
+                hu_stats_merged[col] = None
+                
+        df_hu_export = hu_stats_merged[hu_export_cols].copy()
+        df_hu_export['EXIDV'] = hu_stats_merged['EXIDV_DISPLAY']
+        df_hu_export['VBELN'] = df_hu_export['VBELN'].astype(str)
+        df_hu_export['LPRIO'] = df_hu_export['LPRIO'].astype(str)
+        df_hu_export['WAUHR'] = df_hu_export['WAUHR'].astype(str)
+        df_hu_export['FLOOR'] = df_hu_export['FLOOR'].astype(str)
+        
+        previous = read_previous(os.path.join(output_dir, hu_export_filename))
+        df_hu_export.to_json(os.path.join(output_dir, hu_export_filename), orient='records', indent=4)
+        emit('file_generated', f"Generated {hu_export_filename}", stage=stage, lgnum=lgnum, file=hu_export_filename, path=os.path.join(output_dir, hu_export_filename), rows=len(df_hu_export))
+        publish_delta(output_dir, hu_export_filename, previous, json.loads(df_hu_export.to_json(orient='records')), HU_KEY, stage, lgnum)
+
+def publish_delta(output_dir, filename, previous, current, key_cols, stage, lgnum):
+    # Diff against the generation that was on disk, then mark the full export as the current generation
+    generation = get_generation()
+    counts = write_delta(output_dir, filename, previous, current, generation, key_cols)
+    record_generation(output_dir, filename, generation)
+    if counts is not None:
+        emit('delta_generated', f"Generated delta for {filename} (+{counts['added']} -{counts['removed']} ~{counts['changed']})",
+             stage=stage, lgnum=lgnum, file=filename, **counts)
+
+def get_bflow_scenarios(actual_today):
+    return [
+        {"name": "today", "sql_cond": f"= '{actual_today}'", "suffix": ""},
+        {"name": "backlog", "sql_cond": f"< '{actual_today}'", "suffix": "_backlog"},
+        {"name": "future", "sql_cond": f"> '{actual_today}'", "suffix": "_future"}
+    ]
+
+def refresh_picking_confirmations(cur, df_ltap_dash, warehouses):
+    # Re-query only the still-open LTAP lines and copy their confirmation (QDATU/NISTA) in place
+    import pandas as pd
+
+    open_lines = df_ltap_dash[df_ltap_dash['QDATU'].isnull()]
+    if open_lines.empty:
+        return 0
+
+    open_tanums = open_lines['TANUM'].dropna().unique()
+    tanum_chunks = [open_tanums[i:i + 1000] for i in range(0, len(open_tanums), 1000)]
+
+    confirmed_rows = []
+    for chunk in tanum_chunks:
+        chunk_str = ", ".join([f"'{str(v).zfill(TANUM_WIDTH)}'" for v in chunk])
+        confirm_query = f"""
+        SELECT LGNUM, TANUM, TAPOS, QDATU, NISTA
+        FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_LTAP
+        WHERE TANUM IN ({chunk_str})
+          AND QDATU IS NOT NULL
+          AND LGNUM IN ({lgnum_list_sql(warehouses)})
+        """
+        cur.execute(confirm_query)
+        confirmed_rows.extend(cur.fetchall())
+
+    if not confirmed_rows:
+        return 0
+
+    line_key = ['LGNUM', 'TANUM', 'TAPOS']
+    df_confirmed = pd.DataFrame(confirmed_rows, columns=line_key + ['QDATU', 'NISTA'])
+    df_confirmed['TANUM'] = to_int_key(df_confirmed['TANUM'])
+    df_confirmed['NISTA'] = pd.to_numeric(df_confirmed['NISTA'], errors='coerce').fillna(0)
+    df_confirmed = df_confirmed.drop_duplicates(subset=line_key).set_index(line_key)
+
+    ltap_keys = pd.MultiIndex.from_frame(df_ltap_dash[line_key])
+    mask = df_ltap_dash['QDATU'].isnull().to_numpy() & ltap_keys.isin(df_confirmed.index)
+    if not mask.any():
+        return 0
+
+    confirmed = df_confirmed.reindex(ltap_keys[mask])
+    df_ltap_dash.loc[mask, 'QDATU'] = confirmed['QDATU'].to_numpy()
+    df_ltap_dash.loc[mask, 'NISTA'] = confirmed['NISTA'].to_numpy()
+    return int(mask.sum())
+
+def delivery_keys(df_likp, df_closed):
+    # Integer keys of the open and of the closed-today deliveries of a LIKP extract
+    return tuple(frozenset(to_int_key(df['VBELN']).dropna()) if not df.empty else frozenset() for df in (df_likp, df_closed))
+
+def extract_live_frames(cur, scenario, actual_today, b_flow_routes, warehouses):
+    # The generation is minted before the queries, so the outputs of any run started later compare newer
+    generation = next_generation()
+    frames = extract_shard(cur, warehouses, [scenario], actual_today, b_flow_routes)[f"bflow_{scenario['name']}"]
+    return generation, frames
+
+def newer_live_outputs(partition_dir, scenario, warehouses, generation, written):
+    # Exports of the scenario another run rewrote after the live extract of `generation`
+    # (`written`: generation of the live refresh's own last rebuild)
+    newer = []
+    for warehouse in warehouses:
+        for path in bflow_output_files(scenario, warehouse, partition_dir):
+            marker = load_generation(partition_dir, os.path.basename(path))
+            if marker is not None and marker != written and marker > generation:
+                newer.append(os.path.basename(path))
+    return newer
+
+def rebuild_live_outputs(scenario, frames, partition_dir, stage, warehouses, engine, generation, written):
+    # Rewrites the today dashboards under the today locks, unless another run wrote newer ones since the
+    # frames were extracted; returns the generation written, or None when the frames have to be reloaded first
+    with stage_lock(partition_dir, [wh['lgnum'] for wh in warehouses], 'today'):
+        newer = newer_live_outputs(partition_dir, scenario, warehouses, generation, written)
+        if newer:
+            log(f"Skipping rebuild: {', '.join(newer)} written by a newer run; reloading the deliveries first.")
+            return None
+        build_bflow_outputs(scenario, frames, partition_dir, stage, warehouses, engine)
+        update_lookup_index(partition_dir, stage)
+    return get_generation()
+
+def run_live_today(cur, b_flow_routes, output_dir, partition_dir, actual_today, interval, warehouses, engine):
+    # Full extraction once, then keep the open deliveries in memory and only poll picking confirmations.
+    # Every LIVE_RELOAD_CYCLES cycles the open/closed delivery sets are re-queried (LIKP only) and, when they
+    # changed, the deliveries are extracted again; the same happens as soon as another run (e.g. a full run
+    # of today) has written newer dashboards, which the live refresh never overwrites with older state.
+    # Exits when the calendar day changes so the scheduler can start a fresh run for the new day.
+    scenario = get_bflow_scenarios(actual_today)[0]
+    stage = 'bflow_today_live'
+
+    emit('stage_started', f"Starting live refresh of B-FLOW today deliveries every {interval}s...", stage=stage)
+    generation, frames = extract_live_frames(cur, scenario, actual_today, b_flow_routes, warehouses)
+    written = None
+    if frames is None:
+        log("No B-FLOW today deliveries found.")
     else:
-        def filter_cvns(row):
-            vlpla = str(row['VLPLA']) if row['VLPLA'] else ""
-            if not any(vlpla.startswith(s) for s in cvns_vlpla_starts):
-                return False
-            if any(vlpla.startswith(s) for s in cvns_vlpla_not_starts):
-                return False
-            return True
-
-        def filter_ms(row):
-            vlpla = str(row['VLPLA']) if row['VLPLA'] else ""
-            return any(vlpla.startswith(s) for s in ms_vlpla_starts)
-            
-        df_cvns = df_ltap[df_ltap['LGNUM'] == '266']
-        df_cvns = df_cvns[df_cvns.apply(filter_cvns, axis=1)]
+        # The today stage's lock is only taken per rebuild, so full runs of today can start between polls
+        written = rebuild_live_outputs(scenario, frames, partition_dir, stage, warehouses, engine, generation, written)
+        if written is not None:
+            set_current(output_dir, actual_today)
 
-        df_ms = df_ltap[df_ltap['LGNUM'] == '245']
-        df_ms = df_ms[df_ms.apply(filter_ms, axis=1)]
+    cycle = 0
+    while datetime.today().strftime('%Y-%m-%d') == actual_today:
+        time.sleep(interval)
+        cycle += 1
+        cycle_start = time.perf_counter()
+        try:
+            reload = bool(newer_live_outputs(partition_dir, scenario, warehouses, generation, written))
+            if not reload and cycle % LIVE_RELOAD_CYCLES == 0:
+                current = delivery_keys(*fetch_deliveries(cur, scenario, b_flow_routes, actual_today, warehouses))
+                reload = current != (delivery_keys(frames['likp'], frames['closed']) if frames is not None else (frozenset(), frozenset()))
 
-        df_ltap_filtered = pd.concat([df_ms, df_cvns])
+            confirmed = 0
+            if reload:
+                generation, frames = extract_live_frames(cur, scenario, actual_today, b_flow_routes, warehouses)
+                rebuild = frames is not None
+            elif frames is not None:
+                confirmed = refresh_picking_confirmations(cur, frames['ltap'], warehouses)
+                rebuild = confirmed > 0
+                if rebuild:
+                    # Each rebuild is its own generation so clients can fetch the delta of this cycle
+                    next_generation()
+            else:
+                rebuild = False
+            if rebuild:
+                # On a refused rebuild the next cycle sees the newer outputs and reloads
+                written = rebuild_live_outputs(scenario, frames, partition_dir, stage, warehouses, engine, generation, written) or written
+            emit('live_cycle', stage=stage, cycle=cycle, confirmed_lines=confirmed, reloaded=reload,
+                 open_deliveries=int(frames['likp']['VBELN'].nunique()) if frames is not None else 0,
+                 open_lines=int(frames['ltap']['QDATU'].isnull().sum()) if frames is not None else 0,
+                 duration_ms=round((time.perf_counter() - cycle_start) * 1000))
+        except Exception as ex:
+            # Transient errors should not end the loop; the next cycle retries
+            emit('error', f"Live refresh error: {ex}", stage=stage, cycle=cycle, error=str(ex))
 
-    if df_ltap_filtered.empty:
-        print("No valid picking rows remains after VLPLA filtering. Skipping picking stats.")
-        df_routes_db = pd.DataFrame(columns=['VBELN', 'ROUTE'])
+    emit('stage_finished', "Day changed, leaving live refresh mode.", stage=stage, cycles=cycle)
+
+def update_lookup_index(output_dir, stage):
+    # Point-lookup index over every line/HU export currently in the output directory (see lookup_index.py),
+    # shared by the warehouse shards of every run of the partition
+    try:
+        with file_lock(os.path.join(output_dir, 'locks', 'lookup_index.lock')):
+            index_path = build_lookup_index(output_dir)
+        emit('file_generated', f"Updated {os.path.basename(index_path)}", stage=stage, file=os.path.basename(index_path), path=index_path)
+    except Exception as e:
+        emit('error', f"Failed to update the lookup index: {e}", stage=stage, error=str(e))
+
+def precompute_user_histories(warehouses, target_date, output_dir, budget_seconds):
+    # Prepares the fetch_user_stats.py answer of every user active on target_date (see its load_prepared),
+    # least recently prepared first, in batches sharing one query, until the time budget is spent
+    from fetch_user_stats import QNAME_PATTERN, query_history, build_result, load_prepared, save_prepared
+    from sketches import read_sketches, window_start
+
+    stage = 'user_histories'
+    stage_start = time.perf_counter()
+    emit('stage_started', f"Precomputing user histories (budget {budget_seconds}s)...", stage=stage)
+
+    # Active users per warehouse/activity from the users index, with the age of their prepared result
+    queues = {}
+    for warehouse in warehouses:
+        index = load_users_index(output_dir, warehouse['prefix'])
+        for activity, users in index["users"].get(str(warehouse['lgnum']), {}).items():
+            for qname, entry in users.items():
+                if target_date not in entry["daily"] or not QNAME_PATTERN.fullmatch(qname):
+                    continue
+                prepared = load_prepared(output_dir, warehouse['lgnum'], activity, qname)
+                queues.setdefault((warehouse['lgnum'], activity), []).append((prepared["prepared_at"] if prepared else '', qname))
+
+    batches = []
+    for (lgnum, activity), queue in queues.items():
+        queue.sort()
+        for i in range(0, len(queue), USER_HISTORY_BATCH):
+            batch = queue[i:i + USER_HISTORY_BATCH]
+            batches.append((batch[0][0], lgnum, activity, [qname for _prepared_at, qname in batch]))
+    batches.sort()
+
+    total = sum(len(qnames) for *_rest, qnames in batches)
+    if total == 0:
+        emit('stage_finished', "No active users to precompute.", stage=stage, prepared=0, remaining=0)
+        return
+
+    try:
+        conn = connect_snowflake()
+    except Exception as e:
+        emit('error', f"Failed to connect to Snowflake: {e}", stage=stage, error=str(e))
+        return
+    cur = conn.cursor()
+
+    prepared_count = 0
+    slowest_batch = 0
+    # The percentile window's sketches, read once per LGNUM/activity for all of its users
+    window_sketches = {}
+    try:
+        for _prepared_at, lgnum, activity, qnames in batches:
+            # Never start a batch that would likely overrun the budget
+            elapsed = time.perf_counter() - stage_start
+            if elapsed + slowest_batch > budget_seconds:
+                break
+            batch_start = time.perf_counter()
+            df_history = query_history(cur, qnames, get_warehouses([lgnum])[0], activity)
+            if (lgnum, activity) not in window_sketches:
+                window_sketches[(lgnum, activity)] = read_sketches(lgnum, activity, window_start(target_date), target_date, output_dir)
+            for qname in qnames:
+                df_user = df_history[df_history['QNAME'] == qname] if not df_history.empty else df_history
+                if not df_user.empty:
+                    save_prepared(output_dir, build_result(df_user, qname, lgnum, activity, target_date, window_sketches[(lgnum, activity)]))
+                prepared_count += 1
+            slowest_batch = max(slowest_batch, time.perf_counter() - batch_start)
+    except Exception as e:
+        emit('error', f"User history precompute failed: {e}", stage=stage, error=str(e))
+    finally:
+        cur.close()
+        conn.close()
+
+    remaining = total - prepared_count
+    budget_note = f", budget spent with {remaining} left for the next run" if remaining else ""
+    emit('stage_finished', f"Precomputed {prepared_count} of {total} user histories{budget_note}.", stage=stage,
+         prepared=prepared_count, remaining=remaining, duration_ms=round((time.perf_counter() - stage_start) * 1000))
+
+def connect_snowflake():
+    import snowflake.connector
+
+    # Connection parameters
+    conn_params = {
+        'user': os.getenv('user'),
+        'account': os.getenv('account'),
+        'role': os.getenv('role'),
+        'warehouse': os.getenv('warehouse'),
+        'database': os.getenv('database'),
+        'schema': os.getenv('schema')
+    }
+
+    # Use Programmatic Access Token if available, otherwise fallback to configured authenticator
+    token = os.getenv('SNOWFLAKE_TOKEN')
+    if token:
+        conn_params['authenticator'] = 'oauth'
+        conn_params['token'] = token
     else:
-        unique_vbeln = df_ltap_filtered['VBELN'].unique()
-        unique_vbeln_str = ", ".join([f"'{v}'" for v in unique_vbeln])
-        
-        print(f"Fetching route data for {len(unique_vbeln)} unique VBELN values...")
+        conn_params['authenticator'] = os.getenv('authenticator')
 
-        if len(unique_vbeln) > 0:
-            link_query = f"""
-            SELECT VBELN, ROUTE
-            FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HU_TO_LINK
-            WHERE VBELN IN ({unique_vbeln_str})
-            """
-            cur.execute(link_query)
-            df_link = pd.DataFrame(cur.fetchall(), columns=['VBELN', 'ROUTE'])
+    return snowflake.connector.connect(**conn_params)
 
-            his_query = f"""
-            SELECT VBELN, ROUTE
-            FROM PROD_CDH_DB.SDS_MAIN.SDS_CP_ZORF_HUTO_LNKHIS
-            WHERE VBELN IN ({unique_vbeln_str})
-            """
-            cur.execute(his_query)
-            df_his = pd.DataFrame(cur.fetchall(), columns=['VBELN', 'ROUTE'])
+def extract_hour(qzeit_val):
+    try:
+        if qzeit_val is None or (isinstance(qzeit_val, float) and math.isnan(qzeit_val)):
+            return -1
+            
+        val_str = str(qzeit_val).strip()
+        if val_str in ("None", "NaN", "NaT", ""):
+            return -1
+            
+        if ':' in val_str:
+            time_part = val_str.split()[-1]
+            return int(time_part.split(':')[0])
+            
+        if '.' in val_str:
+            val_str = val_str.split('.')[0]
+            
+        val_str = val_str.zfill(6)
+        return int(val_str[:2])
+    except Exception:
+        return -1
+
+def map_flow(route, route_to_flow):
+    flow = route_to_flow.get(route, 'unknown_flow')
+    if flow == 'Y2-flow':
+        return 'A-flow'
+    return flow
 
-            df_routes_db = pd.concat([df_link, df_his]).drop_duplicates(subset=['VBELN'])
-        else:
-            df_routes_db = pd.DataFrame(columns=['VBELN', 'ROUTE'])
+PACKING_COLUMNS = ['OBJECTID', 'USERNAME', 'UDATE', 'UTIME', 'LGNUM', 'VLTYP', 'ROUTE']
+
+def extract_packing(cur, warehouse, target_date):
+    import pandas as pd
 
-    # --- PACKING EXTRACTION ---
     target_dt_obj = datetime.strptime(target_date, '%Y-%m-%d')
     start_dt_obj = target_dt_obj - pd.Timedelta(days=5)
     
     target_date_compact = target_date.replace('-', '') # E.g. 20260224
     start_date_compact = start_dt_obj.strftime('%Y%m%d') # E.g. 20260219
 
-    print(f"Fetching packing data with 5-day lookback: {start_date_compact} to {target_date_compact}...")
+    log(f"Fetching packing data with 5-day lookback: {start_date_compact} to {target_date_compact}...")
 
     # Join SDS_CP_CDHDR, SDS_CP_VEKP, and HU (link/his)
     packing_query = f"""
@@ -570,7 +885,7 @@ def main():
         WHERE UDATE >= '{start_date_compact}'
           AND UDATE <= '{target_date_compact}'
           AND OBJECTCLAS = 'HANDL_UNIT'
-          AND (TCODE = 'ZORF_BOX_CLOSING' OR USERNAME = 'WEBMREMOTEWS')
+          AND {packing_action_sql(warehouse)}
     ),
     PACK_EXIDV AS (
         SELECT DISTINCT VENUM, EXIDV
@@ -588,259 +903,558 @@ def main():
     FROM PACK_HEADERS H
     JOIN PACK_EXIDV E ON H.OBJECTID = E.VENUM
     JOIN HU_INFO I ON E.EXIDV = I.EXIDV
-    WHERE I.LGNUM IN ('245', '266')
-      AND (H.USERNAME != 'WEBMREMOTEWS' OR I.LGNUM = '245')
+    WHERE I.LGNUM = '{warehouse['lgnum']}'
     """
     
-    try:
-        cur.execute(packing_query)
-        rows_packing = cur.fetchall()
-        df_packing_raw = pd.DataFrame(rows_packing, columns=['OBJECTID', 'USERNAME', 'UDATE', 'UTIME', 'LGNUM', 'VLTYP', 'ROUTE'])
-        print(f"Found {len(df_packing_raw)} raw packing rows in history window.")
+    cur.execute(packing_query)
+    rows_packing = cur.fetchall()
+    df_packing_raw = pd.DataFrame(rows_packing, columns=PACKING_COLUMNS)
+    emit('rows_fetched', f"Found {len(df_packing_raw)} raw packing rows in history window.", stage='packing_extract', table='SDS_CP_CDHDR', rows=len(df_packing_raw))
+    
+    if not df_packing_raw.empty:
+        df_packing_raw['OBJECTID'] = to_int_key(df_packing_raw['OBJECTID'])
+
+        # 1. Ensure UTIME is padded (6 chars) so sorting is chronological
+        df_packing_raw['UTIME'] = df_packing_raw['UTIME'].astype(str).str.zfill(6)
         
-        if not df_packing_raw.empty:
-            # 1. Ensure UTIME is padded (6 chars) so sorting is chronological
-            df_packing_raw['UTIME'] = df_packing_raw['UTIME'].astype(str).str.zfill(6)
-            
-            # 2. Sort by Date and Time
-            df_packing_raw = df_packing_raw.sort_values(['UDATE', 'UTIME'], ascending=True)
-            
-            # 3. For each OBJECTID, only keep the FIRST (earliest) record
-            df_packing_unique = df_packing_raw.drop_duplicates(subset=['OBJECTID'], keep='first')
-            
-            # 4. Attribution: Only count for today if the EARLIEST hit was actually TODAY
-            df_packing = df_packing_unique[df_packing_unique['UDATE'] == target_date_compact].copy()
-            print(f"Attributed {len(df_packing)} boxes to today's activity.")
-        else:
-            df_packing = pd.DataFrame(columns=['OBJECTID', 'USERNAME', 'UDATE', 'UTIME', 'LGNUM', 'VLTYP', 'ROUTE'])
+        # 2. Sort by Date and Time
+        df_packing_raw = df_packing_raw.sort_values(['UDATE', 'UTIME'], ascending=True)
+        
+        # 3. For each OBJECTID, only keep the FIRST (earliest) record
+        df_packing_unique = df_packing_raw.drop_duplicates(subset=['OBJECTID'], keep='first')
+        
+        # 4. Attribution: Only count for today if the EARLIEST hit was actually TODAY
+        df_packing = df_packing_unique[df_packing_unique['UDATE'] == target_date_compact].copy()
+        log(f"Attributed {len(df_packing)} boxes to today's activity.")
+    else:
+        df_packing = pd.DataFrame(columns=PACKING_COLUMNS)
+    return df_packing
 
-    except Exception as e:
-        print(f"Packing Query Error: {e}")
-        df_packing = pd.DataFrame(columns=['OBJECTID', 'USERNAME', 'UDATE', 'UTIME', 'LGNUM', 'VLTYP', 'ROUTE'])
+def calculate_picking_stats(df):
+    import pandas as pd
 
-    cur.close()
-    conn.close()
+    if df.empty: return pd.DataFrame(), pd.DataFrame()
+    
+    # Ensure numeric
+    df['BRGEW'] = pd.to_numeric(df['BRGEW'], errors='coerce').fillna(0)
+    df['NISTA'] = pd.to_numeric(df['NISTA'], errors='coerce').fillna(0)
+    df['VSOLA'] = pd.to_numeric(df['VSOLA'], errors='coerce').fillna(0)
 
-    print("Transforming data...")
+    # 1. First, calculate context-wide benchmarks (Flow & Floor specific)
+    context_benchmarks = {}
+    for (flow, floor), context_df in df.groupby(['FLOW', 'FLOOR']):
+        if not context_df.empty:
+            total_lines = len(context_df)
+            total_weight = context_df['BRGEW'].sum()
+            total_items = context_df['NISTA'].sum()
+            context_benchmarks[(flow, floor)] = {
+                'avg_wpl': total_weight / total_lines if total_lines > 0 else 0,
+                'avg_ipl': total_items / total_lines if total_lines > 0 else 0
+            }
 
-    # --- PICKING TRANSFORMATION ---
-    df_merged = pd.merge(df_ltap_filtered, df_routes_db, on='VBELN', how='left')
+    # 2. Identify how many work contexts (Flow/Floor) each user worked in per hour
+    context_counts = df.groupby(['QNAME', 'QDATU', 'HOUR']).apply(
+        lambda x: x.groupby(['FLOW', 'FLOOR']).ngroups
+    ).to_dict()
 
-    def map_flow(route):
-        flow = route_to_flow.get(route, 'unknown_flow')
-        if flow == 'Y2-flow':
-            return 'A-flow'
-        return flow
+    hourly_groups = df.groupby(['QNAME', 'QDATU', 'HOUR', 'FLOW', 'FLOOR'])
+    rows = []
+    for name, group in hourly_groups:
+        qname, qdatu, hour, flow, floor = name
+        lines = len(group)
+        items = group['NISTA'].sum()
+        weight = group['BRGEW'].sum()
 
-    df_merged['FLOW'] = df_merged['ROUTE'].apply(map_flow)
+        # Distribute effort
+        base_effort = BREAK_MAPPING.get(hour, 1.0)
+        n_contexts = context_counts.get((qname, qdatu, hour), 1)
+        distributed_effort = base_effort / n_contexts
 
-    def extract_hour(qzeit_val):
-        try:
-            if pd.isna(qzeit_val):
-                return -1
-                
-            val_str = str(qzeit_val).strip()
-            if val_str in ("None", "NaN", "NaT", ""):
-                return -1
-                
-            if ':' in val_str:
-                time_part = val_str.split()[-1]
-                return int(time_part.split(':')[0])
-                
-            if '.' in val_str:
-                val_str = val_str.split('.')[0]
-                
-            val_str = val_str.zfill(6)
-            return int(val_str[:2])
-        except Exception:
-            return -1
+        # Calculate Intensity for this specific hour in this flow/floor
+        bench = context_benchmarks.get((flow, floor), {'avg_wpl': 1, 'avg_ipl': 1})
+        wpl = weight / lines if lines > 0 else 0
+        ipl = items / lines if lines > 0 else 0
+
+        weight_intensity = round(wpl / bench['avg_wpl'], 2) if bench['avg_wpl'] > 0 else 1.0
+        item_intensity = round(ipl / bench['avg_ipl'], 2) if bench['avg_ipl'] > 0 else 1.0
+
+        rows.append({
+            'QNAME': qname, 'QDATU': qdatu, 'HOUR': hour, 'FLOW': flow, 'FLOOR': floor,
+            'LINES_PICKED': lines, 'ITEMS_PICKED': items, 'WEIGHT_PICKED': round(weight, 2),
+            'RATIO': round(items/lines, 2) if lines > 0 else 0,
+            'EFFORT': round(distributed_effort, 2), 
+            'PRODUCTIVITY': round(lines/distributed_effort, 2) if distributed_effort > 0 else 0,
+            'WEIGHT_INTENSITY': weight_intensity,
+            'ITEM_INTENSITY': item_intensity,
+            # Unrounded, for the cube only
+            'WEIGHT_PICKED_EXACT': weight,
+            'EFFORT_EXACT': distributed_effort
+        })
+
+    df_h = pd.DataFrame(rows)
+
+    # 3. Aggregate to Daily
+    df_d = df_h.groupby(['QNAME', 'QDATU', 'FLOW', 'FLOOR']).agg({
+        'LINES_PICKED': 'sum', 
+        'ITEMS_PICKED': 'sum', 
+        'WEIGHT_PICKED': 'sum',
+        'EFFORT': 'sum'
+    }).reset_index()
+
+    df_d['EFFORT'] = df_d['EFFORT'].round(2)
+    df_d['WEIGHT_PICKED'] = df_d['WEIGHT_PICKED'].round(2)
+    df_d['RATIO'] = (df_d['ITEMS_PICKED'] / df_d['LINES_PICKED']).round(2)
+    df_d['PRODUCTIVITY'] = (df_d['LINES_PICKED'] / df_d['EFFORT']).round(2)
+
+    # Calculate daily weighted intensities
+    def calc_daily_intensity(row):
+        bench = context_benchmarks.get((row['FLOW'], row['FLOOR']), {'avg_wpl': 1, 'avg_ipl': 1})
+        wpl = row['WEIGHT_PICKED'] / row['LINES_PICKED'] if row['LINES_PICKED'] > 0 else 0
+        ipl = row['ITEMS_PICKED'] / row['LINES_PICKED'] if row['LINES_PICKED'] > 0 else 0
+
+        wi = round(wpl / bench['avg_wpl'], 2) if bench['avg_wpl'] > 0 else 1.0
+        ii = round(ipl / bench['avg_ipl'], 2) if bench['avg_ipl'] > 0 else 1.0
+        return pd.Series([wi, ii])
 
-    df_merged['HOUR'] = df_merged['QZEIT'].apply(extract_hour)
+    df_d[['WEIGHT_INTENSITY', 'ITEM_INTENSITY']] = df_d.apply(calc_daily_intensity, axis=1)
 
-    def map_floor(row):
-        if row['LGNUM'] == '245':
-            return 'ground_floor'
-        else:
-            vltyp = str(row['VLTYP']) if row['VLTYP'] else ""
-            return FLOOR_MAPPING.get(vltyp, 'unknown_floor')
+    return df_h, df_d
 
-    df_merged['FLOOR'] = df_merged.apply(map_floor, axis=1)
-    df_merged['NISTA'] = pd.to_numeric(df_merged['NISTA'], errors='coerce').fillna(0)
-    df_merged['VSOLA'] = pd.to_numeric(df_merged['VSOLA'], errors='coerce').fillna(0)
+def calculate_packing_stats(df):
+    import pandas as pd
+
+    if df.empty: return pd.DataFrame(), pd.DataFrame()
+
+    # 1. Identify context counts for packing
+    context_counts = df.groupby(['QNAME', 'QDATU', 'HOUR']).apply(
+        lambda x: x.groupby(['FLOW', 'FLOOR']).ngroups
+    ).to_dict()
+
+    hourly_groups = df.groupby(['QNAME', 'QDATU', 'HOUR', 'FLOW', 'FLOOR'])
+    rows = []
+    for name, group in hourly_groups:
+        qname, qdatu, hour, flow, floor = name
+        # Use nunique to count distinct boxes as requested
+        boxes = group['OBJECTID'].nunique()
+
+        # 2. Distribute effort
+        base_effort = BREAK_MAPPING.get(hour, 1.0)
+        n_contexts = context_counts.get((qname, qdatu, hour), 1)
+        distributed_effort = base_effort / n_contexts
+
+        rows.append({
+            'QNAME': qname, 'QDATU': qdatu, 'HOUR': hour, 'FLOW': flow, 'FLOOR': floor,
+            'BOXES_PACKED': boxes, 'EFFORT': round(distributed_effort, 2), 
+            'PRODUCTIVITY': round(boxes/distributed_effort, 2) if distributed_effort > 0 else 0,
+            # Unrounded, for the cube only
+            'EFFORT_EXACT': distributed_effort
+        })
+    df_h = pd.DataFrame(rows)
+    df_d = df_h.groupby(['QNAME', 'QDATU', 'FLOW', 'FLOOR']).agg({
+        'BOXES_PACKED': 'sum', 'EFFORT': 'sum'
+    }).reset_index()
+    df_d['EFFORT'] = df_d['EFFORT'].round(2)
+    df_d['PRODUCTIVITY'] = (df_d['BOXES_PACKED'] / df_d['EFFORT']).round(2)
+    return df_h, df_d
+
+def transform_shard(warehouse, df_ltap_filtered, df_routes_db, df_packing, route_to_flow, engine='pandas'):
+    # An extract is None when its stage was not selected; only the activities extracted are returned
+    import pandas as pd
+
+    if engine == 'polars':
+        from engine_polars import transform_shard as transform_shard_polars
+        return transform_shard_polars(warehouse, df_ltap_filtered, df_routes_db, df_packing, route_to_flow)
+
+    # --- PICKING TRANSFORMATION ---
+    if df_ltap_filtered is not None:
+        df_merged = pd.merge(df_ltap_filtered, df_routes_db, on='VBELN', how='left')
+        df_merged['FLOW'] = df_merged['ROUTE'].apply(map_flow, args=(route_to_flow,))
+        df_merged['HOUR'] = df_merged['QZEIT'].apply(extract_hour)
+        df_merged['FLOOR'] = map_floor(df_merged['VLTYP'], warehouse)
+        df_merged['NISTA'] = pd.to_numeric(df_merged['NISTA'], errors='coerce').fillna(0)
+        df_merged['VSOLA'] = pd.to_numeric(df_merged['VSOLA'], errors='coerce').fillna(0)
 
-    # Filter out unknown_floor from picking
-    df_merged = df_merged[df_merged['FLOOR'] != 'unknown_floor'].copy()
+        # Filter out unknown_floor from picking
+        df_merged = df_merged[df_merged['FLOOR'] != 'unknown_floor'].copy()
 
     # --- PACKING TRANSFORMATION ---
-    if not df_packing.empty:
-        df_packing['FLOW'] = df_packing['ROUTE'].apply(map_flow)
+    if df_packing is not None and not df_packing.empty:
+        df_packing['FLOW'] = df_packing['ROUTE'].apply(map_flow, args=(route_to_flow,))
         def adjust_hour(row):
             h = extract_hour(row['UTIME'])
-            if h != -1 and row['USERNAME'] != 'WEBMREMOTEWS':
+            if h != -1 and row['USERNAME'] != REMOTE_PACKING_USER:
                 return (h + 1) % 24
             return h
 
         df_packing['HOUR'] = df_packing.apply(adjust_hour, axis=1)
-        
-        def map_floor_packing(row):
-            if row['LGNUM'] == '245': return 'ground_floor'
-            vltyp = str(row['VLTYP']) if row['VLTYP'] else ""
-            return FLOOR_MAPPING.get(vltyp, 'unknown_floor')
-            
-        df_packing['FLOOR'] = df_packing.apply(map_floor_packing, axis=1)
+        df_packing['FLOOR'] = map_floor(df_packing['VLTYP'], warehouse)
         # Filter out unknown_floor from packing
         df_packing = df_packing[df_packing['FLOOR'] != 'unknown_floor'].copy()
         
         # For packing, QNAME mapping
         df_packing = df_packing.rename(columns={'USERNAME': 'QNAME', 'UDATE': 'QDATU'})
     
-    print("Calculating statistics...")
+    log("Calculating statistics...")
+    stats = {}
+    if df_ltap_filtered is not None:
+        stats['picking'] = calculate_picking_stats(df_merged)
+    if df_packing is not None:
+        stats['packing'] = calculate_packing_stats(df_packing)
+    return stats
 
-    def calculate_picking_stats(df):
-        if df.empty: return pd.DataFrame(), pd.DataFrame()
-        
-        # Ensure numeric
-        df['BRGEW'] = pd.to_numeric(df['BRGEW'], errors='coerce').fillna(0)
-        df['NISTA'] = pd.to_numeric(df['NISTA'], errors='coerce').fillna(0)
-        df['VSOLA'] = pd.to_numeric(df['VSOLA'], errors='coerce').fillna(0)
-
-        # 1. First, calculate context-wide benchmarks (Flow & Floor specific)
-        context_benchmarks = {}
-        for (flow, floor), context_df in df.groupby(['FLOW', 'FLOOR']):
-            if not context_df.empty:
-                total_lines = len(context_df)
-                total_weight = context_df['BRGEW'].sum()
-                total_items = context_df['NISTA'].sum()
-                context_benchmarks[(flow, floor)] = {
-                    'avg_wpl': total_weight / total_lines if total_lines > 0 else 0,
-                    'avg_ipl': total_items / total_lines if total_lines > 0 else 0
-                }
+def write_shard_outputs(warehouse, stats, target_date, output_dir, partition_dir=None):
+    # The stats CSVs go to the date's partition (see partitions.py), the data spanning dates to output_dir
+    lgnum = warehouse['lgnum']
+    prefix = warehouse['prefix']
+    partition_dir = partition_dir or output_dir
 
-        # 2. Identify how many work contexts (Flow/Floor) each user worked in per hour
-        context_counts = df.groupby(['QNAME', 'QDATU', 'HOUR']).apply(
-            lambda x: x.groupby(['FLOW', 'FLOOR']).ngroups
-        ).to_dict()
-
-        hourly_groups = df.groupby(['QNAME', 'QDATU', 'HOUR', 'FLOW', 'FLOOR'])
-        rows = []
-        for name, group in hourly_groups:
-            qname, qdatu, hour, flow, floor = name
-            lines = len(group)
-            items = group['NISTA'].sum()
-            weight = group['BRGEW'].sum()
-            
-            # Distribute effort
-            base_effort = BREAK_MAPPING.get(hour, 1.0)
-            n_contexts = context_counts.get((qname, qdatu, hour), 1)
-            distributed_effort = base_effort / n_contexts
-            
-            # Calculate Intensity for this specific hour in this flow/floor
-            bench = context_benchmarks.get((flow, floor), {'avg_wpl': 1, 'avg_ipl': 1})
-            wpl = weight / lines if lines > 0 else 0
-            ipl = items / lines if lines > 0 else 0
-            
-            weight_intensity = round(wpl / bench['avg_wpl'], 2) if bench['avg_wpl'] > 0 else 1.0
-            item_intensity = round(ipl / bench['avg_ipl'], 2) if bench['avg_ipl'] > 0 else 1.0
-            
-            rows.append({
-                'QNAME': qname, 'QDATU': qdatu, 'HOUR': hour, 'FLOW': flow, 'FLOOR': floor,
-                'LINES_PICKED': lines, 'ITEMS_PICKED': items, 'WEIGHT_PICKED': round(weight, 2),
-                'RATIO': round(items/lines, 2) if lines > 0 else 0,
-                'EFFORT': round(distributed_effort, 2), 
-                'PRODUCTIVITY': round(lines/distributed_effort, 2) if distributed_effort > 0 else 0,
-                'WEIGHT_INTENSITY': weight_intensity,
-                'ITEM_INTENSITY': item_intensity
-            })
-            
-        df_h = pd.DataFrame(rows)
-        
-        # 3. Aggregate to Daily
-        df_d = df_h.groupby(['QNAME', 'QDATU', 'FLOW', 'FLOOR']).agg({
-            'LINES_PICKED': 'sum', 
-            'ITEMS_PICKED': 'sum', 
-            'WEIGHT_PICKED': 'sum',
-            'EFFORT': 'sum'
-        }).reset_index()
-        
-        df_d['EFFORT'] = df_d['EFFORT'].round(2)
-        df_d['WEIGHT_PICKED'] = df_d['WEIGHT_PICKED'].round(2)
-        df_d['RATIO'] = (df_d['ITEMS_PICKED'] / df_d['LINES_PICKED']).round(2)
-        df_d['PRODUCTIVITY'] = (df_d['LINES_PICKED'] / df_d['EFFORT']).round(2)
-        
-        # Calculate daily weighted intensities
-        def calc_daily_intensity(row):
-            bench = context_benchmarks.get((row['FLOW'], row['FLOOR']), {'avg_wpl': 1, 'avg_ipl': 1})
-            wpl = row['WEIGHT_PICKED'] / row['LINES_PICKED'] if row['LINES_PICKED'] > 0 else 0
-            ipl = row['ITEMS_PICKED'] / row['LINES_PICKED'] if row['LINES_PICKED'] > 0 else 0
-            
-            wi = round(wpl / bench['avg_wpl'], 2) if bench['avg_wpl'] > 0 else 1.0
-            ii = round(ipl / bench['avg_ipl'], 2) if bench['avg_ipl'] > 0 else 1.0
-            return pd.Series([wi, ii])
+    for activity, (df_h, df_d) in stats.items():
+        for period, df in (('hourly', df_h), ('daily', df_d)):
+            filename = f"{prefix}_{activity}_{period}_stats.csv"
+            if not df.empty:
+                df.drop(columns=list(EXACT_COLUMNS.values()), errors='ignore').to_csv(os.path.join(partition_dir, filename), index=False)
+                emit('file_generated', f"Generated {filename}", stage='transform', file=filename, path=os.path.join(partition_dir, filename), rows=len(df))
 
-        df_d[['WEIGHT_INTENSITY', 'ITEM_INTENSITY']] = df_d.apply(calc_daily_intensity, axis=1)
-        
-        return df_h, df_d
+    # --- AGGREGATE CUBE ---
+    # Keep each day's hourly aggregates so multi-day rollups never need Snowflake (see cube.py)
+    for activity, (df_h, _df_d) in stats.items():
+        partition_path = append_day(df_h, target_date, lgnum, activity, output_dir)
+        if partition_path:
+            emit('file_generated', f"Updated cube partition {os.path.relpath(partition_path, output_dir)}", stage='transform', file=os.path.relpath(partition_path, output_dir), path=partition_path)
 
-    def calculate_packing_stats(df):
-        if df.empty: return pd.DataFrame(), pd.DataFrame()
-        
-        # 1. Identify context counts for packing
-        context_counts = df.groupby(['QNAME', 'QDATU', 'HOUR']).apply(
-            lambda x: x.groupby(['FLOW', 'FLOOR']).ngroups
-        ).to_dict()
-
-        hourly_groups = df.groupby(['QNAME', 'QDATU', 'HOUR', 'FLOW', 'FLOOR'])
-        rows = []
-        for name, group in hourly_groups:
-            qname, qdatu, hour, flow, floor = name
-            # Use nunique to count distinct boxes as requested
-            boxes = group['OBJECTID'].nunique()
-            
-            # 2. Distribute effort
-            base_effort = BREAK_MAPPING.get(hour, 1.0)
-            n_contexts = context_counts.get((qname, qdatu, hour), 1)
-            distributed_effort = base_effort / n_contexts
-            
-            rows.append({
-                'QNAME': qname, 'QDATU': qdatu, 'HOUR': hour, 'FLOW': flow, 'FLOOR': floor,
-                'BOXES_PACKED': boxes, 'EFFORT': round(distributed_effort, 2), 
-                'PRODUCTIVITY': round(boxes/distributed_effort, 2) if distributed_effort > 0 else 0
-            })
-        df_h = pd.DataFrame(rows)
-        df_d = df_h.groupby(['QNAME', 'QDATU', 'FLOW', 'FLOOR']).agg({
-            'BOXES_PACKED': 'sum', 'EFFORT': 'sum'
-        }).reset_index()
-        df_d['EFFORT'] = df_d['EFFORT'].round(2)
-        df_d['PRODUCTIVITY'] = (df_d['BOXES_PACKED'] / df_d['EFFORT']).round(2)
-        return df_h, df_d
-
-    # Calculating
-    ms_picking_h, ms_picking_d = calculate_picking_stats(df_merged[df_merged['LGNUM'] == '245'])
-    cvns_picking_h, cvns_picking_d = calculate_picking_stats(df_merged[df_merged['LGNUM'] == '266'])
-    
-    ms_packing_h, ms_packing_d = calculate_packing_stats(df_packing[df_packing['LGNUM'] == '245'])
-    cvns_packing_h, cvns_packing_d = calculate_packing_stats(df_packing[df_packing['LGNUM'] == '266'])
+    # --- PRODUCTIVITY SKETCHES ---
+    # Daily t-digests of per-user hourly productivity, merged by fetch_user_stats.py for percentile bands (see sketches.py)
+    for activity, (df_h, _df_d) in stats.items():
+        sketch_path = update_sketches(df_h, target_date, lgnum, activity, output_dir)
+        if sketch_path:
+            emit('file_generated', f"Updated productivity sketches {os.path.relpath(sketch_path, output_dir)}", stage='transform', file=os.path.relpath(sketch_path, output_dir), path=sketch_path)
+
+    # --- USERS INDEX ---
+    users_index_path = update_users_index({(lgnum, activity): df_d for activity, (_df_h, df_d) in stats.items()}, target_date, output_dir, prefix)
+    emit('file_generated', f"Updated {os.path.basename(users_index_path)}", stage='transform', file=os.path.basename(users_index_path), path=users_index_path)
+
+def bflow_output_files(scenario, warehouse, output_dir):
+    return [os.path.join(output_dir, f"dashboard_{kind}_{warehouse['prefix']}{scenario['suffix']}.json") for kind in ('data', 'lines', 'hu')]
+
+def run_shard(warehouse, target_date, actual_today, b_flow_routes, route_to_flow, output_dir, partition_dir, stages, engine):
+    # One warehouse end to end on its own Snowflake connection. Shards share nothing but the output
+    # directory and the date's partition in it, where every file they write is specific to their LGNUM/prefix.
+    # Every stage is checkpointed (see checkpoint.py); stages completed by an earlier attempt of a resumed run are reused.
+    # Only the selected stages run; the outputs of the others are left as they are.
+    import pandas as pd
+
+    lgnum = warehouse['lgnum']
+    with context(shard=lgnum, shard_name=warehouse['name']):
+        shard_start = time.perf_counter()
+        emit('shard_started', f"Processing warehouse {lgnum} ({warehouse['name']})...")
+
+        # Connect on first use, so a resumed run whose extracts are all checkpointed never touches Snowflake
+        connection = {}
+        def get_cursor():
+            if 'error' in connection:
+                raise connection['error']
+            if 'cur' not in connection:
+                try:
+                    connection['conn'] = connect_snowflake()
+                except Exception as e:
+                    connection['error'] = e
+                    emit('error', f"Failed to connect to Snowflake: {e}", stage='connect', error=str(e))
+                    raise
+                connection['cur'] = connection['conn'].cursor()
+            return connection['cur']
+
+        def finish(success):
+            if 'cur' in connection:
+                connection['cur'].close()
+                connection['conn'].close()
+            return {"lgnum": lgnum, "success": success, "duration_ms": round((time.perf_counter() - shard_start) * 1000)}
+
+        warehouses = [warehouse]
+
+        # --- SHARED EXTRACTION ---
+        # The B-flow scenarios and the picking stats still missing their extract are served by one
+        # extraction plan (see extract_shard); extracts checkpointed by an earlier attempt are reused.
+        scenarios = [scenario for scenario in get_bflow_scenarios(actual_today) if scenario['name'] in stages]
+        if scenarios and len(b_flow_routes) == 0:
+            emit('warning', "No B-flow routes found in routes.csv. Skipping dashboard JSON generation.")
+            scenarios = []
+        for scenario in list(scenarios):
+            if checkpoint.is_complete(lgnum, f"bflow_{scenario['name']}", bflow_output_files(scenario, warehouse, partition_dir)):
+                emit('stage_skipped', f"B-FLOW {scenario['name']} already completed, reusing its outputs.", stage=f"bflow_{scenario['name']}")
+                scenarios.remove(scenario)
+        pending = [scenario for scenario in scenarios if not checkpoint.has_extract(lgnum, f"bflow_{scenario['name']}")]
+        picking_pending = 'picking' in stages and not checkpoint.is_complete(lgnum, 'picking_extract')
+
+        extracts, extract_error = {}, None
+        if pending or picking_pending:
+            stage_start = time.perf_counter()
+            consumers = [f"B-FLOW {scenario['name']}" for scenario in pending] + ([f"picking {target_date}"] if picking_pending else [])
+            emit('stage_started', f"Extracting SDS_CP_LTAP lines and HU links for {', '.join(consumers)}...", stage='extract')
+            try:
+                extracts = extract_shard(get_cursor(), warehouses, pending, actual_today, b_flow_routes, target_date if picking_pending else None)
+                duration_ms = round((time.perf_counter() - stage_start) * 1000)
+                checkpoint.mark_stage(lgnum, 'extract', 'completed', duration_ms=duration_ms)
+                emit('stage_finished', stage='extract', duration_ms=duration_ms)
+            except Exception as ex:
+                extract_error = ex
+                checkpoint.mark_stage(lgnum, 'extract', 'failed', error=str(ex))
+                emit('error', f"Extraction Error: {ex}", stage='extract', error=str(ex))
+
+        # --- B-FLOW DASHBOARDS ---
+        for scenario in scenarios:
+            stage = f"bflow_{scenario['name']}"
+            stage_start = time.perf_counter()
+            emit('stage_started', f"Processing B-FLOW {scenario['name']} deliveries (WADAT {scenario['sql_cond']})...", stage=stage)
+
+            try:
+                if stage in extracts:
+                    frames = extracts[stage]
+                    if frames is not None:
+                        checkpoint.save_extract(lgnum, stage, frames)
+                else:
+                    frames = checkpoint.load_extract(lgnum, stage)
+                    if frames is None:
+                        raise extract_error or RuntimeError(f"No {stage} extract: not extracted in this attempt and no checkpoint of it")
+                    log(f"Reusing checkpointed B-FLOW {scenario['name']} extract.")
+                if frames is not None:
+                    build_bflow_outputs(scenario, frames, partition_dir, stage, warehouses, engine)
+                else:
+                    log(f"No B-FLOW {scenario['name']} deliveries found.")
+                duration_ms = round((time.perf_counter() - stage_start) * 1000)
+                saved = checkpoint.checkpoint_name(lgnum, stage) if frames is not None else None
+                checkpoint.mark_stage(lgnum, stage, 'completed', checkpoint=saved, duration_ms=duration_ms)
+                emit('stage_finished', stage=stage, duration_ms=duration_ms)
+            except Exception as ex:
+                checkpoint.mark_stage(lgnum, stage, 'failed', error=str(ex))
+                emit('error', f"B-FLOW {scenario['name']} Extraction Error: {ex}", stage=stage, error=str(ex))
+
+        # --- PICKING EXTRACTION ---
+        df_ltap_filtered, df_routes_db, df_packing = None, None, None
+        picking_failed = False
+        if 'picking' in stages:
+            if not picking_pending:
+                emit('stage_skipped', "Picking extract already completed, reusing its checkpoint.", stage='picking_extract')
+                df_ltap_filtered, df_routes_db = checkpoint.load_extract(lgnum, 'picking_extract')
+            elif extract_error is not None:
+                # Packing still runs on its own extract, so resuming the run only repeats the picking side
+                checkpoint.mark_stage(lgnum, 'picking_extract', 'failed', error=str(extract_error))
+                picking_failed = True
+            else:
+                stage_start = time.perf_counter()
+                emit('stage_started', f"Taking the picking lines of {target_date} from the shared extract...", stage='picking_extract')
+                df_ltap_filtered, df_routes_db = extracts['picking_extract']
+                saved = checkpoint.save_extract(lgnum, 'picking_extract', (df_ltap_filtered, df_routes_db))
+                duration_ms = round((time.perf_counter() - stage_start) * 1000)
+                checkpoint.mark_stage(lgnum, 'picking_extract', 'completed', checkpoint=saved, duration_ms=duration_ms)
+                emit('stage_finished', stage='picking_extract', duration_ms=duration_ms)
+
+        # --- PACKING EXTRACTION ---
+        if 'packing' in stages:
+            if checkpoint.is_complete(lgnum, 'packing_extract'):
+                emit('stage_skipped', "Packing extract already completed, reusing its checkpoint.", stage='packing_extract')
+                df_packing = checkpoint.load_extract(lgnum, 'packing_extract')
+            else:
+                stage_start = time.perf_counter()
+                emit('stage_started', "Fetching packing data...", stage='packing_extract')
+                try:
+                    df_packing = extract_packing(get_cursor(), warehouse, target_date)
+                    saved = checkpoint.save_extract(lgnum, 'packing_extract', df_packing)
+                    checkpoint.mark_stage(lgnum, 'packing_extract', 'completed', checkpoint=saved,
+                                          duration_ms=round((time.perf_counter() - stage_start) * 1000))
+                except Exception as e:
+                    # Picking stats are still produced; resuming the run retries packing and recomputes the stats
+                    checkpoint.mark_stage(lgnum, 'packing_extract', 'failed', error=str(e))
+                    emit('error', f"Packing Query Error: {e}", stage='packing_extract', error=str(e))
+                    df_packing = pd.DataFrame(columns=PACKING_COLUMNS)
+                emit('stage_finished', stage='packing_extract', duration_ms=round((time.perf_counter() - stage_start) * 1000))
+
+        # --- TRANSFORM ---
+        if picking_failed:
+            # The stats need both extracts; --resume computes them once the picking extract succeeds
+            checkpoint.mark_stage(lgnum, 'transform', 'skipped', error="picking_extract failed")
+            emit('stage_skipped', "Statistics not computed: the picking extract failed.", stage='transform')
+            return finish(False)
+        if 'picking' in stages or 'packing' in stages:
+            upstream_ran = checkpoint.was_executed(lgnum, 'picking_extract') or checkpoint.was_executed(lgnum, 'packing_extract')
+            if not upstream_ran and checkpoint.is_complete(lgnum, 'transform'):
+                emit('stage_skipped', "Statistics already computed from the reused extracts.", stage='transform')
+            else:
+                stage_start = time.perf_counter()
+                emit('stage_started', "Transforming data...", stage='transform')
+                try:
+                    stats = transform_shard(warehouse, df_ltap_filtered, df_routes_db, df_packing, route_to_flow, engine)
+                    write_shard_outputs(warehouse, stats, target_date, output_dir, partition_dir)
+                except Exception as ex:
+                    checkpoint.mark_stage(lgnum, 'transform', 'failed', error=str(ex))
+                    emit('error', f"Transform Error: {ex}", stage='transform', error=str(ex))
+                    return finish(False)
+                duration_ms = round((time.perf_counter() - stage_start) * 1000)
+                checkpoint.mark_stage(lgnum, 'transform', 'completed', duration_ms=duration_ms)
+                emit('stage_finished', stage='transform', duration_ms=duration_ms)
+
+        result = finish(True)
+        emit('shard_finished', f"Warehouse {lgnum} ({warehouse['name']}) done in {result['duration_ms'] / 1000:.1f}s.", duration_ms=result['duration_ms'])
+        return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Pull and transform Snowflake picking data.")
+    parser.add_argument('--date', type=str, help="Date to pull data for (YYYY-MM-DD). Defaults to today.")
+    parser.add_argument('--events', action='store_true', help="Write progress as newline-delimited JSON events instead of plain text.")
+    parser.add_argument('--live', action='store_true', help="Keep refreshing today's open B-flow dashboards from picking confirmations only.")
+    parser.add_argument('--interval', type=int, default=30, help="Seconds between live refresh cycles. Defaults to 30.")
+    parser.add_argument('--lgnum', type=str, help=f"Comma separated warehouses (shards) to process. Defaults to all: {','.join(WAREHOUSES)}.")
+    parser.add_argument('--workers', type=int, help="Shards processed in parallel. Defaults to one per selected warehouse.")
+    parser.add_argument('--resume', type=str, metavar='RUN_ID', help="Resume an earlier run: only its failed or invalidated stages are executed again.")
+    parser.add_argument('--stages', type=str, help=f"Comma separated stages to run, leaving the outputs of the others untouched. Defaults to all: {','.join(STAGES)}.")
+    parser.add_argument('--precompute-users', type=int, default=0, metavar='SECONDS', help="After the run, prepare the history lookups of the day's active users for up to SECONDS. Off by default.")
+    parser.add_argument('--engine', type=str, default='pandas', choices=['pandas', 'polars'], help="Transformation engine. polars runs the same transformations as lazy multi-threaded query plans with identical outputs (requires polars). Defaults to pandas.")
+    args = parser.parse_args()
 
     output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
-    os.makedirs(output_dir, exist_ok=True)
 
-    output_mapping = {
-        'ms_picking_hourly_stats.csv': ms_picking_h,
-        'ms_picking_daily_stats.csv': ms_picking_d,
-        'cvns_picking_hourly_stats.csv': cvns_picking_h,
-        'cvns_picking_daily_stats.csv': cvns_picking_d,
-        'ms_packing_hourly_stats.csv': ms_packing_h,
-        'ms_packing_daily_stats.csv': ms_packing_d,
-        'cvns_packing_hourly_stats.csv': cvns_packing_h,
-        'cvns_packing_daily_stats.csv': cvns_packing_d
-    }
+    # Validate before importing pandas/snowflake so bad invocations fail immediately
+    if args.date:
+        try:
+            datetime.strptime(args.date, '%Y-%m-%d')
+        except ValueError:
+            parser.error(f"--date must be in YYYY-MM-DD format, got '{args.date}'")
+    if args.interval <= 0:
+        parser.error("--interval must be a positive number of seconds")
+    if args.workers is not None and args.workers <= 0:
+        parser.error("--workers must be a positive number")
+    if args.precompute_users < 0:
+        parser.error("--precompute-users must be a non-negative number of seconds")
+    if args.precompute_users and args.live:
+        parser.error("--precompute-users runs after a complete run; it cannot be combined with --live")
+    if args.engine == 'polars' and importlib.util.find_spec('polars') is None:
+        parser.error("--engine polars requires the polars package (pip install polars)")
+    stages = STAGES
+    if args.stages:
+        stages = [v.strip() for v in args.stages.split(',') if v.strip()]
+        unknown = [v for v in stages if v not in STAGES]
+        if unknown or not stages:
+            parser.error(f"--stages must be a comma separated list of {', '.join(STAGES)}, got '{args.stages}'")
+        if args.live:
+            parser.error("--live only refreshes today's B-flow dashboards; it cannot be combined with --stages")
+    # The B-flow dashboards are snapshots of the deliveries open now: a run for another date only builds its stats
+    if args.date and not args.live and args.date != datetime.today().strftime('%Y-%m-%d'):
+        if args.stages and any(stage in BFLOW_STAGES for stage in stages):
+            parser.error(f"the {', '.join(BFLOW_STAGES)} stages only run for today; --date {args.date} can only run {', '.join(s for s in STAGES if s not in BFLOW_STAGES)}")
+        stages = [stage for stage in stages if stage not in BFLOW_STAGES]
+    if args.resume:
+        if args.date or args.lgnum or args.live or args.stages:
+            parser.error("--resume reuses the date, warehouses and stages of the original run; it cannot be combined with --date, --lgnum, --stages or --live")
+        if checkpoint.load_manifest(output_dir, args.resume) is None:
+            parser.error(f"No checkpointed run '{args.resume}' in {checkpoint.get_runs_dir(output_dir)}")
+    try:
+        warehouses = get_warehouses([v.strip() for v in args.lgnum.split(',') if v.strip()] if args.lgnum else None)
+    except ValueError as e:
+        parser.error(str(e))
 
-    for filename, df in output_mapping.items():
-        if not df.empty:
-            df.to_csv(os.path.join(output_dir, filename), index=False)
-            print(f"Generated {filename}")
-        
-    print("Done!")
+    # --- PARTITION LOCKS ---
+    # Outputs go to the partition of the target date (see partitions.py); runs for other dates, other
+    # warehouses or other stages of the same date may run at the same time. --live takes the today locks
+    # per rebuild (run_live_today) rather than for the whole day.
+    if args.resume:
+        params = checkpoint.load_manifest(output_dir, args.resume)["params"]
+        partition_date = params['target_date']
+        locked_lgnums = params['lgnums']
+        locked_stages = params.get('stages', STAGES)
+    else:
+        partition_date = datetime.today().strftime('%Y-%m-%d') if args.live or not args.date else args.date
+        locked_lgnums = [wh['lgnum'] for wh in warehouses]
+        locked_stages = [] if args.live else stages
+    partition_dir = get_partition_dir(output_dir, partition_date)
+    busy = lock_stages(partition_dir, locked_lgnums, locked_stages)
+    if busy:
+        parser.exit(EXIT_BLOCKED, f"{parser.prog}: blocked: another run is processing the {', '.join(f'{stage} ({lgnum})' for lgnum, stage in busy)} stage(s) of {partition_date}\n")
+
+    import pandas as pd
+    from dotenv import load_dotenv
+
+    generation = configure(events=args.events)
+    run_start = time.perf_counter()
+
+    if args.resume:
+        # Same day boundaries as the original attempt, so the checkpointed extracts stay consistent
+        run_id = args.resume
+        params = checkpoint.resume_run(output_dir, run_id)
+        target_date = params['target_date']
+        actual_today = params['actual_today']
+        warehouses = get_warehouses(params['lgnums'])
+        stages = params.get('stages', STAGES)
+    elif not args.live:
+        run_id = generation
+        target_date = partition_date
+        actual_today = datetime.today().strftime('%Y-%m-%d')
+        os.makedirs(output_dir, exist_ok=True)
+        checkpoint.start_run(output_dir, run_id, {
+            "target_date": target_date,
+            "actual_today": actual_today,
+            "lgnums": [wh['lgnum'] for wh in warehouses],
+            "stages": stages
+        })
+    else:
+        run_id = None
+        target_date = datetime.today().strftime('%Y-%m-%d')
+        actual_today = target_date
+
+    stage_note = f" [stages: {', '.join(stages)}]" if stages != STAGES else ""
+    engine_note = f" [engine: {args.engine}]" if args.engine != 'pandas' else ""
+    emit('run_started', f"Running data extraction for date: {target_date}{stage_note}{engine_note}" + (f" (resuming run {run_id})" if args.resume else ""),
+         target_date=target_date, run_id=run_id, shards=[wh['lgnum'] for wh in warehouses], stages=stages, engine=args.engine,
+         partition=os.path.relpath(partition_dir, output_dir))
+
+    load_dotenv()
+
+    # --- SHARED ROUTE MAPPING ---
+    routes_csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'routes.csv')
+    try:
+        df_route_mapping = pd.read_csv(routes_csv_path)
+        route_to_flow = dict(zip(df_route_mapping['ROUTE'], df_route_mapping['FLOW']))
+        b_flow_routes = df_route_mapping[df_route_mapping['FLOW'] == 'B-flow']['ROUTE'].unique()
+    except FileNotFoundError:
+        emit('warning', f"Warning: routes.csv not found at {routes_csv_path}.")
+        route_to_flow = {}
+        b_flow_routes = []
+
+    os.makedirs(partition_dir, exist_ok=True)
+
+    if args.live:
+        # Near-real-time mode: only today's open B-flow deliveries, no stats or other scenarios
+        if len(b_flow_routes) == 0:
+            emit('warning', "No B-flow routes found in routes.csv. Nothing to refresh in live mode.")
+            return
+        try:
+            conn = connect_snowflake()
+        except Exception as e:
+            emit('error', f"Failed to connect to Snowflake: {e}", stage='connect', error=str(e))
+            return
+        cur = conn.cursor()
+        run_live_today(cur, b_flow_routes, output_dir, partition_dir, target_date, args.interval, warehouses, args.engine)
+        cur.close()
+        conn.close()
+        return
+
+    # --- WAREHOUSE SHARDS ---
+    workers = args.workers or len(warehouses)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_shard, wh, target_date, actual_today, b_flow_routes, route_to_flow, output_dir, partition_dir, stages, args.engine) for wh in warehouses]
+        shard_results = [future.result() for future in futures]
+
+    update_lookup_index(partition_dir, 'lookup_index')
+    if target_date == actual_today:
+        set_current(output_dir, target_date, run_id)
+
+    if args.precompute_users:
+        precompute_user_histories(warehouses, target_date, output_dir, args.precompute_users)
+
+    checkpoint.finish_run()
+    failed = checkpoint.failed_stages()
+    if failed:
+        emit('warning', f"{len(failed)} stage(s) failed or skipped: {', '.join(failed)}. Retry them with --resume {run_id}", run_id=run_id, failed_stages=failed)
+    emit('run_finished', "Done!", duration_ms=round((time.perf_counter() - run_start) * 1000), run_id=run_id,
+         shards={r['lgnum']: {"success": r['success'], "duration_ms": r['duration_ms']} for r in shard_results})
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,267 @@
+import os
+import json
+import math
+from datetime import datetime, timedelta
+
+# Mergeable quantile sketches (t-digests) of hourly productivity, next to the cube.
+# One partition per day: output/sketches/date=YYYY-MM-DD/<LGNUM>_<activity>.json
+# {"date", "lgnum", "activity", "all": digest, "users": {QNAME: digest}}, digest = {"count", "min", "max", "centroids": [[mean, weight], ...]}
+# A value is the PRODUCTIVITY of one user in one hour (all flows/floors together). Percentiles over any
+# range of days merge at most one small digest per day, so they never need the hourly records.
+
+COMPRESSION = 100
+
+RETENTION_DAYS = 400
+
+# Days merged for the percentile bands of fetch_user_stats.py, ending at the date asked for
+WINDOW_DAYS = 365
+
+SKETCH_MEASURES = {
+    'picking': 'LINES_PICKED',
+    'packing': 'BOXES_PACKED'
+}
+
+PERCENTILES = [10, 25, 50, 75, 90]
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+
+class TDigest:
+    # Merging t-digest (Dunning & Ertl) with the arcsine scale function: centroids stay small in the
+    # tails, so p10/p90 remain accurate, and the size is bounded by the compression whatever the count.
+
+    def __init__(self, compression=COMPRESSION):
+        self.compression = compression
+        self.centroids = []
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer = []
+
+    def add(self, value, weight=1):
+        self._buffer.append((float(value), weight))
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def merge(self, other):
+        other._compress()
+        self._buffer.extend(other.centroids)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q_limit(self, k):
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self.centroids + self._buffer)
+        self._buffer = []
+        total = sum(weight for _mean, weight in points)
+
+        merged = [list(points[0])]
+        weight_before = 0
+        q_limit = self._q_limit(self._k(0) + 1)
+        for mean, weight in points[1:]:
+            last = merged[-1]
+            if (weight_before + last[1] + weight) / total <= q_limit:
+                last[1] += weight
+                last[0] += (mean - last[0]) * weight / last[1]
+            else:
+                weight_before += last[1]
+                q_limit = self._q_limit(self._k(weight_before / total) + 1)
+                merged.append([mean, weight])
+        self.centroids = [tuple(c) for c in merged]
+
+    def quantile(self, q):
+        # Interpolates between centroid centres; below the first and above the last towards min/max
+        self._compress()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+
+        target = q * self.count
+        first_mean, first_weight = self.centroids[0]
+        if target < first_weight / 2:
+            return self.min + (first_mean - self.min) * target / (first_weight / 2)
+
+        cumulative = 0
+        for (mean, weight), (next_mean, next_weight) in zip(self.centroids, self.centroids[1:]):
+            center = cumulative + weight / 2
+            next_center = cumulative + weight + next_weight / 2
+            if target <= next_center:
+                return mean + (next_mean - mean) * (target - center) / (next_center - center)
+            cumulative += weight
+
+        last_mean, last_weight = self.centroids[-1]
+        center = self.count - last_weight / 2
+        return last_mean + (self.max - last_mean) * min(1.0, (target - center) / (last_weight / 2))
+
+    def cdf(self, value):
+        # Share of the values below `value`, the inverse of quantile()
+        self._compress()
+        if not self.centroids:
+            return None
+        if value < self.min:
+            return 0.0
+        if value >= self.max:
+            return 1.0
+
+        first_mean, first_weight = self.centroids[0]
+        if value < first_mean:
+            return (value - self.min) / (first_mean - self.min) * first_weight / 2 / self.count
+
+        cumulative = 0
+        for (mean, weight), (next_mean, next_weight) in zip(self.centroids, self.centroids[1:]):
+            if value < next_mean:
+                center = cumulative + weight / 2
+                next_center = cumulative + weight + next_weight / 2
+                return (center + (next_center - center) * (value - mean) / (next_mean - mean)) / self.count
+            cumulative += weight
+
+        last_mean, last_weight = self.centroids[-1]
+        center = self.count - last_weight / 2
+        return (center + last_weight / 2 * (value - last_mean) / (self.max - last_mean)) / self.count
+
+    def to_dict(self):
+        self._compress()
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "centroids": [[round(mean, 6), weight] for mean, weight in self.centroids]
+        }
+
+    @classmethod
+    def from_dict(cls, data, compression=COMPRESSION):
+        digest = cls(compression)
+        digest.centroids = [tuple(c) for c in data["centroids"]]
+        digest.count = data["count"]
+        digest.min = data["min"]
+        digest.max = data["max"]
+        return digest
+
+def get_sketch_dir(output_dir=None):
+    return os.path.join(output_dir or DEFAULT_OUTPUT_DIR, 'sketches')
+
+def hourly_productivity(df_hourly, activity):
+    # One value per user and hour: the hourly stats split an hour's effort across flows/floors
+    df_user = df_hourly.groupby(['QNAME', 'QDATU', 'HOUR'])[[SKETCH_MEASURES[activity], 'EFFORT']].sum().reset_index()
+    df_user = df_user[df_user['EFFORT'] > 0]
+    df_user['PRODUCTIVITY'] = df_user[SKETCH_MEASURES[activity]] / df_user['EFFORT']
+    return df_user
+
+def prune_partitions(date, output_dir=None):
+    cutoff = (datetime.strptime(date, '%Y-%m-%d') - timedelta(days=RETENTION_DAYS - 1)).strftime('%Y-%m-%d')
+    sketch_dir = get_sketch_dir(output_dir)
+    for entry in os.listdir(sketch_dir):
+        if entry.startswith('date=') and entry[5:] < cutoff:
+            partition_dir = os.path.join(sketch_dir, entry)
+            for name in os.listdir(partition_dir):
+                os.remove(os.path.join(partition_dir, name))
+            os.rmdir(partition_dir)
+
+def update_day(df_hourly, date, lgnum, activity, output_dir=None):
+    # Writes (or replaces) the day's sketches, so re-running a date never counts its hours twice
+    if df_hourly is None or df_hourly.empty:
+        return None
+
+    df_user = hourly_productivity(df_hourly, activity)
+    if df_user.empty:
+        return None
+
+    group = TDigest()
+    users = {}
+    for qname, values in df_user.groupby('QNAME')['PRODUCTIVITY']:
+        digest = users[str(qname)] = TDigest()
+        for value in values:
+            digest.add(value)
+        group.merge(digest)
+
+    partition_dir = os.path.join(get_sketch_dir(output_dir), f"date={date}")
+    os.makedirs(partition_dir, exist_ok=True)
+
+    sketch = {
+        "date": date,
+        "lgnum": str(lgnum),
+        "activity": activity,
+        "all": group.to_dict(),
+        "users": {qname: digest.to_dict() for qname, digest in sorted(users.items())}
+    }
+    partition_path = os.path.join(partition_dir, f"{lgnum}_{activity}.json")
+    tmp_path = partition_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(sketch, f)
+    os.replace(tmp_path, partition_path)
+
+    prune_partitions(date, output_dir)
+    return partition_path
+
+def read_sketches(lgnum, activity, start, end, output_dir=None):
+    # The LGNUM/activity sketches of the day partitions in [start, end], oldest first
+    sketch_dir = get_sketch_dir(output_dir)
+    if not os.path.isdir(sketch_dir):
+        return []
+
+    sketches = []
+    for entry in sorted(os.listdir(sketch_dir)):
+        if not entry.startswith('date='):
+            continue
+        date = entry[5:]
+        if date < start or date > end:
+            continue
+        path = os.path.join(sketch_dir, entry, f"{lgnum}_{activity}.json")
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path) as f:
+                sketches.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sketches
+
+def load_digests(sketches, qname=None):
+    # Merged digests of the given day sketches: (all users, `qname` or None, days read)
+    group = TDigest()
+    user = TDigest() if qname else None
+    for sketch in sketches:
+        group.merge(TDigest.from_dict(sketch["all"]))
+        if qname and qname in sketch["users"]:
+            user.merge(TDigest.from_dict(sketch["users"][qname]))
+    return group, user, len(sketches)
+
+def percentile_bands(digest):
+    if digest is None or digest.count == 0:
+        return None
+    bands = {f"p{p}": round(digest.quantile(p / 100), 2) for p in PERCENTILES}
+    bands["hours"] = digest.count
+    return bands
+
+def window_start(end, days=WINDOW_DAYS):
+    return (datetime.strptime(end, '%Y-%m-%d') - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+def summarize(lgnum, activity, qname, end, sketches=None, output_dir=None):
+    # Percentile bands of a user's hourly productivity next to those of everyone in the same LGNUM/activity,
+    # over the WINDOW_DAYS days ending at `end`; `sketches` are that window's sketches when already read
+    if sketches is None:
+        sketches = read_sketches(lgnum, activity, window_start(end), end, output_dir)
+    group, user, days = load_digests(sketches, qname)
+    user_bands = percentile_bands(user)
+    return {
+        "days": days,
+        "user": user_bands,
+        "peers": percentile_bands(group),
+        # Share of all user-hours below this user's median, in percent
+        "user_p50_rank": round(100 * group.cdf(user.quantile(0.5)), 1) if user_bands else None
+    }
@@ -0,0 +1,81 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from process_data import build_hu_model, fetch_prio_groups, to_int_key
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+def test_non_numeric_keys_become_na():
+    keys = to_int_key(pd.Series(['00000000000000012345', ' 42 ', 'HU-ABC', '1234567890123456789'], name='EXIDV'))
+    assert keys[0] == 12345
+    assert keys[1] == 42
+    assert keys[2:].isna().all()
+
+def test_alphanumeric_exidv_does_not_cross_join():
+    # Two HUs with alphanumeric barcodes and a priority group of a third alphanumeric HU:
+    # every key is <NA>, and none of them may match another
+    df_likp = pd.DataFrame({'VBELN': to_int_key(pd.Series(['0080000001'], name='VBELN')), 'LGNUM': ['245'], 'LPRIO': ['01'], 'WAUHR': ['10:00:00']})
+    df_hu = pd.DataFrame({
+        'VBELN': to_int_key(pd.Series(['0080000001', '0080000001'], name='VBELN')),
+        'EXIDV': to_int_key(pd.Series(['HU-A', 'HU-B'], name='EXIDV')),
+        'VLTYP': ['MS1', 'MS1'],
+        'TANUM': to_int_key(pd.Series(['T1', 'T2'], name='TANUM'))
+    })
+    df_ltap = pd.DataFrame({
+        'VBELN': to_int_key(pd.Series(['0080000001', '0080000001'], name='VBELN')),
+        'TANUM': to_int_key(pd.Series(['T1', 'T3'], name='TANUM')),
+        'QDATU': ['2026-10-19', None],
+        'VSOLA': [1.0, 2.0]
+    })
+    df_prio = fetch_prio_groups(FakeCursor([('HU-C', 'GRP1', 'USER1'), ('00000000000000000007', 'GRP2', 'USER2')]), [1])
+
+    model = build_hu_model(df_likp, df_ltap, df_hu, df_prio, df_ltap)
+
+    assert len(model) == 2
+    assert (model['GROUPED'] == 'NOT OK').all()
+    assert not model['IS_PICKED'].any()
+    assert df_prio['EXIDV'].tolist() == [7]
+
+def test_non_numeric_keys_drop_out_of_merges_the_string_keys_matched():
+    # A delivery and an HU with alphanumeric numbers: the string keys used before int64 keys matched them
+    # (delivery context, priority group); as <NA> keys they drop out of the HU model instead
+    vbelns = pd.Series(['0080000001', 'DL-0002'], name='VBELN')
+    exidvs = pd.Series(['00000000000000000011', 'HU-X'], name='EXIDV')
+    # Priority groups as the zfill(20) query of the baseline found them
+    prio_rows = [('00000000000000000011', 'G1', 'USER1'), ('0000000000000000HU-X', 'G2', 'USER2')]
+
+    # Baseline: VBELN strip/lstrip('0'), EXIDV zfill(20), merges on the strings
+    likp_str = pd.DataFrame({'VBELN': vbelns.str.strip().str.lstrip('0'), 'LPRIO': ['01', '02']})
+    hu_str = pd.DataFrame({'VBELN': vbelns.str.strip().str.lstrip('0'), 'EXIDV_STR': exidvs.str.strip().str.zfill(20)})
+    prio_str = pd.DataFrame(prio_rows, columns=['EXIDV_STR', 'ZEXIDVGRP', 'PICKINIUSER'])
+    baseline = hu_str.merge(likp_str, on='VBELN', how='inner').merge(prio_str, on='EXIDV_STR', how='inner')
+    assert baseline['VBELN'].tolist() == ['80000001', 'DL-0002']
+
+    df_likp = pd.DataFrame({'VBELN': to_int_key(vbelns), 'LGNUM': ['245', '245'], 'LPRIO': ['01', '02'], 'WAUHR': ['10:00:00', '12:00:00']})
+    df_hu = pd.DataFrame({
+        'VBELN': to_int_key(vbelns),
+        'EXIDV': to_int_key(exidvs),
+        'VLTYP': ['MS1', 'MS1'],
+        'TANUM': to_int_key(pd.Series(['0000000101', '0000000102'], name='TANUM'))
+    })
+    df_ltap = pd.DataFrame({'VBELN': df_hu['VBELN'], 'TANUM': df_hu['TANUM'], 'QDATU': ['2026-10-19', '2026-10-19'], 'VSOLA': [1.0, 2.0]})
+    df_prio = fetch_prio_groups(FakeCursor(prio_rows), [1])
+
+    assert df_likp['VBELN'].isna().tolist() == [False, True]
+    assert df_hu['EXIDV'].isna().tolist() == [False, True]
+    assert df_prio['EXIDV'].tolist() == [11]
+
+    model = build_hu_model(df_likp, df_ltap, df_hu, df_prio, df_ltap)
+    assert model['VBELN'].tolist() == [80000001]
+    assert model['ZEXIDVGRP'].tolist() == ['G1']
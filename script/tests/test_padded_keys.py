@@ -0,0 +1,174 @@
+import os
+import sys
+import random
+import json
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from loadtest_fixtures import build_scenario_frames
+from config.config import FLOOR_MAPPING
+from process_data import bflow_dept_outputs, bflow_frames, build_hu_model, get_bflow_scenarios, to_int_key
+from warehouses import get_warehouses
+
+# The same deliveries as Snowflake returns them, with VBELN zero-padded in LIKP/LTAP but not in the HU
+# link tables (and TANUM/EXIDV padded to their stored width), must give the HU model and dashboards of
+# the canonical keys.
+
+def fixture_frames():
+    warehouse = get_warehouses()[0]
+    scenario = dict(get_bflow_scenarios('2026-10-19')[1], date='2026-10-19')
+    ids = {'vbeln': 80000000, 'tanum': 1000000000, 'exidv': 100000000000000000}
+    return scenario, warehouse, build_scenario_frames(random.Random(1), scenario, warehouse, 0.02, ids)
+
+def padded(values, width):
+    return values.astype(str).str.zfill(width)
+
+def snowflake_shaped(frames):
+    df_likp = frames['likp'].assign(VBELN=padded(frames['likp']['VBELN'], 10))
+    df_lines = frames['ltap'].assign(VBELN=padded(frames['ltap']['VBELN'], 10), TANUM=padded(frames['ltap']['TANUM'], 10))
+    df_links = frames['hu'][['VBELN', 'EXIDV', 'VLTYP', 'TANUM']].assign(
+        VBELN=frames['hu']['VBELN'].astype(str),
+        EXIDV=padded(frames['hu']['EXIDV'], 20),
+        TANUM=padded(frames['hu']['TANUM'], 10)
+    )
+    line_keys = pd.DataFrame({col: to_int_key(df_lines[col]) for col in ['VBELN', 'TANUM']})
+    link_keys = pd.DataFrame({col: to_int_key(df_links[col]) for col in ['VBELN', 'TANUM', 'EXIDV']})
+    return bflow_frames(df_likp, pd.DataFrame(), df_lines, line_keys, df_links, link_keys, frames['prio_grp'])
+
+def test_padded_and_unpadded_vbelns_join_to_the_same_hu():
+    _scenario, _warehouse, frames = fixture_frames()
+    joined = snowflake_shaped(frames)
+
+    model = build_hu_model(joined['likp'], joined['ltap'], joined['hu'], joined['prio_grp'], joined['ltap'])
+    expected = build_hu_model(frames['likp'], frames['ltap'], frames['hu'], frames['prio_grp'], frames['ltap'])
+
+    assert len(model) == len(frames['hu'])
+    assert model['LGNUM'].notnull().all()
+    columns = ['VBELN', 'EXIDV', 'LGNUM', 'GROUPED', 'IS_PICKED', 'LINES_PER_HU']
+    assert model[columns].sort_values(['VBELN', 'EXIDV']).reset_index(drop=True).equals(
+        expected[columns].sort_values(['VBELN', 'EXIDV']).reset_index(drop=True))
+
+def test_padded_vbelns_give_the_same_dashboards():
+    scenario, warehouse, frames = fixture_frames()
+    joined = snowflake_shaped(frames)
+
+    outputs = bflow_dept_outputs(scenario, joined, [warehouse])
+    expected = bflow_dept_outputs(scenario, frames, [warehouse])
+
+    assert [json.dumps(dashboard, sort_keys=True, default=str) for _lgnum, _filename, dashboard, *_rest in outputs] == \
+        [json.dumps(dashboard, sort_keys=True, default=str) for _lgnum, _filename, dashboard, *_rest in expected]
+
+# --- PARITY WITH THE BASELINE PER-DEPARTMENT HU COMPUTATION ---
+
+def baseline_hu_exports(df_likp_all, df_ltap_dash, df_hu_dash, df_prio_grp):
+    # The HU export columns as the per-department loop computed them before the HU model was shared,
+    # on string keys as Snowflake returns them: LTAP VBELN/TANUM and priority-group EXIDV zero-padded,
+    # LIKP VBELN and link EXIDV as stored
+    df_hu_dash = df_hu_dash.copy()
+    df_hu_dash['VBELN'] = df_hu_dash['VBELN'].astype(str).str.strip().str.lstrip('0')
+    df_hu_dash['TANUM'] = df_hu_dash['TANUM'].astype(str).str.strip()
+    df_prio_grp = df_prio_grp.copy()
+    df_prio_grp['EXIDV'] = df_prio_grp['EXIDV'].astype(str).str.strip()
+
+    exports = {}
+    for lgnum in ['245', '266']:
+        df_likp_dept = df_likp_all[df_likp_all['LGNUM'] == lgnum]
+        df_ltap_dept = df_ltap_dash[df_ltap_dash['LGNUM'] == lgnum].copy()
+        df_hu_dept = df_hu_dash[df_hu_dash['VBELN'].isin(df_likp_dept['VBELN'])].copy()
+
+        if lgnum == '266':
+            cvns_starts = ['L', 'F', 'X', 'N', 'O', 'Y', 'W']
+            cvns_not_starts = ['YES', 'NO', 'LONGGOODS', 'NCS', 'OSO']
+            def filter_local(row):
+                v = str(row['VLPLA']) if row['VLPLA'] else ""
+                return any(v.startswith(s) for s in cvns_starts) and not any(v.startswith(s) for s in cvns_not_starts)
+        else:
+            ms_starts = ['B', 'C', 'D', 'V', 'E']
+            def filter_local(row):
+                v = str(row['VLPLA']) if row['VLPLA'] else ""
+                vltyp = str(row['VLTYP']) if row['VLTYP'] else ""
+                return any(v.startswith(s) for s in ms_starts) and vltyp != 'REP'
+        df_ltap_dept = df_ltap_dept[df_ltap_dept.apply(filter_local, axis=1)]
+
+        df_ltap_dept['VBELN'] = df_ltap_dept['VBELN'].astype(str).str.strip().str.lstrip('0')
+        df_likp_dept['VBELN'] = df_likp_dept['VBELN'].astype(str).str.strip().str.lstrip('0')
+        df_hu_dept['VBELN'] = df_hu_dept['VBELN'].astype(str).str.strip().str.lstrip('0')
+
+        df_hu_merged = pd.merge(df_hu_dept, df_likp_dept[['VBELN', 'LPRIO', 'WAUHR']], on='VBELN', how='left')
+        df_hu_merged['EXIDV_STR'] = df_hu_merged['EXIDV'].astype(str).str.strip().str.zfill(20)
+        df_hu_merged = pd.merge(df_hu_merged, df_prio_grp, left_on='EXIDV_STR', right_on='EXIDV', how='left', suffixes=('', '_prio'))
+        df_hu_merged['GROUPED'] = df_hu_merged['ZEXIDVGRP'].notnull().map({True: 'OK', False: 'NOT OK'})
+        df_hu_merged = df_hu_merged.drop(columns=['EXIDV_prio', 'EXIDV_STR'])
+        df_hu_merged['FLOOR'] = df_hu_merged['VLTYP'].map(lambda x: FLOOR_MAPPING.get(str(x), 'unknown_floor'))
+
+        df_ltap_tanum = df_ltap_dash[['TANUM', 'QDATU']].copy()
+        df_ltap_tanum['TANUM'] = df_ltap_tanum['TANUM'].astype(str).str.strip()
+        df_hu_tanum = df_hu_dash[['EXIDV', 'TANUM', 'VBELN']].copy()
+        df_hu_tanum = df_hu_tanum[df_hu_tanum['VBELN'].isin(df_likp_dept['VBELN'])]
+        df_ltap_hu_join = pd.merge(df_ltap_tanum, df_hu_tanum[['EXIDV', 'TANUM']], on='TANUM', how='inner')
+        exidv_pick_status = df_ltap_hu_join.groupby('EXIDV')['QDATU'].apply(lambda x: x.notnull().all()).to_dict() if not df_ltap_hu_join.empty else {}
+        df_hu_merged['IS_PICKED'] = df_hu_merged['EXIDV'].map(exidv_pick_status).fillna(False)
+
+        deliv_stats = df_ltap_dept.groupby('VBELN').agg({
+            'NISTA': 'sum',
+            'VSOLA': 'sum',
+            'VBELN': 'count'
+        }).rename(columns={'VBELN': 'LINES_COUNT', 'VSOLA': 'ITEMS_COUNT'}).reset_index()
+        hu_counts = df_hu_merged.groupby('VBELN').size().reset_index(name='HU_PER_DELIV')
+        hu_stats_merged = pd.merge(df_hu_merged, deliv_stats, on='VBELN', how='left')
+        hu_stats_merged = pd.merge(hu_stats_merged, hu_counts, on='VBELN', how='left')
+        hu_stats_merged['LINES_PER_HU'] = (hu_stats_merged['LINES_COUNT'] / hu_stats_merged['HU_PER_DELIV']).round(2)
+        hu_stats_merged['ITEMS_PER_HU'] = (hu_stats_merged['ITEMS_COUNT'] / hu_stats_merged['HU_PER_DELIV']).round(2)
+        exports[lgnum] = hu_stats_merged
+    return exports
+
+def parity_frames(scenario_index):
+    # Both warehouses' deliveries of one scenario, in canonical form and as Snowflake returns them
+    warehouses = get_warehouses(['245', '266'])
+    scenario = dict(get_bflow_scenarios('2026-10-19')[scenario_index], date='2026-10-19')
+    ids = {'vbeln': 80000000, 'tanum': 1000000000, 'exidv': 100000000000000000}
+    rng = random.Random(7)
+    parts = [build_scenario_frames(rng, scenario, warehouse, 0.05, ids) for warehouse in warehouses]
+    frames = {name: pd.concat([part[name] for part in parts], ignore_index=True) for name in ['likp', 'ltap', 'hu', 'prio_grp']}
+    # Every line linked to an HU of its delivery, so HUs carry several transfer orders with mixed pick status
+    first_hu = frames['hu'].drop_duplicates(subset=['VBELN']).set_index('VBELN')['EXIDV']
+    unlinked = frames['ltap'][~frames['ltap']['TANUM'].isin(frames['hu']['TANUM'])]
+    extra_links = pd.DataFrame({'VBELN': unlinked['VBELN'], 'EXIDV': unlinked['VBELN'].map(first_hu), 'VLTYP': unlinked['VLTYP'], 'TANUM': unlinked['TANUM']})
+    frames['hu'] = pd.concat([frames['hu'], extra_links.dropna(subset=['EXIDV']).astype({'EXIDV': 'int64'})], ignore_index=True)
+
+    raw = {
+        'likp': frames['likp'].assign(VBELN=frames['likp']['VBELN'].astype(str)),
+        'ltap': frames['ltap'].assign(VBELN=padded(frames['ltap']['VBELN'], 10), TANUM=padded(frames['ltap']['TANUM'], 10)),
+        'hu': frames['hu'][['VBELN', 'EXIDV', 'VLTYP', 'TANUM']].assign(
+            VBELN=frames['hu']['VBELN'].astype(str),
+            EXIDV=frames['hu']['EXIDV'].astype(str),
+            TANUM=padded(frames['hu']['TANUM'], 10)
+        ),
+        'prio_grp': frames['prio_grp'].assign(EXIDV=padded(frames['prio_grp']['EXIDV'], 20))
+    }
+    line_keys = pd.DataFrame({col: to_int_key(raw['ltap'][col]) for col in ['VBELN', 'TANUM']})
+    link_keys = pd.DataFrame({col: to_int_key(raw['hu'][col]) for col in ['VBELN', 'TANUM', 'EXIDV']})
+    prio = raw['prio_grp'].assign(EXIDV=to_int_key(raw['prio_grp']['EXIDV']))
+    closed = pd.DataFrame(columns=['LGNUM', 'LPRIO', 'WAUHR', 'VBELN'])
+    joined = bflow_frames(raw['likp'].copy(), closed, raw['ltap'], line_keys, raw['hu'], link_keys, prio)
+    return scenario, warehouses, joined, raw
+
+def test_hu_model_matches_the_baseline_per_department_computation():
+    columns = ['IS_PICKED', 'GROUPED', 'FLOOR', 'LINES_PER_HU', 'ITEMS_PER_HU']
+    for scenario_index in range(3):
+        scenario, warehouses, joined, raw = parity_frames(scenario_index)
+        expected = baseline_hu_exports(raw['likp'], raw['ltap'], raw['hu'], raw['prio_grp'])
+
+        outputs = {lgnum: df_hu for lgnum, _filename, _dashboard, _lines, df_hu in bflow_dept_outputs(scenario, joined, warehouses)}
+        assert sorted(outputs) == ['245', '266']
+        for lgnum, df_hu in outputs.items():
+            baseline = expected[lgnum].assign(VBELN=expected[lgnum]['VBELN'].astype('int64'), EXIDV=expected[lgnum]['EXIDV'].astype('int64'))
+            assert len(df_hu) == len(baseline) > 0
+            assert df_hu['IS_PICKED'].any() and (df_hu['GROUPED'] == 'OK').any()
+
+            ours = df_hu.assign(VBELN=df_hu['VBELN'].astype('int64'), EXIDV=df_hu['EXIDV'].astype('int64'), IS_PICKED=df_hu['IS_PICKED'].astype(bool))
+            baseline = baseline.assign(IS_PICKED=baseline['IS_PICKED'].astype(bool))
+            ours = ours.sort_values(['VBELN', 'EXIDV']).reset_index(drop=True)[['VBELN', 'EXIDV', *columns]]
+            baseline = baseline.sort_values(['VBELN', 'EXIDV']).reset_index(drop=True)[['VBELN', 'EXIDV', *columns]]
+            pd.testing.assert_frame_equal(ours, baseline, check_dtype=False)
@@ -0,0 +1,75 @@
+import os
+import json
+from datetime import datetime, timedelta
+
+from partitions import file_lock
+
+# Small users index at the output root, one file per warehouse shard: output/users_index_<prefix>.json
+# {"updated_at", "users": {LGNUM: {activity: {QNAME: {"first_seen", "last_seen", "daily": {date: total}}}}}}
+# Lets /api/users list and search the QNAMEs of a day without re-parsing the daily stats files.
+# Only the last RETENTION_DAYS days are kept; users without activity in them are dropped.
+
+RETENTION_DAYS = 31
+
+INDEX_MEASURES = {
+    'picking': 'LINES_PICKED',
+    'packing': 'BOXES_PACKED'
+}
+
+def get_index_path(output_dir, prefix):
+    return os.path.join(output_dir, f"users_index_{prefix}.json")
+
+def load_index(output_dir, prefix):
+    path = get_index_path(output_dir, prefix)
+    if not os.path.exists(path):
+        return {"users": {}}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # A corrupt index is rebuilt from the following runs
+        return {"users": {}}
+
+def update_index(daily_frames, date, output_dir, prefix):
+    # daily_frames: {(lgnum, activity): daily stats frame of `date`}; re-running a date replaces its totals.
+    # Runs for other dates may update the same index concurrently, so they take turns.
+    with file_lock(os.path.join(output_dir, 'locks', f"index-users-{prefix}.lock")):
+        return _update_index(daily_frames, date, output_dir, prefix)
+
+def _update_index(daily_frames, date, output_dir, prefix):
+    index = load_index(output_dir, prefix)
+    cutoff = (datetime.strptime(date, '%Y-%m-%d') - timedelta(days=RETENTION_DAYS - 1)).strftime('%Y-%m-%d')
+
+    for (lgnum, activity), df in daily_frames.items():
+        if df is None or df.empty:
+            continue
+
+        totals = df.groupby('QNAME')[INDEX_MEASURES[activity]].sum()
+        users = index["users"].setdefault(str(lgnum), {}).setdefault(activity, {})
+
+        for qname, entry in users.items():
+            if qname not in totals.index:
+                entry["daily"].pop(date, None)
+
+        for qname, total in totals.items():
+            entry = users.setdefault(str(qname), {"first_seen": date, "last_seen": date, "daily": {}})
+            entry["daily"][date] = int(total)
+
+        # Users without a day left in the retention window are dropped, so the index never only grows;
+        # first/last seen always describe the days kept
+        for qname, entry in list(users.items()):
+            entry["daily"] = {d: v for d, v in sorted(entry["daily"].items()) if d >= cutoff}
+            if entry["daily"]:
+                entry["first_seen"] = min(entry["daily"])
+                entry["last_seen"] = max(entry["daily"])
+            else:
+                del users[qname]
+
+    index["updated_at"] = datetime.now().isoformat(timespec='seconds')
+
+    path = get_index_path(output_dir, prefix)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, path)
+    return path
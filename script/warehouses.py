@@ -0,0 +1,46 @@
+from config.config import WAREHOUSES, FLOOR_MAPPING, REMOTE_PACKING_USER
+
+# Helpers around the warehouse registry in config/config.py, shared by process_data.py and fetch_user_stats.py
+
+def get_warehouses(selection=None):
+    # selection: iterable of LGNUMs; None selects every registered warehouse
+    lgnums = list(selection) if selection else list(WAREHOUSES)
+    unknown = [lgnum for lgnum in lgnums if lgnum not in WAREHOUSES]
+    if unknown:
+        raise ValueError(f"Unknown LGNUM: {', '.join(unknown)}")
+    return [dict(WAREHOUSES[lgnum], lgnum=lgnum) for lgnum in lgnums]
+
+def lgnum_list_sql(warehouses):
+    return ", ".join(f"'{wh['lgnum']}'" for wh in warehouses)
+
+def likp_condition_sql(warehouses):
+    # LGNUM restriction of the B-flow delivery queries, including each warehouse's shipping points
+    conditions = []
+    for wh in warehouses:
+        if wh['vstel']:
+            vstel_list = ", ".join(f"'{v}'" for v in wh['vstel'])
+            conditions.append(f"(LGNUM = '{wh['lgnum']}' AND VSTEL IN ({vstel_list}))")
+        else:
+            conditions.append(f"(LGNUM = '{wh['lgnum']}')")
+    return " OR ".join(conditions)
+
+def packing_action_sql(warehouse):
+    if warehouse['remote_packing']:
+        return f"(TCODE = 'ZORF_BOX_CLOSING' OR USERNAME = '{REMOTE_PACKING_USER}')"
+    return f"TCODE = 'ZORF_BOX_CLOSING' AND USERNAME != '{REMOTE_PACKING_USER}'"
+
+def filter_lines(df, warehouse, dashboard=False):
+    # Keeps the LTAP lines whose source bin belongs to the warehouse's picking area
+    vlpla = df['VLPLA'].fillna('').astype(str)
+    mask = vlpla.str.startswith(tuple(warehouse['vlpla_starts']))
+    if warehouse['vlpla_not_starts']:
+        mask &= ~vlpla.str.startswith(tuple(warehouse['vlpla_not_starts']))
+    if dashboard and warehouse['dashboard_exclude_vltyp']:
+        mask &= ~df['VLTYP'].fillna('').astype(str).isin(warehouse['dashboard_exclude_vltyp'])
+    return df[mask]
+
+def map_floor(vltyp, warehouse):
+    # vltyp: Series of storage types
+    if warehouse['floor']:
+        return vltyp.map(lambda _: warehouse['floor'])
+    return vltyp.fillna('').astype(str).map(FLOOR_MAPPING).fillna('unknown_floor')
@@ -1,6 +1,7 @@
 import { NextResponse } from 'next/server';
 import { getStore, saveStore } from '@/lib/store';
 import { scheduleJob, unscheduleJob } from '@/lib/cronManager';
+import { parseStages } from '@/lib/scriptRunner';
 import crypto from 'crypto';
 import parser from 'cron-parser';
 
@@ -23,6 +24,7 @@ export async function POST(request) {
     try {
         const body = await request.json();
         const { name, expression, isActive } = body;
+        const stages = parseStages(body.stages); // null runs every stage
 
         const store = getStore();
         const newJob = {
@@ -30,6 +32,7 @@ export async function POST(request) {
             name,
             expression,
             isActive: isActive !== false, // default true
+            stages,
             createdAt: new Date().toISOString(),
             lastRun: null
         };
@@ -38,7 +41,7 @@ export async function POST(request) {
         saveStore(store);
 
         if (newJob.isActive) {
-            scheduleJob(newJob.id, newJob.expression);
+            scheduleJob(newJob.id, newJob.expression, newJob.stages);
         }
 
         return NextResponse.json({ success: true, job: newJob });
@@ -60,7 +63,7 @@ export async function PUT(request) {
         saveStore(store);
 
         if (isActive) {
-            scheduleJob(id, store.cronJobs[jobIndex].expression);
+            scheduleJob(id, store.cronJobs[jobIndex].expression, store.cronJobs[jobIndex].stages || null);
         } else {
             unscheduleJob(id);
         }
@@ -0,0 +1,38 @@
+import { NextResponse } from 'next/server';
+import { runCubeRollup } from '@/lib/scriptRunner';
+import { DATE_PATTERN } from '@/lib/outputDir';
+
+// Historic trends: day/week/month/rolling rollups of the hourly picking and packing stats kept in the
+// productivity cube (script/cube.py), answered from local files without Snowflake
+export async function GET(request) {
+    const { searchParams } = new URL(request.url);
+    const activity = searchParams.get('activity') || 'picking'; // 'picking' or 'packing'
+    const period = searchParams.get('period') || 'week'; // 'day', 'week', 'month', 'rolling'
+    const days = Number(searchParams.get('days') || 7); // window of the rolling period
+    const lgnum = searchParams.get('lgnum'); // optional, all warehouses when omitted
+    const end = searchParams.get('end'); // optional last YYYY-MM-DD included, today when omitted
+    const byUser = ['1', 'true'].includes(searchParams.get('by_user'));
+
+    if (!['picking', 'packing'].includes(activity)) {
+        return NextResponse.json({ success: false, message: 'Invalid activity parameter' }, { status: 400 });
+    }
+
+    if (!['day', 'week', 'month', 'rolling'].includes(period)) {
+        return NextResponse.json({ success: false, message: 'Invalid period parameter' }, { status: 400 });
+    }
+
+    if (!Number.isInteger(days) || days <= 0) {
+        return NextResponse.json({ success: false, message: 'Invalid days parameter' }, { status: 400 });
+    }
+
+    if (lgnum && !/^\d+$/.test(lgnum)) {
+        return NextResponse.json({ success: false, message: 'Invalid lgnum parameter' }, { status: 400 });
+    }
+
+    if (end && !DATE_PATTERN.test(end)) {
+        return NextResponse.json({ success: false, message: 'Invalid end parameter' }, { status: 400 });
+    }
+
+    const result = await runCubeRollup({ activity, period, days, lgnum, end, byUser });
+    return NextResponse.json(result, { status: result.success ? 200 : 500 });
+}
@@ -2,11 +2,13 @@ import { NextResponse } from 'next/server';
 import fs from 'fs';
 import path from 'path';
 import Papa from 'papaparse';
+import { getOutputDir, DATE_PATTERN } from '@/lib/outputDir';
 
 export async function GET(request) {
     const { searchParams } = new URL(request.url);
     const type = searchParams.get('type'); // 'ms' or 'cvns'
     const activity = searchParams.get('activity') || 'picking'; // 'picking' or 'packing'
+    const date = searchParams.get('date'); // optional YYYY-MM-DD partition, the current one when omitted
 
     if (!type || !['ms', 'cvns'].includes(type)) {
         return NextResponse.json({ success: false, message: 'Invalid or missing type parameter' }, { status: 400 });
@@ -16,7 +18,11 @@ export async function GET(request) {
         return NextResponse.json({ success: false, message: 'Invalid activity parameter' }, { status: 400 });
     }
 
-    const scriptDir = path.join(process.cwd(), '..', 'script', 'output');
+    if (date && !DATE_PATTERN.test(date)) {
+        return NextResponse.json({ success: false, message: 'Invalid date parameter' }, { status: 400 });
+    }
+
+    const scriptDir = getOutputDir(date);
     const dailyFile = path.join(scriptDir, `${type}_${activity}_daily_stats.csv`);
     const hourlyFile = path.join(scriptDir, `${type}_${activity}_hourly_stats.csv`);
 
@@ -1,17 +1,25 @@
 import { NextResponse } from 'next/server';
 import fs from 'fs';
 import path from 'path';
+import { readDelta, getFileGeneration } from '@/lib/dashboardDelta';
+import { getOutputDir, DATE_PATTERN } from '@/lib/outputDir';
 
 export async function GET(request) {
     const { searchParams } = new URL(request.url);
     const type = searchParams.get('type'); // 'ms' or 'cvns'
+    const since = searchParams.get('since'); // generation the client already holds
     const scenario = searchParams.get('scenario') || 'today';
+    const date = searchParams.get('date'); // optional YYYY-MM-DD partition, the current one when omitted
 
     if (!type || !['ms', 'cvns'].includes(type)) {
         return NextResponse.json({ success: false, message: 'Invalid or missing type parameter' }, { status: 400 });
     }
 
-    const scriptDir = path.join(process.cwd(), '..', 'script', 'output');
+    if (date && !DATE_PATTERN.test(date)) {
+        return NextResponse.json({ success: false, message: 'Invalid date parameter' }, { status: 400 });
+    }
+
+    const scriptDir = getOutputDir(date);
 
     let suffix = '';
     if (scenario === 'backlog') suffix = '_backlog';
@@ -29,11 +37,17 @@ export async function GET(request) {
             });
         }
 
+        const delta = readDelta(scriptDir, filename, since);
+        if (delta) {
+            return NextResponse.json({ success: true, delta: true, ...delta });
+        }
+
         const rawData = fs.readFileSync(filePath, 'utf8');
         const jsonData = JSON.parse(rawData);
 
         return NextResponse.json({
             success: true,
+            generation: getFileGeneration(scriptDir, filename),
             data: jsonData
         });
 
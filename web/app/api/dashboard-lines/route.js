@@ -1,11 +1,33 @@
 import { NextResponse } from 'next/server';
 import fs from 'fs';
 import path from 'path';
+import { readDelta, getFileGeneration } from '@/lib/dashboardDelta';
+import { compareLines } from '@/lib/dashboardDeltaClient';
+import { getOutputDir, DATE_PATTERN } from '@/lib/outputDir';
+
+// Pre-format WAUHR to HH:MM:SS
+function formatLine(item) {
+    let wauhr = item.WAUHR;
+    if (wauhr) {
+        // If it's a timestamp (number or string-number)
+        if (!isNaN(wauhr) && String(wauhr).length > 10) {
+            const date = new Date(Number(wauhr));
+            wauhr = date.toTimeString().split(' ')[0];
+        }
+        // If it's a full date string "YYYY-MM-DD HH:MM:SS"
+        else if (typeof wauhr === 'string' && wauhr.includes(' ')) {
+            wauhr = wauhr.split(' ')[1];
+        }
+    }
+    return { ...item, WAUHR: wauhr || "" };
+}
 
 export async function GET(request) {
     const { searchParams } = new URL(request.url);
     const type = searchParams.get('type'); // 'ms' or 'cvns'
+    const since = searchParams.get('since'); // generation the client already holds
     const scenario = searchParams.get('scenario') || 'today'; // 'today', 'backlog', 'future'
+    const date = searchParams.get('date'); // optional YYYY-MM-DD partition, the current one when omitted
 
     if (!type || !['ms', 'cvns'].includes(type)) {
         return NextResponse.json({ success: false, message: 'Invalid or missing type parameter' }, { status: 400 });
@@ -15,7 +37,11 @@ export async function GET(request) {
         return NextResponse.json({ success: false, message: 'Invalid scenario parameter' }, { status: 400 });
     }
 
-    const scriptDir = path.join(process.cwd(), '..', 'script', 'output');
+    if (date && !DATE_PATTERN.test(date)) {
+        return NextResponse.json({ success: false, message: 'Invalid date parameter' }, { status: 400 });
+    }
+
+    const scriptDir = getOutputDir(date);
 
     let suffix = '';
     if (scenario === 'backlog') suffix = '_backlog';
@@ -33,43 +59,27 @@ export async function GET(request) {
             });
         }
 
+        const delta = readDelta(scriptDir, filename, since);
+        if (delta) {
+            // Delta rows get the same WAUHR formatting as the full list; clients re-sort after applying
+            if (!delta.unchanged) {
+                delta.added = delta.added.map(formatLine);
+                delta.changed = delta.changed.map(formatLine);
+            }
+            return NextResponse.json({ success: true, delta: true, ...delta });
+        }
+
         const rawData = fs.readFileSync(filePath, 'utf8');
         let jsonData = JSON.parse(rawData);
 
-        // Pre-format WAUHR to HH:MM:SS
-        jsonData = jsonData.map(item => {
-            let wauhr = item.WAUHR;
-            if (wauhr) {
-                // If it's a timestamp (number or string-number)
-                if (!isNaN(wauhr) && String(wauhr).length > 10) {
-                    const date = new Date(Number(wauhr));
-                    wauhr = date.toTimeString().split(' ')[0];
-                }
-                // If it's a full date string "YYYY-MM-DD HH:MM:SS"
-                else if (typeof wauhr === 'string' && wauhr.includes(' ')) {
-                    wauhr = wauhr.split(' ')[1];
-                }
-            }
-            return { ...item, WAUHR: wauhr || "" };
-        });
+        jsonData = jsonData.map(formatLine);
 
         // Sort by priority then cutoff
-        jsonData.sort((a, b) => {
-            const pA = parseInt(a.LPRIO) || 99;
-            const pB = parseInt(b.LPRIO) || 99;
-            if (pA !== pB) return pA - pB;
-
-            const wA = a.WAUHR === null || a.WAUHR === undefined ? "" : a.WAUHR;
-            const wB = b.WAUHR === null || b.WAUHR === undefined ? "" : b.WAUHR;
-
-            if (typeof wA === 'number' && typeof wB === 'number') {
-                return wA - wB;
-            }
-            return String(wA).localeCompare(String(wB));
-        });
+        jsonData.sort(compareLines);
 
         return NextResponse.json({
             success: true,
+            generation: getFileGeneration(scriptDir, filename),
             data: jsonData
         });
 
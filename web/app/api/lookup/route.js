@@ -0,0 +1,110 @@
+import { NextResponse } from 'next/server';
+import fs from 'fs';
+import path from 'path';
+import { getOutputDir, DATE_PATTERN } from '@/lib/outputDir';
+
+// Point lookups of deliveries, HUs and pickers across every B-flow line/HU export, served from the
+// index process_data.py writes at the end of each run (script/lookup_index.py): only the index and
+// the matching records are read, never the full exports.
+
+const LOOKUP_KEYS = ['VBELN', 'EXIDV', 'ZEXIDVGRP', 'PICKINIUSER'];
+
+// Index format of lookup_index.py (INDEX_VERSION); older indexes hold values in another form
+const INDEX_VERSION = 2;
+
+// Document numbers are matched without their leading zeros, so '0080000005' finds delivery 80000005
+// and an HU is found with or without the padding SAP stores it with
+const NUMBER_KEYS = ['VBELN', 'EXIDV', 'ZEXIDVGRP'];
+
+// Same rule as normalize_value in script/lookup_index.py
+function normalizeValue(key, value) {
+    const normalized = value.trim().toUpperCase();
+    if (NUMBER_KEYS.includes(key) && /^\d+$/.test(normalized)) {
+        return normalized.replace(/^0+/, '') || '0';
+    }
+    return normalized;
+}
+
+// Parsed index, reused until process_data.py replaces the file
+let cachedIndex = { path: null, mtimeMs: null, index: null };
+
+function readIndex(outputDir) {
+    const indexPath = path.join(outputDir, 'lookup_index.json');
+    if (!fs.existsSync(indexPath)) return null;
+    const { mtimeMs } = fs.statSync(indexPath);
+    if (cachedIndex.path !== indexPath || cachedIndex.mtimeMs !== mtimeMs) {
+        cachedIndex = { path: indexPath, mtimeMs, index: JSON.parse(fs.readFileSync(indexPath, 'utf8')) };
+    }
+    return cachedIndex.index;
+}
+
+function readRecords(filePath, entry, rows) {
+    // null when the export was rewritten after the index was built; its rows no longer match
+    const stat = fs.statSync(filePath, { bigint: true });
+    if (Number(stat.size) !== entry.size || String(stat.mtimeNs) !== entry.mtime_ns) return null;
+
+    const fd = fs.openSync(filePath, 'r');
+    try {
+        return rows.map(row => {
+            const buffer = Buffer.alloc(entry.lengths[row]);
+            fs.readSync(fd, buffer, 0, buffer.length, entry.offsets[row]);
+            return { row, record: JSON.parse(buffer.toString('latin1')) };
+        });
+    } finally {
+        fs.closeSync(fd);
+    }
+}
+
+export async function GET(request) {
+    const { searchParams } = new URL(request.url);
+    const key = (searchParams.get('key') || '').toUpperCase();
+    const value = normalizeValue(key, searchParams.get('value') || '');
+    const type = searchParams.get('type'); // optional: 'ms' or 'cvns'
+    const scenario = searchParams.get('scenario'); // optional: 'today', 'backlog' or 'future'
+    const date = searchParams.get('date'); // optional YYYY-MM-DD partition, the current one when omitted
+
+    if (!LOOKUP_KEYS.includes(key)) {
+        return NextResponse.json({ success: false, message: `Invalid key, expected one of ${LOOKUP_KEYS.join(', ')}` }, { status: 400 });
+    }
+    if (!value) {
+        return NextResponse.json({ success: false, message: 'Missing value parameter' }, { status: 400 });
+    }
+
+    if (date && !DATE_PATTERN.test(date)) {
+        return NextResponse.json({ success: false, message: 'Invalid date parameter' }, { status: 400 });
+    }
+
+    const outputDir = getOutputDir(date);
+
+    try {
+        const index = readIndex(outputDir);
+        if (!index) {
+            return NextResponse.json({ success: false, message: 'Lookup index not found: run process_data.py first', matches: [] });
+        }
+        if (index.version !== INDEX_VERSION) {
+            return NextResponse.json({ success: false, message: 'Lookup index is outdated: run process_data.py to rebuild it', matches: [] });
+        }
+
+        const matches = [];
+        const stale = [];
+        Object.entries(index.files || {}).forEach(([filename, entry]) => {
+            if ((type && entry.type !== type) || (scenario && entry.scenario !== scenario)) return;
+            const rows = (entry.keys[key] || {})[value];
+            const filePath = path.join(outputDir, filename);
+            if (!rows || !fs.existsSync(filePath)) return;
+
+            const records = readRecords(filePath, entry, rows);
+            if (!records) {
+                stale.push(filename);
+                return;
+            }
+            records.forEach(({ row, record }) => {
+                matches.push({ file: filename, lgnum: entry.lgnum, type: entry.type, scenario: entry.scenario, kind: entry.kind, row, record });
+            });
+        });
+
+        return NextResponse.json({ success: true, key, value, updatedAt: index.updated_at, matches, stale });
+    } catch (error) {
+        return NextResponse.json({ success: false, message: `Error reading lookup index: ${error.message}` }, { status: 500 });
+    }
+}
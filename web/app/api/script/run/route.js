@@ -1,21 +1,36 @@
 import { NextResponse } from 'next/server';
-import { runPythonScript, getIsRunning } from '@/lib/scriptRunner';
+import { runPythonScript, getIsRunning, getRunningStages, getRunningPartitions, parseStages } from '@/lib/scriptRunner';
 
 export async function POST(request) {
-    if (getIsRunning()) {
-        return NextResponse.json(
-            { success: false, message: 'Script is currently executing. Wait for it to finish.' },
-            { status: 409 }
-        );
-    }
-
     try {
         const body = await request.json().catch(() => ({}));
         const date = body.date || null; // YYYY-MM-DD
+        const resume = body.resume || null; // run id of a previous run to resume
+
+        if (resume && !/^[0-9T-]+-[0-9a-f]+$/.test(resume)) {
+            return NextResponse.json({ success: false, message: 'Invalid run id' }, { status: 400 });
+        }
+
+        let stages; // e.g. ['today'] or 'today,picking'; all stages when omitted
+        try {
+            stages = parseStages(body.stages);
+        } catch (e) {
+            return NextResponse.json({ success: false, message: e.message }, { status: 400 });
+        }
 
         // Do not await here if you want it completely async. 
         // But since it might take just a few seconds, let's await so the client gets the result immediately.
-        const result = await runPythonScript(date);
+        const result = await runPythonScript(date, { resume, stages });
+
+        // Blocked while another run holds one of the requested stages of the same date
+        if (result.status === 'blocked') {
+            return NextResponse.json({ ...result, message: `${result.message} Wait for it to finish.` }, { status: 409 });
+        }
+
+        // Only B-flow stages requested for another date than today
+        if (result.status === 'invalid') {
+            return NextResponse.json(result, { status: 400 });
+        }
 
         return NextResponse.json(result);
     } catch (error) {
@@ -24,5 +39,5 @@ export async function POST(request) {
 }
 
 export async function GET() {
-    return NextResponse.json({ isRunning: getIsRunning() });
+    return NextResponse.json({ isRunning: getIsRunning(), runningStages: getRunningStages(), runningPartitions: getRunningPartitions() });
 }
@@ -1,6 +1,6 @@
 import { NextResponse } from 'next/server';
 import { getStore, resetStats } from '@/lib/store';
-import { getIsRunning } from '@/lib/scriptRunner';
+import { getIsRunning, getRunningStages, getRunningPartitions, getLatestGenerations } from '@/lib/scriptRunner';
 import { ensureCronInitialized } from '@/lib/cronManager';
 
 export async function GET() {
@@ -36,7 +36,10 @@ export async function GET() {
         avgDurationSec: (avgDurationMs / 1000).toFixed(1),
         lastRun: store.runs.length > 0 ? store.runs[0] : null,
         runs: store.runs,
-        isRunning: getIsRunning()
+        isRunning: getIsRunning(),
+        runningStages: getRunningStages(),
+        runningPartitions: getRunningPartitions(),
+        latestFiles: getLatestGenerations()
     });
 }
 
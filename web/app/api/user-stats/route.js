@@ -1,5 +1,5 @@
 import { NextResponse } from 'next/server';
-import { runUserStatsScript } from '@/lib/scriptRunner';
+import { getUserStats, getUserStatsCacheStats } from '@/lib/userStatsCache';
 
 export async function POST(request) {
     try {
@@ -13,8 +13,8 @@ export async function POST(request) {
             );
         }
 
-        const result = await runUserStatsScript(qname, lgnum, activity || 'picking');
-        return NextResponse.json(result);
+        const { result, cacheStatus } = await getUserStats(qname, lgnum, activity || 'picking');
+        return NextResponse.json(result, { headers: { 'X-Cache': cacheStatus } });
     } catch (error) {
         console.error('API Error:', error);
         return NextResponse.json(
@@ -23,3 +23,8 @@ export async function POST(request) {
         );
     }
 }
+
+// Cache hit/miss counters for monitoring
+export async function GET() {
+    return NextResponse.json(getUserStatsCacheStats());
+}
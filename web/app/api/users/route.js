@@ -3,31 +3,73 @@ import fs from 'fs';
 import path from 'path';
 import Papa from 'papaparse';
 import { getStore, saveStore } from '@/lib/store';
+import { getOutputDir, getOutputRoot, getCurrentDate, DATE_PATTERN } from '@/lib/outputDir';
 
-export async function GET() {
-    const store = getStore();
-    const scriptDir = path.join(process.cwd(), '..', 'script', 'output');
+// Stats CSVs of every warehouse shard in the partition: <prefix>_<activity>_daily_stats.csv, the prefixes
+// being those of the warehouse registry (script/config/config.py)
+const DAILY_STATS_PATTERN = /^(.+)_(picking|packing)_daily_stats\.csv$/;
+
+// Users active on `date` (every indexed user when null). Prefer the users index written by process_data.py;
+// the partition's stats CSVs are only parsed when it is missing.
+function readAvailableUsers(outputRoot, scriptDir, date) {
     const usersSet = new Set();
 
-    // Read unique users from both files
-    // Read unique users from picking and packing daily files
-    ['ms', 'cvns'].forEach(type => {
-        ['picking', 'packing'].forEach(activity => {
-            const file = path.join(scriptDir, `${type}_${activity}_daily_stats.csv`);
-            if (fs.existsSync(file)) {
-                const csv = fs.readFileSync(file, 'utf8');
-                const parsed = Papa.parse(csv, { header: true, skipEmptyLines: true });
-                parsed.data.forEach(row => {
-                    if (row.QNAME) usersSet.add(row.QNAME);
+    // One index per warehouse shard, spanning the last days: users_index_<prefix>.json
+    const indexFiles = fs.existsSync(outputRoot)
+        ? fs.readdirSync(outputRoot).filter(name => /^users_index_.+\.json$/.test(name))
+        : [];
+    if (indexFiles.length > 0) {
+        try {
+            indexFiles.forEach(name => {
+                const index = JSON.parse(fs.readFileSync(path.join(outputRoot, name), 'utf8'));
+                Object.values(index.users || {}).forEach(activities => {
+                    Object.values(activities).forEach(users => {
+                        Object.entries(users).forEach(([qname, entry]) => {
+                            if (!date || (entry.daily && date in entry.daily)) usersSet.add(qname);
+                        });
+                    });
                 });
-            }
+            });
+            return usersSet;
+        } catch (e) {
+            console.error('Failed to read users index, falling back to stats files:', e.message);
+            usersSet.clear();
+        }
+    }
+
+    // Read unique users from the picking and packing daily files of every warehouse
+    const statsFiles = fs.existsSync(scriptDir)
+        ? fs.readdirSync(scriptDir).filter(name => DAILY_STATS_PATTERN.test(name))
+        : [];
+    statsFiles.forEach(name => {
+        const csv = fs.readFileSync(path.join(scriptDir, name), 'utf8');
+        const parsed = Papa.parse(csv, { header: true, skipEmptyLines: true });
+        parsed.data.forEach(row => {
+            if (row.QNAME) usersSet.add(row.QNAME);
         });
     });
+    return usersSet;
+}
+
+export async function GET(request) {
+    const store = getStore();
+    const { searchParams } = new URL(request.url);
+    const search = (searchParams.get('q') || '').trim().toUpperCase();
+    const dateParam = searchParams.get('date'); // optional YYYY-MM-DD, the current partition's date when omitted
+
+    if (dateParam && !DATE_PATTERN.test(dateParam)) {
+        return NextResponse.json({ success: false, message: 'Invalid date parameter' }, { status: 400 });
+    }
+
+    // The day's users, as the stats files of a run list them
+    const date = dateParam || getCurrentDate();
+    let availableUsers = Array.from(readAvailableUsers(getOutputRoot(), getOutputDir(date), date)).sort();
+    if (search) availableUsers = availableUsers.filter(qname => qname.toUpperCase().includes(search));
 
     return NextResponse.json({
         userMappings: store.userMappings || {},
         blacklist: store.blacklist || [],
-        availableUsers: Array.from(usersSet).sort()
+        availableUsers
     });
 }
 
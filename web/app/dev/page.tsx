@@ -19,6 +19,8 @@ import { Calendar } from "@/components/ui/calendar";
 
 const SESSION_KEY = "dev_session_expires";
 const SESSION_DURATION_MS = 60 * 60 * 1000; // 60 minutes
+// process_data.py --stages, so hot scenarios can be scheduled more often than cold ones
+const RUN_STAGES = ["today", "backlog", "future", "picking", "packing"];
 
 export default function DevDashboard() {
     const [authenticated, setAuthenticated] = useState(false);
@@ -40,7 +42,7 @@ export default function DevDashboard() {
 
     const [dateParam, setDateParam] = useState<Date>();
     const [isCalendarOpen, setIsCalendarOpen] = useState(false);
-    const [isExecuting, setIsExecuting] = useState(false);
+    const [executingDates, setExecutingDates] = useState<string[]>([]);
     const [version, setVersion] = useState("V1.0.0");
 
     // User management state
@@ -57,6 +59,7 @@ export default function DevDashboard() {
     // New Cron Form State
     const [newCronName, setNewCronName] = useState("");
     const [newCronExpression, setNewCronExpression] = useState("* * * * *");
+    const [newCronStages, setNewCronStages] = useState<string[]>(RUN_STAGES);
     const [cronDialogOpen, setCronDialogOpen] = useState(false);
     const [resetDialogOpen, setResetDialogOpen] = useState(false);
 
@@ -136,20 +139,28 @@ export default function DevDashboard() {
         setIsAuthenticating(false);
     };
 
+    // A manual run processes every stage of its date, so it only waits for runs of that same date;
+    // runs of other dates write to their own partitions
+    const runDate = format(dateParam || new Date(), "yyyy-MM-dd");
+    const runDateStages: string[] = stats?.runningPartitions?.[runDate] || [];
+    const isRunDateBusy = runDateStages.length > 0 || executingDates.includes(runDate);
+    const isAnyRunning = stats?.isRunning || executingDates.length > 0;
+
     const handleRunScript = async () => {
-        if (stats?.isRunning || isExecuting) {
-            toast.error("Script is already running");
+        if (isRunDateBusy) {
+            toast.error(`A run of ${runDate} is already processing ${runDateStages.join(", ") || "its stages"}`);
             return;
         }
 
-        setIsExecuting(true);
+        const date = runDate;
+        setExecutingDates(dates => [...dates, date]);
         toast.info("Script execution started. Note: Browser may pop up for authentication.", {
             duration: 8000,
             style: { background: "#18181b", borderColor: "#3b82f6", color: "#f4f4f5" }
         });
 
         try {
-            const payload = dateParam ? { date: format(dateParam, "yyyy-MM-dd") } : {};
+            const payload = dateParam ? { date } : {};
 
             const res = await fetch("/api/script/run", {
                 method: "POST",
@@ -167,7 +178,7 @@ export default function DevDashboard() {
         } catch (error: any) {
             toast.error(`Error: ${error.message}`);
         } finally {
-            setIsExecuting(false);
+            setExecutingDates(dates => dates.filter(d => d !== date));
         }
     };
 
@@ -196,12 +207,13 @@ export default function DevDashboard() {
             const res = await fetch("/api/cron", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ name: newCronName, expression: newCronExpression })
+                body: JSON.stringify({ name: newCronName, expression: newCronExpression, stages: newCronStages })
             });
             if (res.ok) {
                 setCronDialogOpen(false);
                 setNewCronName("");
                 setNewCronExpression("* * * * *");
+                setNewCronStages(RUN_STAGES);
                 fetchCron();
                 toast.success("Cron job created successfully");
             } else {
@@ -491,10 +503,10 @@ export default function DevDashboard() {
                         <div className="flex items-center gap-3 bg-zinc-900/30 px-3 py-2 rounded-xl border border-zinc-800/50">
                             <div className={cn(
                                 "w-2 h-2 rounded-full",
-                                stats?.isRunning || isExecuting ? "bg-amber-400 animate-pulse" : "bg-emerald-400"
+                                isAnyRunning ? "bg-amber-400 animate-pulse" : "bg-emerald-400"
                             )} />
                             <span className="text-sm font-semibold text-zinc-300">
-                                {stats?.isRunning || isExecuting ? 'Script Executing...' : 'System Idle'}
+                                {isAnyRunning ? 'Script Executing...' : 'System Idle'}
                             </span>
                         </div>
                     </div>
@@ -686,10 +698,10 @@ export default function DevDashboard() {
                                 <Button
                                     onClick={handleRunScript}
                                     className="w-full bg-blue-600 hover:bg-blue-500 text-white font-medium flex gap-2 h-10 transition-colors"
-                                    disabled={stats?.isRunning || isExecuting}
+                                    disabled={isRunDateBusy}
                                 >
-                                    {stats?.isRunning || isExecuting ? (
-                                        <><Clock className="h-4 w-4 animate-spin" /> Processing...</>
+                                    {isRunDateBusy ? (
+                                        <><Clock className="h-4 w-4 animate-spin" /> Processing {runDate}...</>
                                     ) : (
                                         <><Play className="h-4 w-4 fill-current" /> Run Script Now</>
                                     )}
@@ -735,7 +747,28 @@ export default function DevDashboard() {
                                                 />
                                                 <p className="text-[11px] font-medium text-zinc-500">Minute Hour Day Month DayOfWeek</p>
                                             </div>
-                                            <Button onClick={handleCreateCron} className="w-full bg-zinc-100 text-zinc-900 hover:bg-white font-medium">Create Schedule</Button>
+                                            <div className="space-y-2">
+                                                <Label className="text-zinc-300">Stages</Label>
+                                                <div className="flex flex-wrap gap-2">
+                                                    {RUN_STAGES.map(stage => {
+                                                        const selected = newCronStages.includes(stage);
+                                                        return (
+                                                            <Button
+                                                                key={stage}
+                                                                type="button"
+                                                                size="sm"
+                                                                variant="outline"
+                                                                onClick={() => setNewCronStages(selected ? newCronStages.filter(s => s !== stage) : RUN_STAGES.filter(s => s === stage || newCronStages.includes(s)))}
+                                                                className={cn("h-7 px-2.5 text-xs border-zinc-800", selected ? "bg-zinc-100 text-zinc-900 hover:bg-white" : "bg-zinc-900/50 text-zinc-500 hover:bg-zinc-800")}
+                                                            >
+                                                                {stage}
+                                                            </Button>
+                                                        );
+                                                    })}
+                                                </div>
+                                                <p className="text-[11px] font-medium text-zinc-500">Only the selected outputs are refreshed; the others are left untouched.</p>
+                                            </div>
+                                            <Button onClick={handleCreateCron} disabled={newCronStages.length === 0} className="w-full bg-zinc-100 text-zinc-900 hover:bg-white font-medium">Create Schedule</Button>
                                         </div>
                                     </DialogContent>
                                 </Dialog>
@@ -753,6 +786,7 @@ export default function DevDashboard() {
                                                     <div className="font-medium text-sm text-zinc-200">{job.name}</div>
                                                     <div className="flex items-center gap-3 flex-wrap">
                                                         <div className="text-[10px] text-zinc-500 font-mono bg-zinc-950/40 px-1.5 py-0.5 rounded border border-zinc-800/50 w-fit">{job.expression}</div>
+                                                        <div className="text-[10px] text-zinc-500">{job.stages ? job.stages.join(", ") : "all stages"}</div>
                                                         <div className="flex items-center gap-3">
                                                             <div className="flex items-center gap-1 text-[10px] text-zinc-500">
                                                                 <History className="w-3 h-3" />
@@ -1,6 +1,6 @@
 "use client";
 
-import { useState, useEffect, useMemo } from "react";
+import { useState, useEffect, useMemo, useRef } from "react";
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from "@/components/ui/card";
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@/components/ui/table";
 import { motion, AnimatePresence } from "framer-motion";
@@ -18,6 +18,8 @@ import {
     ResponsiveContainer, BarChart, Bar, XAxis, YAxis,
     CartesianGrid, Tooltip as RechartsTooltip, Cell, ComposedChart, Line
 } from "recharts";
+import PartitionDatePicker, { partitionDate } from "@/components/PartitionDatePicker";
+import { fetchDashboardExport, compareLines } from "@/lib/dashboardDeltaClient";
 
 interface MetricSet {
     lines: number;
@@ -91,15 +93,17 @@ export default function BFlowDashboard({ title, type }: { title: string, type: '
     const [linesLoading, setLinesLoading] = useState(false);
     const [huLoading, setHULoading] = useState(false);
     const [lastRefreshed, setLastRefreshed] = useState("");
+    const [viewDate, setViewDate] = useState<Date>(); // day shown, the current partition when unset
     const [pickingActivity, setPickingActivity] = useState({ daily: [], hourly: [] });
     const [packingActivity, setPackingActivity] = useState({ daily: [], hourly: [] });
     const [blacklist, setBlacklist] = useState<string[]>([]);
+    // Last generation and content of each export fetched, so refreshes only download its delta
+    const exportCache = useRef(new Map<string, any>());
 
     const fetchDetailedLines = async () => {
         try {
             setLinesLoading(true);
-            const res = await fetch(`/api/dashboard-lines?type=${type}&scenario=${scenario}`);
-            const result = await res.json();
+            const result = await fetchDashboardExport(`/api/dashboard-lines?type=${type}&scenario=${scenario}&date=${partitionDate(viewDate)}`, exportCache.current, compareLines);
             if (result.success) {
                 setDetailedLines(result.data);
             }
@@ -113,8 +117,7 @@ export default function BFlowDashboard({ title, type }: { title: string, type: '
     const fetchDetailedHU = async () => {
         try {
             setHULoading(true);
-            const res = await fetch(`/api/dashboard-hu?type=${type}&scenario=${scenario}`);
-            const result = await res.json();
+            const result = await fetchDashboardExport(`/api/dashboard-hu?type=${type}&scenario=${scenario}&date=${partitionDate(viewDate)}`, exportCache.current);
             if (result.success) {
                 setDetailedHU(result.data);
             }
@@ -321,15 +324,14 @@ export default function BFlowDashboard({ title, type }: { title: string, type: '
     const fetchData = async () => {
         try {
             setLoading(true);
-            const [bflowRes, pickingRes, packingRes, usersRes] = await Promise.all([
-                fetch(`/api/dashboard-bflow?type=${type}&scenario=${scenario}`),
-                fetch(`/api/dashboard-data?type=${type}&activity=picking`),
-                fetch(`/api/dashboard-data?type=${type}&activity=packing`),
-                fetch(`/api/users`)
+            const [bflowResult, pickingRes, packingRes, usersRes] = await Promise.all([
+                fetchDashboardExport(`/api/dashboard-bflow?type=${type}&scenario=${scenario}&date=${partitionDate(viewDate)}`, exportCache.current),
+                fetch(`/api/dashboard-data?type=${type}&activity=picking&date=${partitionDate(viewDate)}`),
+                fetch(`/api/dashboard-data?type=${type}&activity=packing&date=${partitionDate(viewDate)}`),
+                fetch(`/api/users?date=${partitionDate(viewDate)}`)
             ]);
 
-            const [bflowResult, pickingResult, packingResult, usersResult] = await Promise.all([
-                bflowRes.json(),
+            const [pickingResult, packingResult, usersResult] = await Promise.all([
                 pickingRes.json(),
                 packingRes.json(),
                 usersRes.json()
@@ -374,7 +376,7 @@ export default function BFlowDashboard({ title, type }: { title: string, type: '
             clearTimeout(timeout);
             if (interval) clearInterval(interval);
         };
-    }, [type, scenario]);
+    }, [type, scenario, viewDate]);
 
     const COLORS = ['#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#ec4899'];
 
@@ -1015,6 +1017,8 @@ export default function BFlowDashboard({ title, type }: { title: string, type: '
                     </div>
 
                     <div className="flex flex-col sm:flex-row gap-4 items-end">
+                        <PartitionDatePicker date={viewDate} onChange={setViewDate} />
+
                         {/* Flow Switcher */}
                         <div className="flex p-1 bg-zinc-950/50 rounded-xl border border-zinc-800 h-11">
                             {['A-flow', 'B-flow'].map((flow) => (
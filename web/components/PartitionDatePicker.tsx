@@ -0,0 +1,67 @@
+"use client";
+
+import { useState } from "react";
+import { format } from "date-fns";
+import { Calendar as CalendarIcon, ChevronDown, X } from "lucide-react";
+import { cn } from "@/lib/utils";
+import { Button } from "@/components/ui/button";
+import { Popover, PopoverContent, PopoverTrigger } from "@/components/ui/popover";
+import { Calendar } from "@/components/ui/calendar";
+
+// `date` parameter of the dashboard routes, which read the date partition of that day
+// (script/partitions.py); empty for the current partition
+export function partitionDate(date?: Date) {
+    return date ? format(date, "yyyy-MM-dd") : "";
+}
+
+// Day whose outputs a monitor shows; cleared, it follows the current partition
+export default function PartitionDatePicker({ date, onChange }: { date?: Date, onChange: (date?: Date) => void }) {
+    const [isOpen, setIsOpen] = useState(false);
+
+    return (
+        <Popover open={isOpen} onOpenChange={setIsOpen}>
+            <PopoverTrigger asChild>
+                <Button variant="outline" className="justify-between font-medium border-zinc-800 bg-zinc-950/50 hover:bg-zinc-800 hover:text-zinc-200 text-zinc-300 h-11 px-3 transition-all">
+                    <div className="flex items-center min-w-0">
+                        <CalendarIcon className="mr-2 h-4 w-4 text-zinc-500 shrink-0" />
+                        <span className="truncate">
+                            {date ? format(date, "PPP") : <span className="text-zinc-500">Today</span>}
+                        </span>
+                    </div>
+                    <div className="flex items-center gap-2 shrink-0 ml-2">
+                        {date && (
+                            <div
+                                role="button"
+                                onClick={(e) => {
+                                    e.preventDefault();
+                                    e.stopPropagation();
+                                    onChange(undefined);
+                                }}
+                                className="p-1 hover:bg-zinc-700/50 rounded-md transition-colors group/clear"
+                            >
+                                <X className="h-3.5 w-3.5 text-zinc-500 group-hover/clear:text-zinc-300" />
+                            </div>
+                        )}
+                        <ChevronDown className={cn(
+                            "h-4 w-4 text-zinc-500 transition-transform duration-200",
+                            isOpen && "rotate-180"
+                        )} />
+                    </div>
+                </Button>
+            </PopoverTrigger>
+            <PopoverContent className="w-auto p-0 bg-zinc-950 border-zinc-800 shadow-2xl" align="end">
+                <Calendar
+                    mode="single"
+                    selected={date}
+                    onSelect={(selected) => {
+                        onChange(selected);
+                        setIsOpen(false);
+                    }}
+                    disabled={{ after: new Date() }}
+                    initialFocus
+                    className="bg-zinc-950 text-zinc-200"
+                />
+            </PopoverContent>
+        </Popover>
+    );
+}
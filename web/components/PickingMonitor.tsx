@@ -13,6 +13,7 @@ import { motion, AnimatePresence } from "framer-motion";
 import { cn } from "@/lib/utils";
 import { ArrowRight, Box, Layers, Users, Zap, Search, ClipboardList, Timer, Divide, Trophy, User, Activity, Clock, Circle, HelpCircle, Download, ChevronDown, ChevronRight } from "lucide-react";
 import { Fragment } from "react";
+import PartitionDatePicker, { partitionDate } from "@/components/PartitionDatePicker";
 
 // Explanation Section Component
 const MetricsLegend = () => (
@@ -94,15 +95,16 @@ export default function PickingMonitor({ title, type }: { title: any, type: any
     const [selectedFloors, setSelectedFloors] = useState<string[]>([]);
     const [searchQuery, setSearchQuery] = useState("");
     const [lastRefreshed, setLastRefreshed] = useState("");
+    const [viewDate, setViewDate] = useState<Date>(); // day shown, the current partition when unset
     const [sortConfig, setSortConfig] = useState<{ key: string, direction: 'asc' | 'desc' } | null>({ key: 'LINES_PICKED', direction: 'desc' });
     const [selectedUser, setSelectedUser] = useState<string | null>(null); // format: "QNAME__FLOOR"
 
     const fetchData = async () => {
         try {
             const [res, threshRes, userRes] = await Promise.all([
-                fetch(`/api/dashboard-data?type=${type}`),
+                fetch(`/api/dashboard-data?type=${type}&date=${partitionDate(viewDate)}`),
                 fetch(`/api/thresholds`),
-                fetch(`/api/users`)
+                fetch(`/api/users?date=${partitionDate(viewDate)}`)
             ]);
             const result = await res.json();
             const threshData = await threshRes.json();
@@ -150,7 +152,7 @@ export default function PickingMonitor({ title, type }: { title: any, type: any
             clearTimeout(timeout);
             if (interval) clearInterval(interval);
         };
-    }, [type]);
+    }, [type, viewDate]);
 
     const handleFloorToggle = (floor: string) => {
         setSelectedFloors(prev =>
@@ -482,26 +484,29 @@ export default function PickingMonitor({ title, type }: { title: any, type: any
                         </p>
                     </div>
 
-                    <div className="flex p-1 bg-zinc-950/50 rounded-xl border border-zinc-800 h-11">
-                        {['A-flow', 'B-flow'].map((flow) => (
-                            <button
-                                key={flow}
-                                onClick={() => setActiveFlow(flow)}
-                                className={cn(
-                                    "relative px-4 py-1.5 text-sm font-medium rounded-md transition-all duration-200 ease-out outline-none",
-                                    activeFlow === flow ? "text-white" : "text-zinc-400 hover:text-zinc-200"
-                                )}
-                            >
-                                {activeFlow === flow && (
-                                    <motion.div
-                                        layoutId="activeFlow"
-                                        className="absolute inset-0 bg-blue-600 rounded-lg shadow-lg"
-                                        transition={{ type: "spring", stiffness: 400, damping: 30 }}
-                                    />
-                                )}
-                                <span className="relative z-10">{flow.replace('-', ' ')}</span>
-                            </button>
-                        ))}
+                    <div className="flex items-center gap-3">
+                        <PartitionDatePicker date={viewDate} onChange={setViewDate} />
+                        <div className="flex p-1 bg-zinc-950/50 rounded-xl border border-zinc-800 h-11">
+                            {['A-flow', 'B-flow'].map((flow) => (
+                                <button
+                                    key={flow}
+                                    onClick={() => setActiveFlow(flow)}
+                                    className={cn(
+                                        "relative px-4 py-1.5 text-sm font-medium rounded-md transition-all duration-200 ease-out outline-none",
+                                        activeFlow === flow ? "text-white" : "text-zinc-400 hover:text-zinc-200"
+                                    )}
+                                >
+                                    {activeFlow === flow && (
+                                        <motion.div
+                                            layoutId="activeFlow"
+                                            className="absolute inset-0 bg-blue-600 rounded-lg shadow-lg"
+                                            transition={{ type: "spring", stiffness: 400, damping: 30 }}
+                                        />
+                                    )}
+                                    <span className="relative z-10">{flow.replace('-', ' ')}</span>
+                                </button>
+                            ))}
+                        </div>
                     </div>
                 </header>
 
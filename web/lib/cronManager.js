@@ -20,7 +20,8 @@ export function ensureCronInitialized() {
 }
 
 
-export function scheduleJob(id, expression) {
+// stages: subset of the process_data.py stages this job refreshes, null for all
+export function scheduleJob(id, expression, stages = null) {
     if (activeCronJobs.has(id)) {
         activeCronJobs.get(id).stop();
         activeCronJobs.delete(id);
@@ -34,7 +35,7 @@ export function scheduleJob(id, expression) {
     const task = cron.schedule(expression, async () => {
         console.log(`Running scheduled job: ${id}`);
         // Pass 'cron' as a flag to indicate this is an automated run
-        const result = await runPythonScript('cron');
+        const result = await runPythonScript('cron', { stages });
 
         // Check if store needs to update the lastRun time for this job
         const store = getStore();
@@ -84,7 +85,7 @@ export function syncCronJobs() {
     store.cronJobs.forEach(job => {
         if (job.isActive) {
             try {
-                scheduleJob(job.id, job.expression);
+                scheduleJob(job.id, job.expression, job.stages || null);
             } catch (err) {
                 console.error(`Failed to schedule job ${job.id}: ${err.message}`);
             }
@@ -0,0 +1,45 @@
+import fs from 'fs';
+import path from 'path';
+
+// Delta snapshots written by process_data.py (script/delta.py) next to the full dashboard exports.
+// A client that already holds generation `since` only downloads what changed since then.
+
+function readJson(filePath) {
+    if (!fs.existsSync(filePath)) return null;
+    try {
+        return JSON.parse(fs.readFileSync(filePath, 'utf8'));
+    } catch (e) {
+        // Partially written or corrupt file: fall back to the full export
+        return null;
+    }
+}
+
+export function getFileGeneration(outputDir, filename) {
+    const markerPath = path.join(outputDir, 'delta', `${filename}.generation`);
+    if (!fs.existsSync(markerPath)) return null;
+    return fs.readFileSync(markerPath, 'utf8').trim() || null;
+}
+
+// Returns the delta body when `since` can be served incrementally, otherwise null (caller sends the full file)
+export function readDelta(outputDir, filename, since) {
+    if (!since) return null;
+
+    const generation = getFileGeneration(outputDir, filename);
+    if (!generation) return null;
+
+    if (since === generation) {
+        return { generation, baseGeneration: since, unchanged: true };
+    }
+
+    const delta = readJson(path.join(outputDir, 'delta', filename));
+    if (!delta || delta.base_generation !== since || delta.generation !== generation) return null;
+
+    return {
+        generation,
+        baseGeneration: delta.base_generation,
+        key: delta.key,
+        added: delta.added,
+        removed: delta.removed,
+        changed: delta.changed
+    };
+}
@@ -0,0 +1,73 @@
+// Client side of the dashboard deltas (see dashboardDelta.js): a fetched export is kept with its generation,
+// the next fetch sends it as `since` and the returned added/changed/removed are applied to the rows held.
+// Routes answer with the full export whenever the delta cannot be served; it then replaces what is held.
+
+// Same row keys as script/delta.py: key columns joined by '|', duplicates numbered '#1', '#2', ...
+function keyedRows(rows, keyCols) {
+    const keyed = new Map();
+    for (const row of rows) {
+        let key = keyCols.map(c => String(row[c] ?? 'None')).join('|');
+        if (keyed.has(key)) {
+            let n = 1;
+            while (keyed.has(`${key}#${n}`)) n++;
+            key = `${key}#${n}`;
+        }
+        keyed.set(key, row);
+    }
+    return keyed;
+}
+
+export function applyDelta(data, delta) {
+    if (delta.unchanged) return data;
+
+    // Row exports (lines, HUs) are keyed by their key columns; the dashboard summary by its top-level keys
+    if (delta.key) {
+        const keyed = keyedRows(data, delta.key);
+        for (const key of delta.removed) keyed.delete(key);
+        for (const { _key, ...row } of [...delta.changed, ...delta.added]) keyed.set(_key, row);
+        return Array.from(keyed.values());
+    }
+    const next = { ...data, ...delta.added, ...delta.changed };
+    for (const key of delta.removed) delete next[key];
+    return next;
+}
+
+// Priority, then cutoff: the order of the detailed lines list
+export function compareLines(a, b) {
+    const pA = parseInt(a.LPRIO) || 99;
+    const pB = parseInt(b.LPRIO) || 99;
+    if (pA !== pB) return pA - pB;
+
+    const wA = a.WAUHR === null || a.WAUHR === undefined ? "" : a.WAUHR;
+    const wB = b.WAUHR === null || b.WAUHR === undefined ? "" : b.WAUHR;
+
+    if (typeof wA === 'number' && typeof wB === 'number') {
+        return wA - wB;
+    }
+    return String(wA).localeCompare(String(wB));
+}
+
+// Fetches `url` (a dashboard-bflow/lines/hu route) sending the generation held in `cache` for it, and returns
+// { success, generation, data } with the delta already applied. `compare` re-sorts rows after a delta.
+export async function fetchDashboardExport(url, cache, compare) {
+    const held = cache.get(url);
+    const res = await fetch(held ? `${url}&since=${encodeURIComponent(held.generation)}` : url);
+    const result = await res.json();
+
+    if (!result.success) {
+        cache.delete(url);
+        return result;
+    }
+    if (result.delta) {
+        const data = applyDelta(held.data, result);
+        if (compare && !result.unchanged) data.sort(compare);
+        cache.set(url, { generation: result.generation, data });
+        return { success: true, generation: result.generation, data };
+    }
+    if (result.generation) {
+        cache.set(url, { generation: result.generation, data: result.data });
+    } else {
+        cache.delete(url);
+    }
+    return result;
+}
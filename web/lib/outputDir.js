@@ -0,0 +1,28 @@
+import fs from 'fs';
+import path from 'path';
+
+export const DATE_PATTERN = /^\d{4}-\d{2}-\d{2}$/;
+
+// Directory holding process_data.py's outputs. SCRIPT_OUTPUT_DIR points the read routes elsewhere,
+// e.g. at generated fixtures for a load test (script/loadtest_fixtures.py).
+export function getOutputRoot() {
+    return process.env.SCRIPT_OUTPUT_DIR || path.join(process.cwd(), '..', 'script', 'output');
+}
+
+// Date of the partition current.json points at (the latest one of today), null before the first partitioned run
+export function getCurrentDate() {
+    try {
+        return JSON.parse(fs.readFileSync(path.join(getOutputRoot(), 'current.json'), 'utf8')).date || null;
+    } catch (e) {
+        // Missing or being replaced
+        return null;
+    }
+}
+
+// Date partition holding the stats CSVs and dashboard exports of `date` (script/partitions.py), by default
+// the current one. A root without current.json (outputs written before partitions, load test fixtures)
+// is read as is.
+export function getOutputDir(date = null) {
+    const partitionDate = date || getCurrentDate();
+    return partitionDate ? path.join(getOutputRoot(), `date=${partitionDate}`) : getOutputRoot();
+}
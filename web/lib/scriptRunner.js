@@ -1,15 +1,109 @@
-import { exec } from 'child_process';
+import { exec, execFile, spawn } from 'child_process';
+import fs from 'fs';
 import path from 'path';
+import { format } from 'date-fns';
 import { addRunLog } from './store';
+import { getOutputRoot } from './outputDir';
 
-let isRunning = false;
+// process_data.py --stages. A run writes into the partition of its date (script/partitions.py) and locks
+// the outputs of its stages there, so runs for other dates, or with disjoint stages, can overlap (e.g. a
+// frequent `today` refresh next to a slow backlog run or a historical re-run). process_data.py takes the
+// same locks itself, and serialises the users index updates that runs of different dates share.
+export const STAGES = ['today', 'backlog', 'future', 'picking', 'packing'];
 
-export async function runPythonScript(customDate = null) {
-    if (isRunning) {
-        return { success: false, message: 'Script is already running.', status: 'blocked' };
+// The B-flow dashboards are snapshots of the deliveries open now, so only runs for today build them
+const BFLOW_STAGES = ['today', 'backlog', 'future'];
+
+// process_data.py's exit status when another run holds some of its stage locks (EXIT_BLOCKED)
+const EXIT_BLOCKED = 3;
+
+// Seconds scheduled runs spend afterwards preparing the user-stats lookups of the day's active users
+// (process_data.py --precompute-users); off unless set
+const PRECOMPUTE_USERS_SECONDS = Number(process.env.PRECOMPUTE_USERS_SECONDS) || 0;
+
+// run token -> { date, stages, locks }
+const activeRuns = new Map();
+
+// Date partition a run writes to: the target date of the resumed run, the requested date or today
+function getRunDate(customDate, options) {
+    if (options.resume) {
+        try {
+            const manifestPath = path.join(getOutputRoot(), 'runs', options.resume, 'manifest.json');
+            return JSON.parse(fs.readFileSync(manifestPath, 'utf8')).params.target_date;
+        } catch (e) {
+            // Unknown run: process_data.py rejects it
+            return null;
+        }
+    }
+    return customDate && customDate !== 'cron' ? customDate : format(new Date(), 'yyyy-MM-dd');
+}
+
+// Accepts an array or a comma separated string; returns null when every stage is selected
+export function parseStages(value) {
+    if (!value || value.length === 0) return null;
+    const stages = Array.isArray(value) ? value : String(value).split(',').map(s => s.trim()).filter(Boolean);
+    const unknown = stages.filter(s => !STAGES.includes(s));
+    if (unknown.length > 0) throw new Error(`Unknown stage: ${unknown.join(', ')}`);
+    if (stages.length === 0) return null;
+    const selected = STAGES.filter(s => stages.includes(s));
+    return selected.length === STAGES.length ? null : selected;
+}
+
+// Latest generation per output file, updated live from process_data.py's event stream.
+// Use global object to survive HMR/Hot Reloads in development
+if (!global._scriptEvents) {
+    global._scriptEvents = {
+        latestFiles: {}
+    };
+}
+
+function handleEventLine(line, run) {
+    if (!line.trim()) return;
+
+    let event;
+    try {
+        event = JSON.parse(line);
+    } catch (e) {
+        run.messages.push(line);
+        return;
+    }
+
+    if (event.message) run.messages.push(event.message);
+    if (event.generation) run.generation = event.generation;
+    if (event.event === 'error') run.stageErrors.push({ stage: event.stage, shard: event.shard, error: event.error });
+    if (event.run_id) run.runId = event.run_id;
+    if (event.partition) run.partition = event.partition;
+    if (event.failed_stages) run.failedStages = event.failed_stages;
+    if (event.event === 'shard_finished') run.shards[event.shard] = { durationMs: event.duration_ms };
+
+    if (event.event === 'file_generated') {
+        global._scriptEvents.latestFiles[run.partition ? `${run.partition}/${event.file}` : event.file] = {
+            generation: event.generation,
+            stage: event.stage,
+            path: event.path,
+            generatedAt: event.ts
+        };
     }
+}
 
-    isRunning = true;
+// options.resume: run id of an earlier run whose failed stages should be retried (process_data.py --resume)
+// options.stages: subset of STAGES to run (see parseStages), all when omitted
+export async function runPythonScript(customDate = null, options = {}) {
+    const date = getRunDate(customDate, options);
+    // A resumed run may retry any stage of the original run; other runs for another date than today skip the B-flow stages
+    const historical = !options.resume && date !== format(new Date(), 'yyyy-MM-dd');
+    const stages = ((!options.resume && options.stages) || STAGES).filter(stage => !historical || !BFLOW_STAGES.includes(stage));
+    if (stages.length === 0) {
+        return { success: false, message: `The ${BFLOW_STAGES.join(', ')} stages only run for today.`, status: 'invalid' };
+    }
+    const locks = stages.map(stage => `${date}/${stage}`);
+    const heldLocks = new Set([...activeRuns.values()].flatMap(r => r.locks));
+    if (locks.some(lock => heldLocks.has(lock))) {
+        return { success: false, message: `Script is already running for ${date} stages: ${getRunningStages(date).join(', ')}.`, status: 'blocked' };
+    }
+
+    const token = crypto.randomUUID();
+    activeRuns.set(token, { date, stages, locks });
     const startTime = Date.now();
     const isScheduled = customDate === 'cron';
     const actualDate = isScheduled ? null : customDate;
@@ -18,12 +112,41 @@ export async function runPythonScript(customDate = null) {
         const scriptDir = path.join(process.cwd(), '..', 'script');
         // Use python3 on Mac, and check if we should use the venv if it exists
         const pythonCmd = 'python';
-        const command = actualDate
-            ? `${pythonCmd} process_data.py --date ${actualDate}`
-            : `${pythonCmd} process_data.py`;
+        const args = ['process_data.py', '--events'];
+        if (options.resume) args.push('--resume', options.resume);
+        else if (actualDate) args.push('--date', actualDate);
+        if (!options.resume && options.stages) args.push('--stages', stages.join(','));
+        if (isScheduled && PRECOMPUTE_USERS_SECONDS > 0) args.push('--precompute-users', String(PRECOMPUTE_USERS_SECONDS));
 
-        exec(command, { cwd: scriptDir }, (error, stdout, stderr) => {
-            isRunning = false;
+        const run = { messages: [], stageErrors: [], shards: {}, generation: null, runId: null, failedStages: [], partition: null };
+        let buffer = '';
+        let stderr = '';
+        let finished = false;
+
+        const child = spawn(pythonCmd, args, { cwd: scriptDir });
+        child.stdout.setEncoding('utf8');
+        child.stderr.setEncoding('utf8');
+
+        // Events are flushed per line, so handle them as they arrive instead of waiting for exit
+        child.stdout.on('data', (chunk) => {
+            buffer += chunk;
+            let newlineIndex;
+            while ((newlineIndex = buffer.indexOf('\n')) !== -1) {
+                handleEventLine(buffer.slice(0, newlineIndex), run);
+                buffer = buffer.slice(newlineIndex + 1);
+            }
+        });
+
+        child.stderr.on('data', (chunk) => {
+            stderr += chunk;
+        });
+
+        const finish = (error) => {
+            if (finished) return;
+            finished = true;
+            if (buffer) handleEventLine(buffer, run);
+
+            activeRuns.delete(token);
             const endTime = Date.now();
             const durationMs = endTime - startTime;
 
@@ -32,9 +155,16 @@ export async function runPythonScript(customDate = null) {
                 timestamp: new Date(startTime).toISOString(),
                 durationMs,
                 success: !error,
-                output: stdout,
+                output: run.messages.join('\n'),
                 error: error ? error.message : (stderr || null),
-                type: isScheduled ? 'scheduled' : (customDate ? 'manual_custom_date' : 'manual_today')
+                generation: run.generation,
+                stageErrors: run.stageErrors,
+                shards: run.shards,
+                runId: run.runId,
+                failedStages: run.failedStages,
+                stages,
+                date,
+                type: options.resume ? 'manual_resume' : (isScheduled ? 'scheduled' : (customDate ? 'manual_custom_date' : 'manual_today'))
             };
 
             addRunLog(runLog);
@@ -44,6 +174,18 @@ export async function runPythonScript(customDate = null) {
             } else {
                 resolve({ success: true, message: 'Script executed successfully.', log: runLog });
             }
+        };
+
+        child.on('error', (error) => finish(error));
+        child.on('close', (code) => {
+            // Refused by process_data.py's own stage locks (e.g. a run started from the command line)
+            if (code === EXIT_BLOCKED) {
+                finished = true;
+                activeRuns.delete(token);
+                resolve({ success: false, message: `Script is blocked: ${stderr.trim().replace(/^.*?: blocked: /, '')}.`, status: 'blocked' });
+                return;
+            }
+            finish(code === 0 ? null : new Error(`Command failed with exit code ${code}: ${pythonCmd} ${args.join(' ')}\n${stderr}`));
         });
     });
 }
@@ -78,6 +220,52 @@ export async function runUserStatsScript(qname, lgnum, activity = 'picking') {
     });
 }
 
+// Multi-day rollup of the productivity cube (script/cube.py): params { activity, period, days, lgnum, end, byUser }
+export async function runCubeRollup({ activity, period, days, lgnum, end, byUser }) {
+    return new Promise((resolve) => {
+        const scriptDir = path.join(process.cwd(), '..', 'script');
+        const pythonCmd = 'python';
+        const args = ['cube.py', '--activity', activity, '--period', period, '--days', String(days)];
+        if (lgnum) args.push('--lgnum', lgnum);
+        if (end) args.push('--end', end);
+        if (byUser) args.push('--by-user');
+
+        execFile(pythonCmd, args, { cwd: scriptDir, maxBuffer: 64 * 1024 * 1024 }, (error, stdout, stderr) => {
+            if (error) {
+                console.error(`Cube rollup error: ${error.message}`);
+                resolve({ success: false, message: `Script failed: ${error.message}`, error: stderr });
+                return;
+            }
+
+            try {
+                resolve(JSON.parse(stdout));
+            } catch (parseError) {
+                console.error(`Failed to parse cube output: ${stdout}`);
+                resolve({ success: false, message: 'Failed to parse script output', details: stdout });
+            }
+        });
+    });
+}
+
 export function getIsRunning() {
-    return isRunning;
+    return activeRuns.size > 0;
+}
+
+// Stages being processed, of the `date` partition only when given
+export function getRunningStages(date = null) {
+    const running = new Set([...activeRuns.values()].filter(r => !date || r.date === date).flatMap(r => r.stages));
+    return STAGES.filter(stage => running.has(stage));
+}
+
+// date -> stages being processed in that partition
+export function getRunningPartitions() {
+    const partitions = {};
+    activeRuns.forEach(({ date }) => {
+        partitions[date] = getRunningStages(date);
+    });
+    return partitions;
+}
+
+export function getLatestGenerations() {
+    return global._scriptEvents.latestFiles;
 }
@@ -0,0 +1,114 @@
+import { runUserStatsScript } from './scriptRunner';
+
+// Results younger than FRESH_MS are served directly. Between FRESH_MS and FRESH_MS + STALE_MS the
+// cached result is still served, but a background refresh is started (stale-while-revalidate).
+const FRESH_MS = 10 * 60 * 1000;
+const STALE_MS = 50 * 60 * 1000;
+const MAX_ENTRIES = 200;
+
+// Use global object to survive HMR/Hot Reloads in development
+if (!global._userStatsCache) {
+    global._userStatsCache = {
+        entries: new Map(), // insertion order doubles as LRU order
+        inFlight: new Map(),
+        counters: {
+            hits: 0,
+            staleHits: 0,
+            misses: 0,
+            coalesced: 0,
+            refreshes: 0,
+            evictions: 0,
+            failures: 0
+        }
+    };
+}
+
+const cache = global._userStatsCache;
+
+function getCacheKey(qname, lgnum, activity) {
+    return `${String(qname).trim().toUpperCase()}|${lgnum}|${activity}`;
+}
+
+function storeResult(key, result) {
+    cache.entries.delete(key);
+    cache.entries.set(key, { result, storedAt: Date.now() });
+
+    while (cache.entries.size > MAX_ENTRIES) {
+        const oldestKey = cache.entries.keys().next().value;
+        cache.entries.delete(oldestKey);
+        cache.counters.evictions++;
+    }
+}
+
+function compute(key, qname, lgnum, activity) {
+    // Identical concurrent lookups share one script execution
+    if (cache.inFlight.has(key)) {
+        cache.counters.coalesced++;
+        return cache.inFlight.get(key);
+    }
+
+    const promise = runUserStatsScript(qname, lgnum, activity)
+        .then((result) => {
+            // Only successful lookups are cached; failures (e.g. Snowflake errors) are retried next time
+            if (result && result.success) {
+                storeResult(key, result);
+            } else {
+                cache.counters.failures++;
+            }
+            return result;
+        })
+        .finally(() => {
+            cache.inFlight.delete(key);
+        });
+
+    cache.inFlight.set(key, promise);
+    return promise;
+}
+
+export async function getUserStats(qname, lgnum, activity = 'picking') {
+    const key = getCacheKey(qname, lgnum, activity);
+    const entry = cache.entries.get(key);
+
+    if (entry) {
+        const age = Date.now() - entry.storedAt;
+
+        if (age < FRESH_MS + STALE_MS) {
+            // Touch for LRU
+            cache.entries.delete(key);
+            cache.entries.set(key, entry);
+
+            if (age < FRESH_MS) {
+                cache.counters.hits++;
+                return { result: entry.result, cacheStatus: 'HIT' };
+            }
+
+            cache.counters.staleHits++;
+            if (!cache.inFlight.has(key)) cache.counters.refreshes++;
+            compute(key, qname, lgnum, activity).catch((error) => {
+                console.error(`User stats background refresh failed: ${error.message}`);
+            });
+            return { result: entry.result, cacheStatus: 'STALE' };
+        }
+
+        cache.entries.delete(key);
+    }
+
+    cache.counters.misses++;
+    const result = await compute(key, qname, lgnum, activity);
+    return { result, cacheStatus: 'MISS' };
+}
+
+export function getUserStatsCacheStats() {
+    const { hits, staleHits, misses } = cache.counters;
+    const lookups = hits + staleHits + misses;
+
+    return {
+        ...cache.counters,
+        size: cache.entries.size,
+        maxEntries: MAX_ENTRIES,
+        inFlight: cache.inFlight.size,
+        freshMs: FRESH_MS,
+        staleMs: STALE_MS,
+        hitRate: lookups > 0 ? Number(((hits + staleHits) / lookups).toFixed(3)) : 0
+    };
+}
@@ -0,0 +1,236 @@
+// Load test of the dashboard read routes over generated output fixtures.
+//
+//   cd script && python loadtest_fixtures.py --scale 5
+//   cd web && npm run build && npm run loadtest -- --start --concurrency 32
+//
+// Every route is driven on its own for --duration seconds by --concurrency parallel clients, each
+// request cycling through the route's variants (warehouse, scenario, activity, ...). Reports
+// p50/p95/p99 latency, throughput, response size and the server's resident memory per route.
+// --start launches `next start` with SCRIPT_OUTPUT_DIR pointing at the fixtures; otherwise the
+// app at --url is used and memory is only sampled when its --pid is given.
+
+import { spawn, execFile } from 'child_process';
+import fs from 'fs';
+import path from 'path';
+import { fileURLToPath } from 'url';
+
+const WEB_DIR = path.join(path.dirname(fileURLToPath(import.meta.url)), '..');
+
+const DEFAULTS = {
+    url: null,
+    start: false,
+    port: 3100,
+    output: path.join(WEB_DIR, '..', 'script', 'loadtest_output'),
+    concurrency: 16,
+    duration: 10,
+    warmup: 20,
+    routes: null,
+    pid: null,
+    json: null
+};
+
+function parseArgs(argv) {
+    const options = { ...DEFAULTS };
+    for (let i = 0; i < argv.length; i++) {
+        const name = argv[i].replace(/^--/, '');
+        if (!(name in DEFAULTS)) throw new Error(`Unknown option: ${argv[i]}`);
+        if (typeof DEFAULTS[name] === 'boolean') {
+            options[name] = true;
+            continue;
+        }
+        const value = argv[++i];
+        if (value === undefined) throw new Error(`Missing value for --${name}`);
+        options[name] = typeof DEFAULTS[name] === 'number' ? Number(value) : value;
+    }
+    options.url = options.url || `http://localhost:${options.port}`;
+    return options;
+}
+
+function readManifest(outputDir) {
+    const manifestPath = path.join(outputDir, 'loadtest.json');
+    if (!fs.existsSync(manifestPath)) {
+        throw new Error(`No fixtures in ${outputDir}: run script/loadtest_fixtures.py first (or pass --output)`);
+    }
+    return JSON.parse(fs.readFileSync(manifestPath, 'utf8'));
+}
+
+// Request variants per route, cycled round-robin by the clients
+function buildRoutes(manifest) {
+    const types = manifest.warehouses;
+    const scenarios = ['today', 'backlog', 'future'];
+    const variants = (build) => types.flatMap(type => scenarios.map(scenario => build(type, scenario)));
+
+    return {
+        'dashboard-data': types.flatMap(type => ['picking', 'packing'].map(activity => `/api/dashboard-data?type=${type}&activity=${activity}`)),
+        'dashboard-bflow': variants((type, scenario) => `/api/dashboard-bflow?type=${type}&scenario=${scenario}`),
+        'dashboard-bflow?since': variants((type, scenario) => `/api/dashboard-bflow?type=${type}&scenario=${scenario}&since=${manifest.base_generation}`),
+        'dashboard-lines': variants((type, scenario) => `/api/dashboard-lines?type=${type}&scenario=${scenario}`),
+        'dashboard-lines?since': variants((type, scenario) => `/api/dashboard-lines?type=${type}&scenario=${scenario}&since=${manifest.base_generation}`),
+        'dashboard-hu': variants((type, scenario) => `/api/dashboard-hu?type=${type}&scenario=${scenario}`),
+        'dashboard-hu?since': variants((type, scenario) => `/api/dashboard-hu?type=${type}&scenario=${scenario}&since=${manifest.base_generation}`),
+        'users': ['/api/users', '/api/users?q=USER1']
+    };
+}
+
+// Resident memory of a process and its children in bytes (`next start` serves from a child process)
+function sampleRss(rootPid) {
+    return new Promise((resolve) => {
+        if (!rootPid || process.platform === 'win32') return resolve(null);
+        execFile('ps', ['-A', '-o', 'pid=,ppid=,rss='], (error, stdout) => {
+            if (error) return resolve(null);
+            const rows = stdout.trim().split('\n').map(line => line.trim().split(/\s+/).map(Number));
+            const tree = new Set([Number(rootPid)]);
+            let grew = true;
+            while (grew) {
+                grew = false;
+                rows.forEach(([pid, ppid]) => {
+                    if (tree.has(ppid) && !tree.has(pid)) {
+                        tree.add(pid);
+                        grew = true;
+                    }
+                });
+            }
+            resolve(rows.filter(([pid]) => tree.has(pid)).reduce((acc, [, , rss]) => acc + rss * 1024, 0));
+        });
+    });
+}
+
+function percentile(sorted, p) {
+    if (sorted.length === 0) return null;
+    const rank = Math.ceil((p / 100) * sorted.length) - 1;
+    return sorted[Math.min(sorted.length - 1, Math.max(0, rank))];
+}
+
+async function request(baseUrl, pathname) {
+    const start = performance.now();
+    try {
+        const res = await fetch(baseUrl + pathname);
+        const body = await res.arrayBuffer();
+        return { ms: performance.now() - start, ok: res.ok, bytes: body.byteLength };
+    } catch (e) {
+        return { ms: performance.now() - start, ok: false, bytes: 0 };
+    }
+}
+
+async function runRoute(options, name, paths, serverPid) {
+    // Warm-up requests compile the route (dev) and fill caches; they are not measured
+    for (let i = 0; i < options.warmup; i++) await request(options.url, paths[i % paths.length]);
+
+    const samples = [];
+    const memory = [];
+    const rssStart = await sampleRss(serverPid);
+    const sampler = setInterval(async () => memory.push(await sampleRss(serverPid)), 250);
+
+    let next = 0;
+    const started = performance.now();
+    const deadline = started + options.duration * 1000;
+    const clients = Array.from({ length: options.concurrency }, async () => {
+        while (performance.now() < deadline) {
+            samples.push(await request(options.url, paths[next++ % paths.length]));
+        }
+    });
+    await Promise.all(clients);
+    const elapsedSec = (performance.now() - started) / 1000;
+    clearInterval(sampler);
+    const rssEnd = await sampleRss(serverPid);
+
+    const latencies = samples.map(s => s.ms).sort((a, b) => a - b);
+    const rss = [rssStart, ...memory, rssEnd].filter(v => v !== null);
+    return {
+        route: name,
+        requests: samples.length,
+        errors: samples.filter(s => !s.ok).length,
+        rps: samples.length / elapsedSec,
+        p50: percentile(latencies, 50),
+        p95: percentile(latencies, 95),
+        p99: percentile(latencies, 99),
+        max: latencies[latencies.length - 1] ?? null,
+        avgKb: samples.reduce((acc, s) => acc + s.bytes, 0) / Math.max(samples.length, 1) / 1024,
+        rssStartMb: rssStart !== null ? rssStart / 1024 / 1024 : null,
+        rssPeakMb: rss.length > 0 ? Math.max(...rss) / 1024 / 1024 : null,
+        rssEndMb: rssEnd !== null ? rssEnd / 1024 / 1024 : null
+    };
+}
+
+async function waitForServer(baseUrl, child, timeoutMs) {
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+        if (child && child.exitCode !== null) throw new Error(`Server exited with code ${child.exitCode}`);
+        try {
+            const res = await fetch(`${baseUrl}/api/users`);
+            if (res.ok) return;
+        } catch (e) {
+            // Not listening yet
+        }
+        await new Promise(resolve => setTimeout(resolve, 500));
+    }
+    throw new Error(`Server at ${baseUrl} did not respond within ${timeoutMs / 1000}s`);
+}
+
+function startServer(options, outputDir) {
+    if (!fs.existsSync(path.join(WEB_DIR, '.next'))) {
+        throw new Error('No production build found: run `npm run build` first');
+    }
+    const nextBin = path.join(WEB_DIR, 'node_modules', '.bin', process.platform === 'win32' ? 'next.cmd' : 'next');
+    const child = spawn(nextBin, ['start', '-p', String(options.port)], {
+        cwd: WEB_DIR,
+        env: { ...process.env, SCRIPT_OUTPUT_DIR: outputDir },
+        stdio: ['ignore', 'ignore', 'inherit']
+    });
+    return child;
+}
+
+function formatRow(values, widths) {
+    return values.map((v, i) => (i === 0 ? String(v).padEnd(widths[i]) : String(v).padStart(widths[i]))).join('  ');
+}
+
+function printReport(results, manifest, options) {
+    const fmt = (v, digits = 1) => (v === null || v === undefined ? 'n/a' : v.toFixed(digits));
+    const header = ['route', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms', 'avg KB', 'rss MB', 'peak MB'];
+    const rows = results.map(r => [r.route, r.requests, r.errors, fmt(r.rps), fmt(r.p50), fmt(r.p95), fmt(r.p99), fmt(r.max), fmt(r.avgKb), fmt(r.rssStartMb), fmt(r.rssPeakMb)]);
+    const widths = header.map((h, i) => Math.max(h.length, ...rows.map(row => String(row[i]).length)));
+
+    const totalMb = Object.values(manifest.files).reduce((acc, f) => acc + f.bytes, 0) / 1024 / 1024;
+    console.log(`\nFixtures: scale ${manifest.scale}, ${Object.keys(manifest.files).length} files, ${totalMb.toFixed(1)} MB. Concurrency ${options.concurrency}, ${options.duration}s per route.\n`);
+    console.log(formatRow(header, widths));
+    rows.forEach(row => console.log(formatRow(row, widths)));
+}
+
+async function main() {
+    const options = parseArgs(process.argv.slice(2));
+    const outputDir = path.resolve(options.output);
+    const manifest = readManifest(outputDir);
+
+    const allRoutes = buildRoutes(manifest);
+    const selected = options.routes ? options.routes.split(',').map(r => r.trim()) : Object.keys(allRoutes);
+    const unknown = selected.filter(r => !allRoutes[r]);
+    if (unknown.length > 0) throw new Error(`Unknown route: ${unknown.join(', ')} (available: ${Object.keys(allRoutes).join(', ')})`);
+
+    let child = null;
+    if (options.start) {
+        child = startServer(options, outputDir);
+        console.log(`Started next start on port ${options.port} (pid ${child.pid}) serving ${outputDir}`);
+    }
+    const serverPid = child ? child.pid : options.pid;
+
+    try {
+        await waitForServer(options.url, child, 60000);
+        const results = [];
+        for (const name of selected) {
+            console.log(`Loading ${name}...`);
+            results.push(await runRoute(options, name, allRoutes[name], serverPid));
+        }
+        printReport(results, manifest, options);
+        if (options.json) {
+            fs.writeFileSync(options.json, JSON.stringify({ manifest, options, results }, null, 4));
+            console.log(`\nReport written to ${options.json}`);
+        }
+    } finally {
+        if (child) child.kill();
+    }
+}
+
+main().catch((error) => {
+    console.error(error.message);
+    process.exit(1);
+});